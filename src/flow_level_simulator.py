@@ -14,6 +14,7 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 
+from simulator_new.app.video_conferencing.lookup_table import AELookupTable
 from simulator_new.constant import MODEL_ID_MAP
 from simulator_new.trace import generate_trace
 from simulator_new.utils import set_seed
@@ -36,30 +37,26 @@ def ssim_db(ssim):
 class Encoder:
     def __init__(self, lookup_table_path: str, fps: int) -> None:
         self.fps = fps
-        self.table = load_lookup_table(lookup_table_path)
-        self.nframes = self.table['frame_id'].max() - self.table['frame_id'].min() + 1
+        self.lookup_table = AELookupTable.load(
+            lookup_table_path, loader=load_lookup_table,
+            cache_suffix='.flow.npy')
+        self.nframes = self.lookup_table.nframes
 
     def encode(self, frame_id, target_bitrate_Bps):
         target_fsize_byte = target_bitrate_Bps / self.fps
         # look up in AE table
-        mask0 = self.table['frame_id'] == (frame_id % self.nframes)
-        mask1 = self.table['size'] <= target_fsize_byte
-        mask = mask0 & mask1
-        if len(self.table[mask]) == 0:
-            idx = self.table[mask0]['size'].argsort().index[0]
-        else:
-            idx = (self.table[mask]['size'] - target_fsize_byte).argsort().index[-1]
-
-        frame_size_byte = int(self.table['size'].loc[idx])
-        model_id = self.table['model_id'].loc[idx]
+        model_id, frame_size_byte = self.lookup_table.encode(
+            frame_id % self.nframes, target_fsize_byte)
 
         return frame_size_byte, model_id
 
 
 class Decoder:
     def __init__(self, lookup_table_path: str) -> None:
-        self.table = load_lookup_table(lookup_table_path)
-        self.nframes = self.table['frame_id'].max() - self.table['frame_id'].min() + 1
+        self.lookup_table = AELookupTable.load(
+            lookup_table_path, loader=load_lookup_table,
+            cache_suffix='.flow.npy')
+        self.nframes = self.lookup_table.nframes
 
     def decode(self, frame_id, recvd_frame_size_byte, frame_size_byte, model_id):
         if frame_size_byte == 0:
@@ -69,14 +66,8 @@ class Decoder:
             frame_loss_rate = 1 - recvd_frame_size_byte / frame_size_byte
         assert 0 <= frame_loss_rate <= 1, f"{frame_loss_rate}, {recvd_frame_size_byte}, {frame_size_byte}"
         rounded_frame_loss_rate = round(frame_loss_rate, 1)
-        mask = (self.table['frame_id'] == frame_id % self.nframes) & \
-                (self.table['model_id'] == model_id) & \
-                (self.table['loss'] == rounded_frame_loss_rate)
-
-        if len(self.table[mask]['ssim']) >= 1:
-            ssim = self.table[mask]['ssim'].iloc[0]
-        else:
-            ssim = -1
+        ssim = self.lookup_table.get_ssim(frame_id % self.nframes, model_id,
+                                          rounded_frame_loss_rate)
         return ssim, frame_loss_rate, rounded_frame_loss_rate
 
 
@@ -1,3 +1,15 @@
 from simulator_new.app.app import Application
 from simulator_new.app.file_transfer import FileSender, FileReceiver
-from simulator_new.app.video_conferencing.video_conferencing import VideoSender, VideoReceiver
+
+# imported on first access, see simulator_new.registry
+_LAZY_CLASSES = {
+    'VideoSender': 'simulator_new.app.video_conferencing.video_conferencing.VideoSender',
+    'VideoReceiver': 'simulator_new.app.video_conferencing.video_conferencing.VideoReceiver',
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_CLASSES:
+        from simulator_new.registry import import_class
+        return import_class(_LAZY_CLASSES[name])
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
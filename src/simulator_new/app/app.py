@@ -1,8 +1,10 @@
-from typing import Dict, Tuple
+from typing import Optional, Tuple
 from simulator_new.clock import ClockObserver
 
 from abc import abstractmethod
 
+from simulator_new.packet import FrameInfo
+
 class Application(ClockObserver):
     def __init__(self):
         self.host = None
@@ -13,8 +15,11 @@ class Application(ClockObserver):
         pass
 
     @abstractmethod
-    def get_pkt(self) -> Tuple[int, Dict]:
-        """Get a packet from the application to the transport layer"""
+    def get_pkt(self) -> Tuple[int, Optional[FrameInfo]]:
+        """Get a packet from the application to the transport layer.
+
+        Return the packet size and the frame it carries, if any.
+        """
         pass
 
     @abstractmethod
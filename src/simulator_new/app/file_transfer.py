@@ -1,3 +1,5 @@
+import math
+
 from simulator_new.app import Application
 
 class FileSender(Application):
@@ -8,7 +10,7 @@ class FileSender(Application):
         return 1500
 
     def get_pkt(self):
-        return 1500, {}
+        return 1500, None
 
     def deliver_pkt(self, pkt):
         return
@@ -16,6 +18,9 @@ class FileSender(Application):
     def tick(self, ts_ms):
         return
 
+    def next_event_ts_ms(self, ts_ms):
+        return math.inf
+
     def reset(self):
         return
 
@@ -27,7 +32,7 @@ class FileReceiver(Application):
         return 0
 
     def get_pkt(self):
-        return 0, {}
+        return 0, None
 
     def deliver_pkt(self, pkt):
         return
@@ -35,5 +40,8 @@ class FileReceiver(Application):
     def tick(self, ts_ms):
         return
 
+    def next_event_ts_ms(self, ts_ms):
+        return math.inf
+
     def reset(self):
         return
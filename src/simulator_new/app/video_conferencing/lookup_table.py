@@ -0,0 +1,165 @@
+import os
+
+import numpy as np
+
+# columns kept in the binary cache of an AE lookup table
+CACHE_DTYPE = np.dtype([('frame_id', np.int64), ('size', np.float64),
+                        ('model_id', np.int64), ('loss', np.float64),
+                        ('ssim', np.float64)])
+
+# process-level registry of loaded tables, shared by all senders, receivers
+# and simulators in the process
+_LOOKUP_TABLES = {}
+
+
+def load_lookup_table(lookup_table_path):
+    import pandas as pd  # only needed to build the binary cache
+    table = pd.read_csv(lookup_table_path)
+    table = table[table['frame_id'] != 0]
+    if table['frame_id'].min() == 1:
+        table['frame_id'] -= 1 # force 0-indexed frame id
+    return table
+
+
+class AELookupTable:
+    """Dense NumPy index over an AE lookup table.
+
+    Built once per table so that encoding and decoding a frame are array
+    lookups instead of boolean masks over the whole table.
+
+    Args
+        records: structured array of CACHE_DTYPE with 0-indexed frame ids.
+    """
+
+    # frame loss rates are rounded to one decimal: 0.0, 0.1, ..., 1.0
+    NUM_LOSS_BUCKETS = 11
+
+    def __init__(self, records: np.ndarray) -> None:
+        # arguments of load() if the table is in the registry
+        self.load_args = None
+        frame_ids = records['frame_id']
+        sizes = records['size']
+        model_ids = records['model_id']
+        losses = records['loss']
+        ssims = records['ssim']
+        self.nframes = int(frame_ids.max() - frame_ids.min() + 1)
+        self.sizes = sizes
+        self.model_ids = model_ids
+
+        # encode index: per-frame sizes in increasing order, padded with inf,
+        # and for each prefix the last table row among those sizes
+        nframe_ids = int(frame_ids.max()) + 1
+        rows_by_frame = np.argsort(frame_ids, kind='stable')
+        cnts = np.bincount(frame_ids, minlength=nframe_ids)
+        offsets = np.concatenate([[0], np.cumsum(cnts)])
+        self.sorted_sizes = np.full((nframe_ids, cnts.max()), np.inf)
+        self.last_rows = np.zeros((nframe_ids, cnts.max()), dtype=np.int64)
+        self.first_rows = np.zeros(nframe_ids, dtype=np.int64)
+        self.min_ssims = np.full(nframe_ids, np.nan)
+        self.max_ssims = np.full(nframe_ids, np.nan)
+        for frame_id in range(nframe_ids):
+            rows = rows_by_frame[offsets[frame_id]:offsets[frame_id + 1]]
+            if len(rows) == 0:
+                continue
+            frame_ssims = ssims[rows]
+            frame_ssims = frame_ssims[~np.isnan(frame_ssims)]
+            if len(frame_ssims):
+                self.min_ssims[frame_id] = frame_ssims.min()
+                self.max_ssims[frame_id] = frame_ssims.max()
+            rows = rows[np.argsort(sizes[rows], kind='stable')]
+            self.sorted_sizes[frame_id, :len(rows)] = sizes[rows]
+            self.last_rows[frame_id, :len(rows)] = np.maximum.accumulate(rows)
+            self.first_rows[frame_id] = rows.min()
+
+        # decode index: (frame_id, model_idx, loss_bucket) -> ssim of the
+        # first matching row, nan if there is none
+        self.model_idx = {model_id: i for i, model_id in
+                          enumerate(np.unique(model_ids))}
+        self.ssims = np.full((nframe_ids, len(self.model_idx),
+                              self.NUM_LOSS_BUCKETS), np.nan)
+        mask = (losses == np.round(losses, 1)) & (0 <= losses) & (losses <= 1)
+        keys = np.ravel_multi_index(
+            (frame_ids[mask],
+             np.array([self.model_idx[m] for m in model_ids[mask]], dtype=np.int64),
+             np.rint(losses[mask] * 10).astype(np.int64)), self.ssims.shape)
+        keys, first_idx = np.unique(keys, return_index=True)
+        self.ssims.flat[keys] = ssims[mask][first_idx]
+
+    @staticmethod
+    def to_records(table: 'pd.DataFrame') -> np.ndarray:
+        records = np.empty(len(table), dtype=CACHE_DTYPE)
+        for name in CACHE_DTYPE.names:
+            records[name] = table[name].to_numpy()
+        return records
+
+    @staticmethod
+    def load(lookup_table_path: str, loader=load_lookup_table,
+             cache_suffix: str = '.npy') -> 'AELookupTable':
+        """Load a table through the process-level registry.
+
+        The table parsed by loader is cached in a binary sidecar file,
+        lookup_table_path + cache_suffix, which is memory-mapped read-only on
+        later loads so that CSV parsing is skipped and the pages are shared
+        between processes. Loaders with different row filters must use
+        different cache suffixes.
+        """
+        key = (os.path.realpath(lookup_table_path), cache_suffix)
+        if key not in _LOOKUP_TABLES:
+            table = AELookupTable(
+                _load_records(lookup_table_path, loader, cache_suffix))
+            table.load_args = (lookup_table_path, loader, cache_suffix)
+            _LOOKUP_TABLES[key] = table
+        return _LOOKUP_TABLES[key]
+
+    def __reduce_ex__(self, protocol):
+        # copies of a registered table, e.g. in a Simulator checkpoint, are
+        # the registered table
+        if self.load_args is not None:
+            return (AELookupTable.load, self.load_args)
+        return super().__reduce_ex__(protocol)
+
+    def encode(self, frame_id: int, target_fsize_bytes: float):
+        """Return the model id and frame size of the last table row of a
+        frame whose size fits in target_fsize_bytes, or of the first row of
+        the frame if none fits."""
+        idx = np.searchsorted(self.sorted_sizes[frame_id], target_fsize_bytes,
+                              side='right') - 1
+        row = self.first_rows[frame_id] if idx < 0 else self.last_rows[frame_id, idx]
+        return self.model_ids[row], int(self.sizes[row])
+
+    def get_ssim(self, frame_id: int, model_id: int, rounded_loss_rate: float):
+        """Return the ssim of a frame, or -1 if the table has no entry."""
+        model_idx = self.model_idx.get(model_id, None)
+        loss_bucket = int(round(rounded_loss_rate * 10))
+        if model_idx is None or not 0 <= loss_bucket <= 10 or \
+           loss_bucket / 10 != rounded_loss_rate:
+            return -1
+        ssim = self.ssims[frame_id, model_idx, loss_bucket]
+        return -1 if np.isnan(ssim) else ssim
+
+    def get_ssim_range(self, frame_id: int):
+        return self.min_ssims[frame_id], self.max_ssims[frame_id]
+
+
+def _load_records(lookup_table_path, loader, cache_suffix):
+    cache_path = lookup_table_path + cache_suffix
+    if os.path.exists(cache_path) and \
+       os.path.getmtime(cache_path) >= os.path.getmtime(lookup_table_path):
+        try:
+            return np.load(cache_path, mmap_mode='r')
+        except (OSError, ValueError):
+            pass  # unreadable cache, rebuild it
+    records = AELookupTable.to_records(loader(lookup_table_path))
+    # write to a temporary file first so that concurrent processes never
+    # map a partially written cache
+    tmp_path = '{}.{}.tmp'.format(cache_path, os.getpid())
+    try:
+        with open(tmp_path, 'wb') as f:
+            np.save(f, records)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # read-only data directory, keep the table in memory
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return records
+    return np.load(cache_path, mmap_mode='r')
@@ -1,18 +1,10 @@
-import csv
-import os
-
-import pandas as pd
+import math
 
 from simulator_new.app import Application
+from simulator_new.app.video_conferencing.lookup_table import AELookupTable
 from simulator_new.constant import MSS
-
-def load_lookup_table(lookup_table_path):
-    table = pd.read_csv(lookup_table_path)
-    table = table[table['frame_id'] != 0]
-    if table['frame_id'].min() == 1:
-        table['frame_id'] -= 1 # force 0-indexed frame id
-    return table
-
+from simulator_new.log_config import LogConfig
+from simulator_new.packet import FrameInfo
 
 def packetize(model_id, frame_id, frame_size_byte, encode_ts_ms,
               target_bitrate_Bps, padding_byte):
@@ -21,45 +13,24 @@ def packetize(model_id, frame_id, frame_size_byte, encode_ts_ms,
     base, extra = divmod(frame_size_byte, n_pkts)
     pkt_sizes = [base + (i < extra) for i in range(n_pkts)]
 
+    # packets of a frame share one FrameInfo
+    frame = FrameInfo(frame_id, n_pkts, frame_size_byte, padding_byte,
+                      model_id, encode_ts_ms, target_bitrate_Bps, 0)
     pkts = []
 
     for pkt_size in pkt_sizes:
         assert pkt_size <= MSS
-        pkts.append(
-            {"pkt_size_bytes": pkt_size,
-             "num_pkts": n_pkts,
-             "frame_id": frame_id,
-             "frame_size_bytes": frame_size_byte,
-             "padding_bytes": padding_byte,
-             "model_id": model_id,
-             "frame_encode_ts_ms": encode_ts_ms,
-             "target_bitrate_Bps": target_bitrate_Bps,
-             "padding": 0})
+        pkts.append((pkt_size, frame))
 
     padding_pkts = []
     n_padding_pkts, remainder_padding_byte = divmod(padding_byte, MSS)
+    padding_frame = FrameInfo(frame_id, n_pkts, frame_size_byte, padding_byte,
+                              model_id, encode_ts_ms, target_bitrate_Bps, 1)
 
     for _ in range(int(n_padding_pkts)):
-        padding_pkts.append(
-            {"pkt_size_bytes": MSS,
-             "num_pkts": n_pkts,
-             "frame_id": frame_id,
-             "frame_size_bytes": frame_size_byte,
-             "padding_bytes": padding_byte,
-             "model_id": model_id,
-             "frame_encode_ts_ms": encode_ts_ms,
-             "target_bitrate_Bps": target_bitrate_Bps,
-             "padding": 1})
+        padding_pkts.append((MSS, padding_frame))
     if remainder_padding_byte:
-        padding_pkts.append(
-            {"pkt_size_bytes": remainder_padding_byte,
-             "num_pkts": n_pkts,
-             "frame_id": frame_id,
-             "frame_size_bytes": frame_size_byte,
-             "model_id": model_id,
-             "frame_encode_ts_ms": encode_ts_ms,
-             "target_bitrate_Bps": target_bitrate_Bps,
-             "padding": 1})
+        padding_pkts.append((remainder_padding_byte, padding_frame))
     return pkts, padding_pkts
 
 
@@ -69,26 +40,18 @@ class VideoSender(Application):
         self.fps = 25
         self.frame_id = 0
         self.last_encode_ts_ms = None
-        self.table = load_lookup_table(lookup_table_path)
-        self.nframes = self.table['frame_id'].max() - self.table['frame_id'].min() + 1
+        self.lookup_table = AELookupTable.load(lookup_table_path)
+        self.nframes = self.lookup_table.nframes
         self.pkt_queue = []  # assume data queue has infinite capacity
 
     def peek_pkt(self) -> int:
-        return self.pkt_queue[0]['pkt_size_bytes'] if self.pkt_queue else 0
+        return self.pkt_queue[0][0] if self.pkt_queue else 0
 
     def _encode(self, target_bitrate_Bps):
         target_fsize_bytes = int(target_bitrate_Bps / self.fps)
         # look up in AE table
-        mask0 = self.table['frame_id'] == (self.frame_id % self.nframes)
-        mask1 = self.table['size'] <= target_fsize_bytes
-        mask = mask0 & mask1
-        if len(self.table[mask]) == 0:
-            idx = self.table[mask0]['size'].argsort().index[0]
-        else:
-            idx = (self.table[mask]['size'] - target_fsize_bytes).argsort().index[-1]
-
-        frame_size_byte = int(self.table['size'].loc[idx])
-        model_id = self.table['model_id'].loc[idx]
+        model_id, frame_size_byte = self.lookup_table.encode(
+            self.frame_id % self.nframes, target_fsize_bytes)
 
         return model_id, frame_size_byte, max(target_fsize_bytes - frame_size_byte, 0)
 
@@ -108,11 +71,15 @@ class VideoSender(Application):
             self.last_encode_ts_ms = ts_ms
             self.frame_id += 1
 
+    def next_event_ts_ms(self, ts_ms):
+        if self.last_encode_ts_ms is None:
+            return ts_ms + 1
+        return max(ts_ms + 1, self.last_encode_ts_ms + math.ceil(1000 / self.fps))
+
     def get_pkt(self):
         if self.pkt_queue:
-            pkt = self.pkt_queue.pop(0)
-            return pkt['pkt_size_bytes'], pkt
-        return 0, {}
+            return self.pkt_queue.pop(0)
+        return 0, None
 
     def reset(self):
         self.frame_id = 0
@@ -121,7 +88,8 @@ class VideoSender(Application):
 
 
 class VideoReceiver(Application):
-    def __init__(self, lookup_table_path: str, save_dir: str = "") -> None:
+    def __init__(self, lookup_table_path: str, save_dir: str = "",
+                 log_config=None) -> None:
         self.fps = 25
         self.last_decode_ts_ms = None
         self.first_decode_ts_ms = None
@@ -130,36 +98,26 @@ class VideoReceiver(Application):
         self.frame_id = 0  # frame id to be decoded
         self.frame_quality = -1  # frame quality of last decoded frame
         self.frame_delay_ms = 0  # frame_delay of last decoded frame
-        self.table = load_lookup_table(lookup_table_path)
-        self.nframes = self.table['frame_id'].max() - self.table['frame_id'].min() + 1
+        self.lookup_table = AELookupTable.load(lookup_table_path)
+        self.nframes = self.lookup_table.nframes
         self.save_dir = save_dir
-        if self.save_dir:
-            os.makedirs(self.save_dir, exist_ok=True)
-            self.log_fname = os.path.join(self.save_dir, "decoder_log.csv")
-            self.log_fh = open(self.log_fname, 'w', 1)
-            self.csv_writer = csv.writer(self.log_fh, lineterminator='\n')
-            self.csv_writer.writerow(
-                ['frame_id', "model_id",
-                 'rcvd_frame_size_bytes', 'frame_size_bytes',
-                 "frame_encode_ts_ms", "frame_decode_ts_ms",
-                 "frame_loss_rate", "ssim", 'target_bitrate_Bps'])
-        else:
-            self.log_fname = None
-            self.log_fh = None
-            self.csv_writer = None
-
-    def __del__(self):
-        if self.log_fh:
-            self.log_fh.close()
+        self.log_config = log_config or LogConfig()
+        self.log_fname, self.csv_writer = self.log_config.open_csv(
+            self.save_dir, 'decoder', "decoder_log.csv",
+            ['frame_id', "model_id",
+             'rcvd_frame_size_bytes', 'frame_size_bytes',
+             "frame_encode_ts_ms", "frame_decode_ts_ms",
+             "frame_loss_rate", "ssim", 'target_bitrate_Bps'])
 
     def peek_pkt(self):
         return 0
 
     def get_pkt(self):
-        return MSS, {}
+        return MSS, None
 
     def deliver_pkt(self, pkt):
-        frame_id = pkt.app_data['frame_id']
+        frame = pkt.frame
+        frame_id = frame.frame_id
         frame_info = self.pkt_queue.get(
             frame_id, {"rcvd_frame_size_bytes": 0, "frame_size_bytes": 0,
                        "num_pkts_rcvd": 0, "num_pkts": 0,
@@ -170,15 +128,15 @@ class VideoReceiver(Application):
         if pkt.pkt_id in frame_info['pkt_id_rcvd']:
             return
         frame_info['pkt_id_rcvd'].add(pkt.pkt_id)
-        frame_info['frame_size_bytes'] = pkt.app_data['frame_size_bytes']
-        frame_info['num_pkts'] = pkt.app_data['num_pkts']
-        frame_info['model_id'] = pkt.app_data['model_id']
-        frame_info['frame_encode_ts_ms'] = pkt.app_data['frame_encode_ts_ms']
-        frame_info['target_bitrate_Bps'] = pkt.app_data['target_bitrate_Bps']
+        frame_info['frame_size_bytes'] = frame.frame_size_bytes
+        frame_info['num_pkts'] = frame.num_pkts
+        frame_info['model_id'] = frame.model_id
+        frame_info['frame_encode_ts_ms'] = frame.frame_encode_ts_ms
+        frame_info['target_bitrate_Bps'] = frame.target_bitrate_Bps
         if pkt.ts_sent_ms == pkt.ts_first_sent_ms:
             frame_info['last_pkt_sent_ts_ms'] = pkt.ts_sent_ms
             frame_info['last_pkt_rcv_ts_ms'] = pkt.ts_rcvd_ms
-        if pkt.app_data['padding']:
+        if frame.padding:
             frame_info['padding_bytes'] += pkt.size_bytes
             frame_info['num_padding_pkts_rcvd'] += 1
         else:
@@ -200,16 +158,10 @@ class VideoReceiver(Application):
             frame_loss_rate = 1 - rcvd_frame_size_bytes / frame_size_bytes
         assert 0 <= frame_loss_rate <= 1
         rounded_frame_loss_rate = round(frame_loss_rate, 1)
-        mask = (self.table['frame_id'] == self.frame_id % self.nframes) & \
-                (self.table['model_id'] == model_id) & \
-                (self.table['loss'] == rounded_frame_loss_rate)
-        max_ssim = self.table[self.table['frame_id'] == self.frame_id % self.nframes]['ssim'].max()
-        min_ssim = self.table[self.table['frame_id'] == self.frame_id % self.nframes]['ssim'].min()
-
-        if len(self.table[mask]['ssim']) >= 1:
-            ssim = self.table[mask]['ssim'].iloc[0]
-        else:
-            ssim = -1
+        ssim = self.lookup_table.get_ssim(self.frame_id % self.nframes,
+                                          model_id, rounded_frame_loss_rate)
+        min_ssim, max_ssim = self.lookup_table.get_ssim_range(
+            self.frame_id % self.nframes)
         self.frame_quality = (ssim - min_ssim) / (max_ssim - min_ssim)
         self.frame_delay_ms = ts_ms - frame_encode_ts_ms
         if self.csv_writer:
@@ -247,6 +199,20 @@ class VideoReceiver(Application):
             else:
                 break
 
+    def next_event_ts_ms(self, ts_ms):
+        # only the playback deadline of a frame (other than the 1st frame)
+        # changes with time, everything else changes upon packet arrival
+        if self.frame_id == 0:
+            return ts_ms + 1 if self.can_decode(ts_ms + 1) else math.inf
+        if self.frame_id not in self.pkt_queue or \
+           self.frame_id + 1 not in self.pkt_queue:
+            return math.inf
+        frame_info = self.pkt_queue[self.frame_id]
+        if frame_info['rcvd_frame_size_bytes'] / frame_info['frame_size_bytes'] < 0.1:
+            return math.inf
+        return max(ts_ms + 1, self.first_decode_ts_ms +
+                   math.ceil(self.frame_id * 1000 / self.fps))
+
     def can_decode(self, ts_ms):
         if self.frame_id in self.pkt_queue:
             frame_info = self.pkt_queue[self.frame_id]
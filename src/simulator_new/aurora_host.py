@@ -4,8 +4,10 @@ from simulator_new.packet import Packet
 
 class AuroraHost(Host):
 
-    def __init__(self, id, tx_link, rx_link, cc, rtx_mngr, app, save_dir=None) -> None:
-        super().__init__(id, tx_link, rx_link, cc, rtx_mngr, app, save_dir)
+    def __init__(self, id, tx_link, rx_link, cc, rtx_mngr, app, save_dir=None,
+                 log_config=None) -> None:
+        super().__init__(id, tx_link, rx_link, cc, rtx_mngr, app, save_dir,
+                         log_config)
         # self.pacer.max_budget_byte = 20 * MSS
 
     def _on_pkt_rcvd(self, pkt):
@@ -17,14 +19,13 @@ class AuroraHost(Host):
             if self.recorder:
                 self.recorder.on_pkt_rcvd(self.ts_ms, pkt)
             # send ack pkt
-            app_data = {}
+            ack_pkt = self._new_ctrl_pkt(pkt.pkt_id, Packet.ACK_PKT, 80)
             if hasattr(self.app, 'frame_id') and \
                hasattr(self.app, 'frame_quality') and \
                hasattr(self.app, 'frame_delay_ms'):
-                app_data = {'frame_id': self.app.frame_id,  # frame id to decode
-                            'frame_delay_ms': self.app.frame_delay_ms,
-                            'frame_quality': self.app.frame_quality}
-            ack_pkt = self.pkt_cls(pkt.pkt_id, Packet.ACK_PKT, 80, app_data)
+                ack_pkt.frame_id = self.app.frame_id  # frame id to decode
+                ack_pkt.frame_delay_ms = self.app.frame_delay_ms
+                ack_pkt.frame_quality = self.app.frame_quality
             ack_pkt.ts_sent_ms = self.ts_ms
             if ack_pkt.ts_first_sent_ms == 0:
                 ack_pkt.ts_first_sent_ms = self.ts_ms
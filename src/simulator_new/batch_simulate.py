@@ -0,0 +1,267 @@
+import argparse
+import csv
+import glob
+import os
+import random
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+
+import numpy as np
+
+from simulator_new.app.video_conferencing.lookup_table import AELookupTable
+from simulator_new.net_simulator import Simulator
+from simulator_new.registry import APP_SPECS, CC_SPECS
+from simulator_new.streaming_trace import StreamingTrace
+from simulator_new.trace import Trace
+from simulator_new.vectorized_simulator import SUPPORTED_CCS, simulate_traces
+
+SUMMARY_FIELDS = ['trace', 'cc', 'app', 'save_dir', 'trace_avg_bw_mbps',
+                  'pkts_sent', 'bytes_sent', 'pkts_acked', 'bytes_acked',
+                  'pkts_lost', 'bytes_lost', 'pkts_rcvd', 'bytes_rcvd',
+                  'tx_rate_Bps', 'rx_rate_Bps', 'time_used_sec', 'error']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("Simulate a batch of traces in parallel")
+    parser.add_argument(
+        '--traces',
+        type=str,
+        nargs="+",
+        required=True,
+        help="Trace files, directories of json traces, glob patterns or txt "
+        "files listing one trace per line. .bin files are streaming traces, "
+        "see simulator_new.streaming_trace.",
+    )
+    parser.add_argument(
+        "--lookup-table",
+        type=str,
+        default="./AE_lookup_table/segment_3IY83M-m6is_480x360.mp4.csv",
+        help="A look up table file.",
+    )
+    parser.add_argument(
+        "--save-dir",
+        type=str,
+        default=".",
+        help="A direcotry to save the results.",
+    )
+    parser.add_argument(
+        "--cc",
+        type=str,
+        nargs="+",
+        default=["gcc"],
+        choices=tuple(CC_SPECS),
+        help="Congestion controls to run on every trace.",
+    )
+    parser.add_argument(
+        '--app',
+        type=str,
+        nargs="+",
+        default=["video_streaming"],
+        choices=tuple(APP_SPECS),
+        help="Applications to run on every trace.",
+    )
+    parser.add_argument(
+        '--ae-guided',
+        action="store_true",
+        help="AE guide reward if specified.",
+    )
+    parser.add_argument(
+        '--model',
+        type=str,
+        default="",
+        help='Path to an RL model (Aurora).'
+    )
+    parser.add_argument(
+        '--nproc',
+        type=int,
+        default=os.cpu_count(),
+        help='Number of worker processes.'
+    )
+    parser.add_argument(
+        '--log-level',
+        type=str,
+        default="full",
+        choices=("off", "summary", "sampled", "full"),
+        help='Log level of every run, see simulator_new.log_config.'
+    )
+    parser.add_argument(
+        '--pantheon-queue',
+        type=int,
+        default=100,
+        help='Queue size in packets used with pantheon traces.'
+    )
+    parser.add_argument(
+        '--vectorized',
+        action="store_true",
+        help='Simulate oracle file transfers of all traces at once with '
+        'simulator_new.vectorized_simulator. No logs are saved for them.'
+    )
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=42,
+        help='Random seed of every run.'
+    )
+    return parser.parse_args()
+
+
+def expand_trace_files(trace_specs):
+    """Return the trace files given by a list of files, directories, glob
+    patterns and txt files listing one trace per line."""
+    trace_files = []
+    for spec in trace_specs:
+        if spec.endswith('.txt'):
+            with open(spec, 'r') as f:
+                trace_files += [line.strip() for line in f if line.strip()]
+        elif os.path.isdir(spec):
+            trace_files += sorted(glob.glob(os.path.join(spec, '*.json')))
+        elif glob.has_magic(spec):
+            trace_files += sorted(glob.glob(spec))
+        else:
+            trace_files.append(spec)
+    return trace_files
+
+
+def load_trace(trace_file, pantheon_queue=100):
+    if trace_file.endswith('.bin'):
+        return StreamingTrace(trace_file)
+    if 'datalink' in os.path.basename(trace_file):
+        return Trace.load_from_pantheon_file(
+            trace_file, loss=0, queue=pantheon_queue)
+    return Trace.load_from_file(trace_file)
+
+
+def get_run_dir(save_dir, trace_file, cc, app):
+    """Pantheon traces share file names across directories, so the run dir
+    is named after the trace file and its parent directory."""
+    parent = os.path.basename(os.path.dirname(os.path.abspath(trace_file)))
+    name = os.path.splitext(os.path.basename(trace_file))[0]
+    return os.path.join(save_dir, '{}_{}'.format(cc, app),
+                        '{}_{}'.format(parent, name))
+
+
+def init_worker(lookup_table_path):
+    """Load the lookup table once per worker process."""
+    if lookup_table_path and os.path.exists(lookup_table_path):
+        AELookupTable.load(lookup_table_path)
+
+
+def run_one(run):
+    """Simulate one (trace, cc, app) setting and return its summary row."""
+    t_start = time.time()
+    row = {'trace': run['trace'], 'cc': run['cc'], 'app': run['app'],
+           'save_dir': run['save_dir'], 'error': ''}
+    try:
+        random.seed(run['seed'])
+        np.random.seed(run['seed'])
+        trace = load_trace(run['trace'], run['pantheon_queue'])
+        simulator = Simulator(
+            trace, run['save_dir'], run['cc'], run['app'],
+            model_path=run['model'], lookup_table_path=run['lookup_table'],
+            ae_guided=run['ae_guided'], log_level=run['log_level'])
+        simulator.simulate(int(trace.duration), summary=False)
+        row['trace_avg_bw_mbps'] = trace.avg_bw
+        row.update(simulator.recorder.summary_stats())
+    except Exception:
+        # keep the rest of the batch going, the error ends up in the table
+        row['error'] = traceback.format_exc().strip().splitlines()[-1]
+    row['time_used_sec'] = time.time() - t_start
+    return row
+
+
+def run_vectorized(runs):
+    """Simulate runs of the same cc with a file transfer all at once."""
+    t_start = time.time()
+    rows = [{'trace': run['trace'], 'cc': run['cc'], 'app': run['app'],
+             'save_dir': '', 'error': ''} for run in runs]
+    traces = []
+    for row, run in zip(rows, runs):
+        try:
+            traces.append(load_trace(run['trace'], run['pantheon_queue']))
+        except Exception:
+            row['error'] = traceback.format_exc().strip().splitlines()[-1]
+    ok_rows = [row for row in rows if not row['error']]
+    if traces:
+        res = simulate_traces(traces, runs[0]['cc'], seed=runs[0]['seed'])
+        for i, (row, trace) in enumerate(zip(ok_rows, traces)):
+            row['trace_avg_bw_mbps'] = trace.avg_bw
+            stats = res.summary_stats(i)
+            row.update({key: stats[key] for key in SUMMARY_FIELDS if key in stats})
+    time_used_sec = (time.time() - t_start) / max(len(runs), 1)
+    for row in rows:
+        row['time_used_sec'] = time_used_sec
+    return rows
+
+
+def run_batch(trace_files, ccs, apps, save_dir, nproc=1, **kwargs):
+    """Run every (trace, cc, app) combination across nproc worker processes.
+
+    Each run writes its logs to its own directory under save_dir. With
+    vectorized=True, file transfers with a cc in SUPPORTED_CCS are simulated
+    by run_vectorized() instead. Return the summary rows in the order of the
+    runs.
+    """
+    runs = []
+    for trace_file, cc, app in product(trace_files, ccs, apps):
+        run = {'trace': trace_file, 'cc': cc, 'app': app,
+               'save_dir': get_run_dir(save_dir, trace_file, cc, app),
+               'model': kwargs.get('model', ''),
+               'lookup_table': kwargs.get('lookup_table', ''),
+               'ae_guided': kwargs.get('ae_guided', False),
+               'log_level': kwargs.get('log_level', 'full'),
+               'pantheon_queue': kwargs.get('pantheon_queue', 100),
+               'seed': kwargs.get('seed', 42)}
+        runs.append(run)
+    rows = [None] * len(runs)
+    if kwargs.get('vectorized', False):
+        for cc in ccs:
+            idxs = [i for i, run in enumerate(runs) if run['cc'] == cc and
+                    run['app'] == 'file_transfer' and cc in SUPPORTED_CCS]
+            if idxs:
+                for i, row in zip(idxs, run_vectorized([runs[i] for i in idxs])):
+                    rows[i] = row
+    idxs = [i for i, row in enumerate(rows) if row is None]
+    lookup_table = kwargs.get('lookup_table', '')
+    if nproc <= 1:
+        init_worker(lookup_table)
+        pool_rows = [run_one(runs[i]) for i in idxs]
+    else:
+        with ProcessPoolExecutor(max_workers=nproc, initializer=init_worker,
+                                 initargs=(lookup_table,)) as executor:
+            pool_rows = list(executor.map(run_one, [runs[i] for i in idxs]))
+    for i, row in zip(idxs, pool_rows):
+        rows[i] = row
+    return rows
+
+
+def save_summary(rows, filename):
+    with open(filename, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS,
+                                lineterminator='\n')
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main():
+    args = parse_args()
+    trace_files = expand_trace_files(args.traces)
+    os.makedirs(args.save_dir, exist_ok=True)
+    rows = run_batch(trace_files, args.cc, args.app, args.save_dir,
+                     nproc=args.nproc, model=args.model,
+                     lookup_table=args.lookup_table, ae_guided=args.ae_guided,
+                     log_level=args.log_level,
+                     pantheon_queue=args.pantheon_queue, seed=args.seed,
+                     vectorized=args.vectorized)
+    summary_file = os.path.join(args.save_dir, 'batch_summary.csv')
+    save_summary(rows, summary_file)
+    nerrors = sum(1 for row in rows if row['error'])
+    print("{} runs, {} failed, summary saved to {}".format(
+        len(rows), nerrors, summary_file))
+
+
+if __name__ == "__main__":
+    t_start = time.time()
+    main()
+    print("time used: {:.2f}s".format(time.time() - t_start))
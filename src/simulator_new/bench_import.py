@@ -0,0 +1,75 @@
+"""Measure the import time of simulator_new modules.
+
+Every module is imported in a fresh interpreter, so that modules imported by
+an earlier one are not cached. Heavy dependencies pulled in by the import
+are listed next to the time.
+
+    python -m simulator_new.bench_import --repeat 5
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+MODULES = ['simulator_new.net_simulator', 'simulator_new.cc',
+           'simulator_new.app', 'simulator_new.trace',
+           'simulator_new.cc.pcc.aurora.aurora']
+
+HEAVY_DEPS = ['tensorflow', 'stable_baselines', 'gym', 'matplotlib', 'pandas']
+
+_IMPORT_SCRIPT = """
+import json, sys, time
+t_start = time.perf_counter()
+import {module}
+t_used = time.perf_counter() - t_start
+print(json.dumps([t_used, [dep for dep in {deps!r} if dep in sys.modules]]))
+"""
+
+
+def measure_import(module, repeat=3):
+    """Return the best import time in seconds of module over repeat fresh
+    interpreters and the heavy dependencies it imports.
+
+    Raise ImportError with the last line of the traceback if the import
+    fails, e.g. because a dependency is not installed.
+    """
+    best = None
+    deps = []
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, '-c',
+             _IMPORT_SCRIPT.format(module=module, deps=HEAVY_DEPS)],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            universal_newlines=True)
+        if proc.returncode != 0:
+            lines = proc.stderr.strip().splitlines()
+            raise ImportError(lines[-1] if lines else
+                              "exit code {}".format(proc.returncode))
+        t_used, deps = json.loads(proc.stdout.strip().splitlines()[-1])
+        best = t_used if best is None else min(best, t_used)
+    return best, deps
+
+
+def main():
+    parser = argparse.ArgumentParser("Measure simulator_new import times.")
+    parser.add_argument('--modules', type=str, nargs="+", default=MODULES,
+                        help="Modules to import.")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="Number of fresh interpreters per module.")
+    args = parser.parse_args()
+    failed = False
+    for module in args.modules:
+        try:
+            t_used, deps = measure_import(module, args.repeat)
+        except ImportError as e:
+            failed = True
+            print("{:<40} {:>10}  {}".format(module, 'failed', e))
+            continue
+        print("{:<40} {:8.1f}ms  {}".format(
+            module, t_used * 1000, ', '.join(deps) or '-'))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,15 @@
 from simulator_new.cc.cc import CongestionControl, NoCC, OracleCC, OracleNoPredictCC
-from simulator_new.cc.pcc.aurora.aurora import Aurora
-from simulator_new.cc.bbr.bbr_v1 import BBRv1
-from simulator_new.cc.gcc.gcc import GCC
+
+# imported on first access, see simulator_new.registry
+_LAZY_CLASSES = {
+    'Aurora': 'simulator_new.cc.pcc.aurora.aurora.Aurora',
+    'BBRv1': 'simulator_new.cc.bbr.bbr_v1.BBRv1',
+    'GCC': 'simulator_new.cc.gcc.gcc.GCC',
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_CLASSES:
+        from simulator_new.registry import import_class
+        return import_class(_LAZY_CLASSES[name])
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
@@ -98,6 +98,9 @@ class BBRv1(CongestionControl):
     def tick(self, ts_ms):
         self.ts_ms = ts_ms
 
+    def next_event_ts_ms(self, ts_ms):
+        return math.inf
+
     def reset(self):
         super().reset()
         self.btlbw_Bps = 0  # bottleneck bw in bytes/sec
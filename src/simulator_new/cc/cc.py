@@ -1,8 +1,14 @@
 from abc import abstractmethod
+import math
 
 from simulator_new.clock import ClockObserver
 
 class CongestionControl(ClockObserver):
+    # whether get_est_rate_Bps() depends on its time window and not only on
+    # the state of the congestion control, e.g. for an oracle reading the
+    # trace. The pacer then asks for the estimate at every rate update.
+    TIME_VARYING_EST_RATE = False
+
     def __init__(self) -> None:
         self.host = None
 
@@ -38,6 +44,9 @@ class NoCC(CongestionControl):
     def tick(self, ts_ms):
         pass
 
+    def next_event_ts_ms(self, ts_ms):
+        return math.inf
+
     def reset(self):
         pass
 
@@ -45,6 +54,8 @@ class NoCC(CongestionControl):
         return 0
 
 class OracleCC(CongestionControl):
+    TIME_VARYING_EST_RATE = True
+
     def __init__(self, trace) -> None:
         super().__init__()
         self.trace = trace
@@ -61,6 +72,11 @@ class OracleCC(CongestionControl):
     def tick(self, ts_ms):
         pass
 
+    def next_event_ts_ms(self, ts_ms):
+        # the estimate only changes at the rate updates of the pacer, which
+        # asks for it also when the updates are skipped
+        return math.inf
+
     def reset(self):
         pass
 
@@ -71,6 +87,8 @@ class OracleCC(CongestionControl):
 
 
 class OracleNoPredictCC(CongestionControl):
+    TIME_VARYING_EST_RATE = True
+
     def __init__(self, trace) -> None:
         super().__init__()
         self.trace = trace
@@ -87,6 +105,11 @@ class OracleNoPredictCC(CongestionControl):
     def tick(self, ts_ms):
         pass
 
+    def next_event_ts_ms(self, ts_ms):
+        # the estimate only changes at the rate updates of the pacer, which
+        # asks for it also when the updates are skipped
+        return math.inf
+
     def reset(self):
         pass
 
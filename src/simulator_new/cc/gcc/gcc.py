@@ -1,10 +1,9 @@
-import csv
-# import math
-import os
+import math
 from enum import Enum
 
 from simulator_new.cc import CongestionControl
 from simulator_new.cc.gcc.probe import ProbeController, estimate_probed_rate_Bps
+from simulator_new.log_config import LogConfig
 
 GCC_START_RATE_BYTE_PER_SEC = 12500 * 3
 GCC_START_GAMMA = 5
@@ -232,23 +231,19 @@ class LossBasedController:
 
 class GCC(CongestionControl):
 
-    def __init__(self, save_dir=None) -> None:
+    def __init__(self, save_dir=None, log_config=None) -> None:
         super().__init__()
         self.loss_based_controller = LossBasedController()
         self.delay_based_controller = DelayBasedController()
         self.save_dir = save_dir
+        self.log_config = log_config or LogConfig()
         self.gcc_log_path = None
-        self.gcc_log = None
         self.csv_writer = None
         self.est_rate_Bps = GCC_START_RATE_BYTE_PER_SEC
         self.bwe_incoming_Bps = GCC_START_RATE_BYTE_PER_SEC
         self.probe_ctlr = ProbeController(self, self.est_rate_Bps)
         self.probe_ctlr.set_estimated_rate_Bps(self.est_rate_Bps)
 
-    def __del__(self):
-        if self.gcc_log:
-            self.gcc_log.close()
-
     def get_est_rate_Bps(self, start_ts_ms, end_ts_ms):
         return self.est_rate_Bps
 
@@ -282,16 +277,12 @@ class GCC(CongestionControl):
         self.delay_based_controller.register_host(host)
         assert self.host
 
-        if self.save_dir:
-            os.makedirs(self.save_dir, exist_ok=True)
-            self.gcc_log_path = os.path.join(self.save_dir, 'gcc_log_{}.csv'.format(self.host.id))
-            self.gcc_log = open(self.gcc_log_path, 'w', 1)
-            self.csv_writer = csv.writer(self.gcc_log, lineterminator='\n')
-            self.csv_writer.writerow(
-                ['timestamp_ms', "est_rate_Bps", "delay_based_est_rate_Bps",
-                 "loss_based_est_rate_Bps", "remote_rate_controller_state",
-                 "delay_gradient", "delay_gradient_hat", "gamma",
-                 'loss_fraction', 'rcv_rate_Bps', "overuse_signal"])
+        self.gcc_log_path, self.csv_writer = self.log_config.open_csv(
+            self.save_dir, 'gcc', 'gcc_log_{}.csv'.format(self.host.id),
+            ['timestamp_ms', "est_rate_Bps", "delay_based_est_rate_Bps",
+             "loss_based_est_rate_Bps", "remote_rate_controller_state",
+             "delay_gradient", "delay_gradient_hat", "gamma",
+             'loss_fraction', 'rcv_rate_Bps', "overuse_signal"])
 
     def on_pkt_rcvd(self, ts_ms, pkt):
         if pkt.is_rtp_pkt():
@@ -357,6 +348,13 @@ class GCC(CongestionControl):
         if self.probe_ctlr.is_enabled():
             self.est_rate_Bps = self.probe_ctlr.get_probe_rate_Bps()
 
+    def next_event_ts_ms(self, ts_ms):
+        # bandwidth probing is timed, everything else is driven by packets
+        if self.probe_ctlr.is_enabled() and \
+           self.est_rate_Bps != self.probe_ctlr.get_probe_rate_Bps():
+            return ts_ms + 1
+        return self.probe_ctlr.next_event_ts_ms(ts_ms)
+
     def reset(self):
         self.delay_based_controller.reset()
         self.loss_based_controller.reset()
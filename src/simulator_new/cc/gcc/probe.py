@@ -1,3 +1,5 @@
+import math
+
 def estimate_probed_rate_Bps(probe_info):
     send_interval_ms =  probe_info["last_pkt_sent_ts_ms"] - probe_info["first_pkt_sent_ts_ms"]
     send_size_byte = probe_info['tot_size_byte'] - probe_info['last_pkt_sent_size_byte']
@@ -83,8 +85,7 @@ class ProbeController:
         return self.enabled
 
     def mark_pkt(self, pkt):
-        pkt.app_data['probe'] = 1
-        pkt.app_data['probe_cluster_id'] = self.probe_cluster_id
+        pkt.probe_cluster_id = self.probe_cluster_id
 
     def get_probe_rate_Bps(self):
         # print("probe rate", self.probe_rate_Bps * 8e-6, "Mbps")
@@ -96,6 +97,12 @@ class ProbeController:
     def tick(self, ts_ms):
         self._update_state(ts_ms)
 
+    def next_event_ts_ms(self, ts_ms):
+        # a probe ends on a tick once it is long enough and has enough packets
+        if not self.enabled or self.probe_pkt_cnt <= self.MIN_PROBE_PACKETS_SENT:
+            return math.inf
+        return max(ts_ms + 1, self.probe_start_ts_ms + self.MIN_PROBE_DURATION_MS + 1)
+
     def on_report(self, probe_info):
         send_interval_ms =  probe_info["last_pkt_sent_ts_ms"] - probe_info["first_pkt_sent_ts_ms"]
         send_size_byte = probe_info['tot_size_byte'] - probe_info['last_pkt_sent_size_byte']
@@ -1,14 +1,13 @@
-import csv
-import os
+import math
 from typing import List, Optional
 
 import numpy as np
-from gym import spaces
 
 from simulator_new.cc import CongestionControl
 from simulator_new.cc.pcc.aurora.monitor_interval import MonitorInterval, MonitorIntervalHistory
 from simulator_new.cc.pcc.aurora.aurora_agent import AuroraAgent
 from simulator_new.constant import MSS
+from simulator_new.log_config import LogConfig
 
 
 def pcc_aurora_reward(tput_pkt_per_sec: float, delay_sec: float, loss: float,
@@ -36,28 +35,23 @@ class Aurora(CongestionControl):
     def __init__(self, model_path: str, history_len: int = 10,
                  features: List[str] = ["sent latency inflation",
                                         "latency ratio", "recv ratio"],
-                 save_dir: str ="", ae_guided=False) -> None:
+                 save_dir: str ="", ae_guided=False,
+                 log_config: Optional[LogConfig] = None) -> None:
         super().__init__()
         self.ae_guided = ae_guided
         self.save_dir = save_dir
-        if self.save_dir:
-            os.makedirs(save_dir, exist_ok=True)
-            self.mi_log_path = os.path.join(self.save_dir, 'aurora_mi_log.csv')
-            self.mi_log = open(self.mi_log_path, 'w', 1)
-            self.csv_writer = csv.writer(self.mi_log, lineterminator='\n')
-            self.csv_writer.writerow(
-                ['timestamp_ms', "pacing_rate_Bps", "est_rate_Bps",
-                 "send_rate_Bps", 'recv_rate_Bps',
-                 'latency_ms', 'loss_ratio', 'reward', "action", "bytes_sent",
-                 "bytes_acked", "bytes_lost", "send_start_time_ms",
-                 "send_end_time_ts", 'recv_start_time_ts', 'recv_end_time_ts',
-                 'latency_increase', 'min_lat_ms', 'sent_latency_inflation',
-                 'latency_ratio', "recv_ratio", "queue_delay", 'pkt_in_queue',
-                 'bytes_in_queue', "queue_capacity_bytes", 'rtt_ms_samples'])
-        else:
-            self.mi_log_path = None
-            self.mi_log = None
-            self.csv_writer = None
+        self.log_config = log_config or LogConfig()
+        self.mi_log_path, self.csv_writer = self.log_config.open_csv(
+            self.save_dir, 'aurora_mi', 'aurora_mi_log.csv',
+            ['timestamp_ms', "pacing_rate_Bps", "est_rate_Bps",
+             "send_rate_Bps", 'recv_rate_Bps',
+             'latency_ms', 'loss_ratio', 'reward', "action", "bytes_sent",
+             "bytes_acked", "bytes_lost", "send_start_time_ms",
+             "send_end_time_ts", 'recv_start_time_ts', 'recv_end_time_ts',
+             'latency_increase', 'min_lat_ms', 'sent_latency_inflation',
+             'latency_ratio', "recv_ratio", "queue_delay", 'pkt_in_queue',
+             'bytes_in_queue', "queue_capacity_bytes", 'rtt_ms_cnt',
+             'min_rtt_ms', 'max_rtt_ms'])
         self.model_path = model_path
         self.features = features
         self.history_len = history_len
@@ -68,13 +62,17 @@ class Aurora(CongestionControl):
         self.mi_history = MonitorIntervalHistory(history_len, features)
         self.mi = MonitorInterval()
         self.reward = 0
+        # action of an MI finished by finish_mi(), applied on the next tick
+        self.pending_action_ts_ms = None
+        self.pending_action = 0
+        from gym import spaces  # not imported with the module, it is slow
         min_obs_vec, max_obs_vec = self.mi_history.get_min_max_obs_vectors()
         self.observation_space = spaces.Box(
             min_obs_vec, max_obs_vec, dtype=np.float32)
         self.action_space = spaces.Box(np.array([-1e12]), np.array([1e12]), dtype=np.float32)
 
         if self.model_path:
-            self.agent = AuroraAgent.from_model_path(
+            self.agent = AuroraAgent.load(
                 model_path, self.observation_space, self.action_space)
         else:
             self.agent = None
@@ -88,10 +86,6 @@ class Aurora(CongestionControl):
         self.last_decode_ack_ts_ms = None
         # for AE_guided Aurora end
 
-    def __del__(self):
-        if self.mi_log:
-            self.mi_log.close()
-
     def register_host(self, host):
         super().register_host(host)
 
@@ -111,28 +105,55 @@ class Aurora(CongestionControl):
         self.got_data = True
         self.mi.on_pkt_acked(ts_ms, pkt)
         # for AE_guided Aurora start
-        if 'frame_id' in pkt.app_data:
-            if self.frame_id != pkt.app_data['frame_id'] - 1 and self.mi.pkts_sent >= 2 and self.got_data:
-                self.frame_quality = pkt.app_data['frame_quality']
-                self.frame_delay_ms = pkt.app_data['frame_delay_ms']
+        if pkt.frame_id is not None:
+            if self.frame_id != pkt.frame_id - 1 and self.mi.pkts_sent >= 2 and self.got_data:
+                self.frame_quality = pkt.frame_quality
+                self.frame_delay_ms = pkt.frame_delay_ms
                 self.last_decode_ack_ts_ms = ts_ms
-            if self.frame_id != pkt.app_data['frame_id'] - 1:
-                self.frame_id = pkt.app_data['frame_id'] - 1
+            if self.frame_id != pkt.frame_id - 1:
+                self.frame_id = pkt.frame_id - 1
         # for AE_guided Aurora end
 
     def on_pkt_lost(self, ts_ms, pkt):
         self.mi.on_pkt_lost(ts_ms, pkt)
 
+    def is_mi_finished(self, ts_ms):
+        """Return True if the current MI finishes at the tick of ts_ms."""
+        if self.ae_guided and self.frame_id == -1:
+            return False
+        return ts_ms >= self.mi_end_ts_ms and self.mi.pkts_sent >= 2 and self.got_data
+
     def tick(self, ts_ms):
+        if self.pending_action_ts_ms == ts_ms:
+            # the MI was finished and its action computed by the caller
+            self._apply_mi_action(ts_ms, self.pending_action)
+            self.pending_action_ts_ms = None
+        elif self.is_mi_finished(ts_ms):
+            self._on_mi_finish(ts_ms)
+        else:
+            return
         if self.ae_guided:
             # for AE_guided Aurora start
-            if ts_ms >= self.mi_end_ts_ms and self.frame_id != -1 and self.mi.pkts_sent >= 2 and self.got_data:
-                self._on_mi_finish(ts_ms)
-                self.frame_quality = -1
+            self.frame_quality = -1
             # for AE_guided Aurora end
-        else:
-            if ts_ms >= self.mi_end_ts_ms and self.mi.pkts_sent >= 2 and self.got_data:
-                self._on_mi_finish(ts_ms)
+
+    def finish_mi(self, ts_ms):
+        """Finish the current MI ahead of the tick of ts_ms and return its
+        observation. The action passed to set_mi_action() is applied on the
+        tick of ts_ms, which must follow without any packet event in
+        between."""
+        assert self.is_mi_finished(ts_ms)
+        return self._end_mi(ts_ms)
+
+    def set_mi_action(self, ts_ms, action):
+        self.pending_action_ts_ms = ts_ms
+        self.pending_action = action
+
+    def next_event_ts_ms(self, ts_ms):
+        if self.mi.pkts_sent < 2 or not self.got_data or \
+           (self.ae_guided and self.frame_id == -1):
+            return math.inf
+        return max(ts_ms + 1, math.ceil(self.mi_end_ts_ms))
 
     def reset(self):
         # for AE_guided Aurora start
@@ -148,6 +169,8 @@ class Aurora(CongestionControl):
         self.mi = MonitorInterval()
         self.reward = 0
         self.est_rate_Bps = Aurora.START_PACING_RATE_BYTE_PER_SEC
+        self.pending_action_ts_ms = None
+        self.pending_action = 0
 
     def apply_rate_delta(self, delta):
         assert self.host
@@ -164,6 +187,17 @@ class Aurora(CongestionControl):
         return self.mi_history.as_array()
 
     def _on_mi_finish(self, ts_ms):
+        obs = self._end_mi(ts_ms)
+        if self.agent:
+            action, _ = self.agent.predict(obs)
+            action = action[0]
+        else:
+            action = 0
+        self._apply_mi_action(ts_ms, action)
+
+    def _end_mi(self, ts_ms):
+        """Compute the reward of the current MI, append it to the MI history
+        and return the observation vector."""
         # compute reward
         tput, _, _, _ = self.mi.get("recv rate")  # bytes/sec
         lat, _, _, _ = self.mi.get("avg latency")  # ms
@@ -194,13 +228,9 @@ class Aurora(CongestionControl):
             self.mi_end_ts_ms = ts_ms + self.mi_duration_ms
 
         self.mi_history.step(self.mi) # append current mi to mi history
-        obs = self.get_obs()  # obtain the observation vector
-        if self.agent:
-            action, _ = self.agent.predict(obs)
-            action = action[0]
-        else:
-            action = 0
+        return self.get_obs()  # obtain the observation vector
 
+    def _apply_mi_action(self, ts_ms, action):
         if self.csv_writer and self.host:
             self.csv_writer.writerow(
                 [ts_ms, self.host.pacer.pacing_rate_Bps, self.est_rate_Bps,
@@ -218,7 +248,8 @@ class Aurora(CongestionControl):
                  len(self.host.tx_link.queue),
                  self.host.tx_link.queue_size_bytes,
                  self.host.tx_link.queue_cap_bytes,
-                 self.mi.rtt_ms_samples])
+                 self.mi.rtt_ms_cnt, self.mi.min_latency_ms(),
+                 self.mi.max_latency_ms()])
         self.apply_rate_delta(action)
         # create a new mi
         prev_mi = self.mi_history.back()
@@ -1,37 +1,19 @@
-import warnings
-warnings.filterwarnings("ignore")
-
 import numpy as np
-import tensorflow as tf
-tf.compat.v1.logging.set_verbosity(tf.compat.v1.logging.ERROR)
-
-from gym import spaces
-from stable_baselines.common.policies import FeedForwardPolicy
 
+from simulator_new.cc.pcc.aurora.numpy_policy import NumpyMlpPolicy
 
-class MyMlpPolicy(FeedForwardPolicy):
+# process-level registry of agents restored from model checkpoints
+_AGENTS = {}
 
-    def __init__(self, sess, ob_space, ac_space, n_env, n_steps, n_batch,
-                 reuse=False, **_kwargs):
-        super(MyMlpPolicy, self).__init__(sess, ob_space, ac_space, n_env,
-                                          n_steps, n_batch, reuse, net_arch=[
-                                              {"pi": [32, 16], "vf": [32, 16]}],
-                                          feature_extraction="mlp", **_kwargs)
 
-    def step(self, obs, state=None, mask=None, deterministic=False, saliency=False):
-        if deterministic:
-            action, value, neglogp = self.sess.run([self.deterministic_action, self.value_flat, self.neglogp],
-                                                   {self.obs_ph: obs})
-            if saliency:
-                grad = self.sess.run(tf.gradients(self.deterministic_action, self.obs_ph), {self.obs_ph: obs})[0]
-                return action, value, self.initial_state, neglogp, grad
+class AuroraAgent:
+    """Deterministic Aurora policy.
 
-        else:
-            action, value, neglogp = self.sess.run([self.action, self.value_flat, self.neglogp],
-                                                   {self.obs_ph: obs})
-        return action, value, self.initial_state, neglogp
+    The policy is either a TF1 MyMlpPolicy, or a NumpyMlpPolicy when the
+    model path is a .npz file exported by simulator_new.cc.pcc.aurora.
+    numpy_policy, in which case tensorflow is never imported.
+    """
 
-class AuroraAgent:
     def __init__(self, policy, observation_space, action_space, model_path="") -> None:
         self.model_path = model_path
         self.observation_space = observation_space
@@ -39,23 +21,43 @@ class AuroraAgent:
         self.policy = policy
 
     def __del__(self):
-        if self.model_path and self.policy.sess:
+        if self.model_path and getattr(self.policy, 'sess', None):
             self.policy.sess.close()
 
+    def __reduce_ex__(self, protocol):
+        # copies of an agent restored from a model, e.g. in a Simulator
+        # checkpoint, are the agent of the process-level registry
+        if self.model_path:
+            return (AuroraAgent.load, (self.model_path, self.observation_space,
+                                       self.action_space))
+        return super().__reduce_ex__(protocol)
+
     def predict(self, obs):
-        obs = np.array(obs)
+        clipped_actions, states = self.predict_batch([obs])
+        return clipped_actions[0], states
+
+    def predict_batch(self, obs_batch):
+        """Return the actions of a batch of observations, computed by a
+        single policy step. With a NumpyMlpPolicy, they are the actions
+        predict() returns for each observation."""
+        obs = np.array(obs_batch)
         actions, _, states, _ = self.policy.step(
             obs.reshape((-1,) + self.observation_space.shape), deterministic=True)
 
+        from gym import spaces  # imported by the caller that built the spaces
         clipped_actions = actions
         # Clip the actions to avoid out of bound error
         if isinstance(self.action_space, spaces.Box):
             clipped_actions = np.clip(actions, self.action_space.low, self.action_space.high)
-        clipped_actions = clipped_actions[0]
         return clipped_actions, states
 
     @classmethod
     def from_model_path(cls, model_path, observation_space, action_space):
+        if model_path.endswith('.npz'):
+            policy = NumpyMlpPolicy.load(model_path)
+            return cls(policy, observation_space, action_space, model_path)
+        import tensorflow as tf
+        from simulator_new.cc.pcc.aurora.mlp_policy import MyMlpPolicy
         sess = tf.compat.v1.Session()
         policy = MyMlpPolicy(sess, observation_space, action_space, 1, 1, None)
         sess.run(tf.global_variables_initializer())
@@ -64,7 +66,18 @@ class AuroraAgent:
             saver.restore(sess, model_path)
         return cls(policy, observation_space, action_space, model_path)
 
+    @classmethod
+    def load(cls, model_path, observation_space, action_space):
+        """Restore a model once per process and share it between Aurora
+        instances, e.g. across the runs of a batch worker."""
+        if model_path not in _AGENTS:
+            _AGENTS[model_path] = cls.from_model_path(
+                model_path, observation_space, action_space)
+        return _AGENTS[model_path]
+
     @classmethod
     def from_policy(cls, policy, observation_space, action_space):
-        assert isinstance(policy, MyMlpPolicy)
+        if not isinstance(policy, NumpyMlpPolicy):
+            from simulator_new.cc.pcc.aurora.mlp_policy import MyMlpPolicy
+            assert isinstance(policy, MyMlpPolicy)
         return cls(policy, observation_space, action_space)
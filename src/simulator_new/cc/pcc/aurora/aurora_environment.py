@@ -12,51 +12,56 @@ from simulator_new.cc import Aurora
 
 class AuroraEnvironment(gym.Env):
 
-    def __init__(self, trace_scheduler: TraceScheduler, app='file_transfer', **kwargs):
-        """Network environment used in simulation."""
+    def __init__(self, trace_scheduler: TraceScheduler, app='file_transfer',
+                 cc='aurora', **kwargs):
+        """Network environment used in simulation.
+
+        cc is the name of an Aurora congestion control registered in
+        simulator_new.registry.
+        """
 
         self.trace_scheduler = trace_scheduler
         self.trace = self.trace_scheduler.get_trace()
 
-        self.simulator = Simulator(self.trace, "", "aurora", app=app, lookup_table_path=kwargs['lookup_table_path'],
+        self.simulator = Simulator(self.trace, "", cc, app=app, lookup_table_path=kwargs['lookup_table_path'],
                                    ae_guided=kwargs['ae_guided'])
-        assert isinstance(self.simulator.sender_cc, Aurora)
+        if not isinstance(self.simulator.sender_cc, Aurora):
+            raise ValueError("AuroraEnvironment needs an Aurora cc, got {}.".format(cc))
+        self.cc = self.simulator.sender_cc
 
         # construct sender and network
         self.ts_ms = 0
 
-        self.action_space = self.simulator.sender_cc.action_space
-        self.observation_space = self.simulator.sender_cc.observation_space
+        self.action_space = self.cc.action_space
+        self.observation_space = self.cc.observation_space
 
     def seed(self, seed=None):
         self.rand, seed = seeding.np_random(seed)
         return [seed]
 
     def step(self, action):
-        assert isinstance(self.simulator.sender_cc, Aurora)
-        self.simulator.sender_cc.apply_rate_delta(action)
-        prev_mi_id = self.simulator.sender_cc.mi_history.back().mi_id
-        while self.simulator.sender_cc.mi_history.back().mi_id <= prev_mi_id:
+        self.cc.apply_rate_delta(action)
+        prev_mi_id = self.cc.mi_history.back().mi_id
+        while self.cc.mi_history.back().mi_id <= prev_mi_id:
             self.ts_ms += 1
             self.simulator.tick(self.ts_ms)
-        reward = self.simulator.sender_cc.reward
-        obs = self.simulator.sender_cc.get_obs()
+        reward = self.cc.reward
+        obs = self.cc.get_obs()
 
         should_stop = self.trace.is_finished(self.ts_ms / 1000)
 
         return obs, reward, should_stop, {}
 
     def reset(self):
-        assert isinstance(self.simulator.sender_cc, Aurora)
         self.ts_ms = 0
         self.trace = self.trace_scheduler.get_trace()
         self.simulator.trace = self.trace
         self.simulator.reset()
-        prev_mi_id = self.simulator.sender_cc.mi_history.back().mi_id
-        while self.simulator.sender_cc.mi_history.back().mi_id <= prev_mi_id:
+        prev_mi_id = self.cc.mi_history.back().mi_id
+        while self.cc.mi_history.back().mi_id <= prev_mi_id:
             self.ts_ms += 1
             self.simulator.tick(self.ts_ms)
-        return self.simulator.sender_cc.get_obs()
+        return self.cc.get_obs()
 
 
 register(id='AuroraEnv-v1', entry_point='simulator_new.cc.pcc.aurora.aurora_environment:AuroraEnvironment')
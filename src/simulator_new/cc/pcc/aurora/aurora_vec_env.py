@@ -0,0 +1,213 @@
+"""AuroraEnvironments stepped together in worker processes.
+
+AuroraVecEnv runs envs_per_worker AuroraEnvironments in each of num_workers
+processes. Actions, observations, rewards and dones go through shared
+memory, so a step only sends a command to each worker and receives the
+infos back. It is a stable_baselines VecEnv, so it plugs into PPO2 in place
+of MPI ranks of PPO1, see train.py --num-workers.
+"""
+import copy
+import multiprocessing as mp
+from typing import List, Optional
+
+import numpy as np
+from stable_baselines.common.vec_env import VecEnv
+
+from simulator_new.utils import set_seed
+
+
+def _worker(remote, parent_remote, env_kwargs, env_start, envs_per_worker,
+            seed, buffers):
+    """Run envs_per_worker AuroraEnvironments, envs env_start to
+    env_start + envs_per_worker of the vec env, and serve the commands of
+    AuroraVecEnv."""
+    parent_remote.close()
+    from simulator_new.cc.pcc.aurora.aurora_environment import AuroraEnvironment
+
+    set_seed(seed)
+    envs = [AuroraEnvironment(**env_kwargs) for _ in range(envs_per_worker)]
+    env_slice = slice(env_start, env_start + envs_per_worker)
+    obs_buf = np.frombuffer(buffers['obs'], dtype=np.float32).reshape(
+        buffers['num_envs'], -1)[env_slice]
+    act_buf = np.frombuffer(buffers['actions'], dtype=np.float32).reshape(
+        buffers['num_envs'], -1)[env_slice]
+    rew_buf = np.frombuffer(buffers['rewards'], dtype=np.float64)[env_slice]
+    done_buf = np.frombuffer(buffers['dones'], dtype=np.bool_)[env_slice]
+    try:
+        while True:
+            cmd, data = remote.recv()
+            if cmd == 'step':
+                infos = []
+                for i, env in enumerate(envs):
+                    obs, reward, done, info = env.step(act_buf[i].copy())
+                    if done:
+                        info['terminal_observation'] = obs
+                        obs = env.reset()
+                    obs_buf[i] = obs
+                    rew_buf[i] = reward
+                    done_buf[i] = done
+                    infos.append(info)
+                remote.send(infos)
+            elif cmd == 'reset':
+                for i, env in enumerate(envs):
+                    obs_buf[i] = env.reset()
+                remote.send(None)
+            elif cmd == 'get_attr':
+                name, indices = data
+                remote.send([getattr(envs[i], name) for i in indices])
+            elif cmd == 'set_attr':
+                name, value, indices = data
+                for i in indices:
+                    setattr(envs[i], name, value)
+                remote.send(None)
+            elif cmd == 'env_method':
+                name, args, kwargs, indices = data
+                remote.send([getattr(envs[i], name)(*args, **kwargs)
+                             for i in indices])
+            elif cmd == 'close':
+                remote.close()
+                break
+            else:
+                raise NotImplementedError("Unknown command {}.".format(cmd))
+    except KeyboardInterrupt:
+        pass
+
+
+class AuroraVecEnv(VecEnv):
+    """num_workers * envs_per_worker AuroraEnvironments in num_workers
+    processes.
+
+    Env i runs in worker i // envs_per_worker. Every worker is seeded with
+    seed + its index and gets a copy of the trace scheduler. Envs are reset
+    when done, and the last observation of an episode is in the
+    'terminal_observation' of the info, as in SubprocVecEnv.
+
+    Args
+        env_kwargs: AuroraEnvironment kwargs, e.g. trace_scheduler, app,
+            lookup_table_path and ae_guided. They must be picklable.
+        num_workers: number of worker processes. Defaults to the number of
+            cpus.
+        envs_per_worker: number of envs stepped by each worker.
+        seed: seed of the first worker.
+        start_method: multiprocessing start method. Defaults to forkserver
+            if available, so that workers do not inherit the tensorflow
+            state of the training process.
+    """
+
+    def __init__(self, env_kwargs: dict, num_workers: Optional[int] = None,
+                 envs_per_worker: int = 1, seed: int = 42,
+                 start_method: Optional[str] = None) -> None:
+        num_workers = num_workers or mp.cpu_count()
+        num_envs = num_workers * envs_per_worker
+        self.envs_per_worker = envs_per_worker
+        self.waiting = False
+        self.closed = False
+        if start_method is None:
+            start_method = 'forkserver' \
+                if 'forkserver' in mp.get_all_start_methods() else 'spawn'
+        ctx = mp.get_context(start_method)
+
+        # the spaces of the envs, from one env that is then thrown away. It
+        # gets a copy of the trace scheduler, so that the traces it draws are
+        # not left in the scheduler inherited by forked workers.
+        from simulator_new.cc.pcc.aurora.aurora_environment import AuroraEnvironment
+        env = AuroraEnvironment(**dict(
+            env_kwargs, trace_scheduler=copy.deepcopy(env_kwargs['trace_scheduler'])))
+        observation_space, action_space = env.observation_space, env.action_space
+        del env
+
+        obs_dim = int(np.prod(observation_space.shape))
+        act_dim = int(np.prod(action_space.shape))
+        self.buffers = self._make_buffers(ctx, num_envs, obs_dim, act_dim)
+        self.obs_buf = np.frombuffer(self.buffers['obs'], dtype=np.float32).reshape(
+            (num_envs,) + observation_space.shape)
+        self.act_buf = np.frombuffer(self.buffers['actions'], dtype=np.float32).reshape(
+            num_envs, act_dim)
+        self.rew_buf = np.frombuffer(self.buffers['rewards'], dtype=np.float64)
+        self.done_buf = np.frombuffer(self.buffers['dones'], dtype=np.bool_)
+
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe() for _ in range(num_workers)])
+        self.processes = []
+        for worker_id, (work_remote, remote) in enumerate(
+                zip(self.work_remotes, self.remotes)):
+            process = ctx.Process(target=_worker, args=(
+                work_remote, remote, env_kwargs, worker_id * envs_per_worker,
+                envs_per_worker, seed + worker_id, self.buffers), daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+        VecEnv.__init__(self, num_envs, observation_space, action_space)
+
+    @staticmethod
+    def _make_buffers(ctx, num_envs, obs_dim, act_dim):
+        # one byte per done flag, read as np.bool_
+        return {'num_envs': num_envs,
+                'obs': ctx.RawArray('f', num_envs * obs_dim),
+                'actions': ctx.RawArray('f', num_envs * act_dim),
+                'rewards': ctx.RawArray('d', num_envs),
+                'dones': ctx.RawArray('b', num_envs)}
+
+    def step_async(self, actions):
+        self.act_buf[:] = np.asarray(actions, dtype=np.float32).reshape(
+            self.act_buf.shape)
+        for remote in self.remotes:
+            remote.send(('step', None))
+        self.waiting = True
+
+    def step_wait(self):
+        infos = [info for remote in self.remotes for info in remote.recv()]
+        self.waiting = False
+        return (self.obs_buf.copy(), self.rew_buf.copy(),
+                self.done_buf.copy(), infos)
+
+    def reset(self):
+        for remote in self.remotes:
+            remote.send(('reset', None))
+        for remote in self.remotes:
+            remote.recv()
+        return self.obs_buf.copy()
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send(('close', None))
+        for process in self.processes:
+            process.join()
+        self.closed = True
+
+    def _worker_indices(self, indices):
+        """Group env indices by worker as {worker id: [local env indices]}."""
+        worker_indices = {}
+        for i in self._get_indices(indices):
+            worker_indices.setdefault(i // self.envs_per_worker, []).append(
+                i % self.envs_per_worker)
+        return worker_indices
+
+    def _call(self, cmd, data_fn, indices):
+        worker_indices = self._worker_indices(indices)
+        for worker_id, local_indices in worker_indices.items():
+            self.remotes[worker_id].send((cmd, data_fn(local_indices)))
+        return [self.remotes[worker_id].recv() for worker_id in worker_indices]
+
+    def get_attr(self, attr_name, indices=None) -> List:
+        results = self._call('get_attr', lambda idx: (attr_name, idx), indices)
+        return [val for vals in results for val in vals]
+
+    def set_attr(self, attr_name, value, indices=None):
+        self._call('set_attr', lambda idx: (attr_name, value, idx), indices)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs) -> List:
+        results = self._call('env_method', lambda idx: (
+            method_name, method_args, method_kwargs, idx), indices)
+        return [val for vals in results for val in vals]
+
+    def _get_indices(self, indices):
+        if indices is None:
+            return range(self.num_envs)
+        if isinstance(indices, int):
+            return [indices]
+        return indices
@@ -0,0 +1,81 @@
+from typing import List, Optional
+
+from simulator_new.cc.pcc.aurora.aurora import Aurora
+from simulator_new.net_simulator import Simulator
+
+
+class LockstepSimulator:
+    """Run many Aurora simulators with batched policy inference.
+
+    Every simulator is advanced on its own until its sender reaches the end
+    of a monitor interval. The observations of all waiting simulators are
+    then sent through the policy in a single step, instead of one policy
+    step per MI and simulator. With a NumpyMlpPolicy, whose rows do not
+    depend on the rest of the batch, the logs are the same as running each
+    simulator on its own in event-driven mode, except on lossy links: their
+    losses are drawn from the global random module, so the draws are shared
+    between simulators. A TF policy may round batched actions differently.
+
+    Only inference is batched, so the speedup is bounded by its share of the
+    run time, e.g. 1.2x to 1.4x for 64 file transfers with the NumPy policy.
+
+    Args
+        simulators: simulators whose sender cc is Aurora.
+        agent: AuroraAgent used for all simulators. Defaults to the agent of
+            the first simulator. Without an agent, the action is always 0.
+    """
+
+    def __init__(self, simulators: List[Simulator], agent=None) -> None:
+        for sim in simulators:
+            if not isinstance(sim.sender_cc, Aurora):
+                raise ValueError("LockstepSimulator only runs Aurora senders.")
+        self.simulators = simulators
+        if agent is None and simulators:
+            agent = simulators[0].sender_cc.agent
+        self.agent = agent
+
+    def simulate(self, dur_sec: Optional[List[int]] = None, summary=False):
+        """Run simulator i for dur_sec[i] seconds, or for the duration of its
+        trace, in event-driven mode."""
+        if dur_sec is None:
+            dur_sec = [int(sim.trace.duration) for sim in self.simulators]
+        dur_ms = [dur * 1000 for dur in dur_sec]
+        ts_ms = [0] * len(self.simulators)
+        running = [i for i, dur in enumerate(dur_ms) if dur > 0]
+        while running:
+            waiting = []
+            for i in running:
+                if self._advance(i, ts_ms, dur_ms[i]):
+                    waiting.append(i)
+            if not waiting:
+                break
+            obs = [self.simulators[i].sender_cc.finish_mi(ts_ms[i])
+                   for i in waiting]
+            if self.agent:
+                actions, _ = self.agent.predict_batch(obs)
+                actions = [action[0] for action in actions]
+            else:
+                actions = [0] * len(waiting)
+            for i, action in zip(waiting, actions):
+                self.simulators[i].sender_cc.set_mi_action(ts_ms[i], action)
+            running = waiting
+        for sim in self.simulators:
+            sim.finish(summary)
+
+    def _advance(self, i, ts_ms, dur_ms):
+        """Tick simulator i until the tick at which an MI finishes, and
+        return True, or until the end of the simulation, and return False.
+        Mirror the event-driven loop of Simulator.simulate()."""
+        sim = self.simulators[i]
+        ts = ts_ms[i]
+        while ts < dur_ms:
+            if sim.sender_cc.is_mi_finished(ts) and \
+               sim.sender_cc.pending_action_ts_ms != ts:
+                ts_ms[i] = ts
+                return True
+            sim.tick(ts)
+            if ts == dur_ms - 1:
+                break
+            ts = min(sim.next_event_ts_ms(ts), dur_ms - 1)
+        ts_ms[i] = dur_ms
+        return False
@@ -0,0 +1,30 @@
+import warnings
+warnings.filterwarnings("ignore")
+
+import tensorflow as tf
+tf.compat.v1.logging.set_verbosity(tf.compat.v1.logging.ERROR)
+
+from stable_baselines.common.policies import FeedForwardPolicy
+
+
+class MyMlpPolicy(FeedForwardPolicy):
+
+    def __init__(self, sess, ob_space, ac_space, n_env, n_steps, n_batch,
+                 reuse=False, **_kwargs):
+        super(MyMlpPolicy, self).__init__(sess, ob_space, ac_space, n_env,
+                                          n_steps, n_batch, reuse, net_arch=[
+                                              {"pi": [32, 16], "vf": [32, 16]}],
+                                          feature_extraction="mlp", **_kwargs)
+
+    def step(self, obs, state=None, mask=None, deterministic=False, saliency=False):
+        if deterministic:
+            action, value, neglogp = self.sess.run([self.deterministic_action, self.value_flat, self.neglogp],
+                                                   {self.obs_ph: obs})
+            if saliency:
+                grad = self.sess.run(tf.gradients(self.deterministic_action, self.obs_ph), {self.obs_ph: obs})[0]
+                return action, value, self.initial_state, neglogp, grad
+
+        else:
+            action, value, neglogp = self.sess.run([self.action, self.value_flat, self.neglogp],
+                                                   {self.obs_ph: obs})
+        return action, value, self.initial_state, neglogp
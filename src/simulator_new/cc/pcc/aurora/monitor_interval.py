@@ -1,6 +1,13 @@
+from collections import deque
+
 import numpy as np
 
 class MonitorInterval:
+    """Stats of the packets sent, acked and lost during a monitor interval.
+
+    RTT samples are folded into running count, sum, min and max as they
+    come, so the cost of an MI does not grow with its number of acks.
+    """
     next_mi_id = 0
 
     def __init__(self,
@@ -27,39 +34,30 @@ class MonitorInterval:
         self.send_end_ts_ms = send_end_ts_ms
         self.recv_start_ts_ms = recv_start_ts_ms
         self.recv_end_ts_ms = recv_end_ts_ms
-        self.rtt_ms_samples = []
-        self.qdelay_ms_samples = []
+        self.rtt_ms_cnt = 0
+        self.rtt_ms_sum = 0
+        self.rtt_ms_min = 0
+        self.rtt_ms_max = 0
+        # sum of the first half of the rtt samples, and the samples of the
+        # second half, for latency_increase_ms()
+        self.first_half_rtt_ms_sum = 0
+        self.second_half_rtt_ms = deque()
+        self.qdelay_ms_cnt = 0
+        self.qdelay_ms_sum = 0
         self.conn_min_avg_lat_ms = conn_min_avg_lat_ms
         self.mi_id = MonitorInterval.next_mi_id
         MonitorInterval.next_mi_id += 1
 
-        self.metric_map = {
-            "send rate": (self.send_rate_Bps, 0.0, 1500e9, 1500e7),
-            "recv rate": (self.recv_rate_Bps, 0.0, 1500e9, 1500e7),
-            "recv dur": (self.recv_dur_ms, 0.0, 100000, 1),
-            "send dur": (self.send_dur_ms, 0.0, 100000, 1),
-            "avg latency": (self.avg_latency_ms, 0.0, 100000, 1),
-            "avg queue delay": (self.avg_queue_delay_ms, 0.0, 100000, 1),
-            "loss ratio": (self.loss_ratio, 0.0, 1.0, 1),
-            "ack latency inflation": (self.ack_latency_inflation, -1.0, 10.0, 1),
-            "sent latency inflation": (self.sent_latency_inflation, -1.0, 10.0, 1),
-            "conn min latency": (self.conn_min_latency_ms, 0.0, 100000, 1),
-            "latency increase": (self.latency_increase_ms, 0.0, 100000, 1),
-            "latency ratio": (self.latency_ratio, 1.0, 10000.0, 1),
-            "send ratio": (self.send_ratio, 0.0, 1000.0, 1),
-            "recv ratio": (self.recv_ratio, 0.0, 1000.0, 1)}
-
     def get(self, feature):
-        # print(self.metric_map[feature])
-        func, min_val, max_val, scale = self.metric_map[feature]
-        return func(), min_val, max_val, scale
+        func, min_val, max_val, scale = MonitorInterval.METRICS[feature]
+        return func(self), min_val, max_val, scale
 
     # Convert the observation parts of the monitor interval into a numpy array
     def as_array(self, features):
         vals = []
         for feat in features:
-            val, _, _, scale = self.get(feat)
-            vals.append(val / scale)
+            func, _, _, scale = MonitorInterval.METRICS[feat]
+            vals.append(func(self) / scale)
         return np.array(vals)
 
     def on_pkt_sent(self, ts_ms, pkt):
@@ -77,9 +75,24 @@ class MonitorInterval:
         self.recv_end_ts_ms = ts_ms
         self.bytes_acked += pkt.acked_size_bytes
         self.pkts_acked += 1
-        self.rtt_ms_samples.append(pkt.rtt_ms())
+        self.on_rtt_sample(pkt.rtt_ms())
         # TODO: get qdelay ms from ack pkt
 
+    def on_rtt_sample(self, rtt_ms):
+        if self.rtt_ms_cnt == 0:
+            self.rtt_ms_min = rtt_ms
+            self.rtt_ms_max = rtt_ms
+        elif rtt_ms < self.rtt_ms_min:
+            self.rtt_ms_min = rtt_ms
+        elif rtt_ms > self.rtt_ms_max:
+            self.rtt_ms_max = rtt_ms
+        self.rtt_ms_cnt += 1
+        self.rtt_ms_sum += rtt_ms
+        self.second_half_rtt_ms.append(rtt_ms)
+        if self.rtt_ms_cnt % 2 == 0:
+            # the first half grows by one sample every other sample
+            self.first_half_rtt_ms_sum += self.second_half_rtt_ms.popleft()
+
     def on_pkt_lost(self, ts_ms, pkt):
         self.pkts_lost += 1
         self.bytes_lost += pkt.size_bytes
@@ -98,13 +111,19 @@ class MonitorInterval:
         return 0
 
     def avg_latency_ms(self):
-        if len(self.rtt_ms_samples) > 0:
-            return np.mean(self.rtt_ms_samples)
+        if self.rtt_ms_cnt > 0:
+            return self.rtt_ms_sum / self.rtt_ms_cnt
         return 0.0
 
+    def min_latency_ms(self):
+        return self.rtt_ms_min
+
+    def max_latency_ms(self):
+        return self.rtt_ms_max
+
     def avg_queue_delay_ms(self):
-        if len(self.qdelay_ms_samples) > 0:
-            return np.mean(self.qdelay_ms_samples)
+        if self.qdelay_ms_cnt > 0:
+            return self.qdelay_ms_sum / self.qdelay_ms_cnt
         return 0.0
 
     def send_dur_ms(self):
@@ -125,9 +144,12 @@ class MonitorInterval:
         return 0.0
 
     def latency_increase_ms(self):
-        half = int(len(self.rtt_ms_samples) / 2)
+        """Mean of the second half of the rtt samples minus mean of the
+        first half."""
+        half = self.rtt_ms_cnt // 2
         if half >= 1:
-            return np.mean(self.rtt_ms_samples[half:]) - np.mean(self.rtt_ms_samples[:half])
+            return (self.rtt_ms_sum - self.first_half_rtt_ms_sum) / \
+                (self.rtt_ms_cnt - half) - self.first_half_rtt_ms_sum / half
         return 0.0
 
     def ack_latency_inflation(self):
@@ -175,37 +197,68 @@ class MonitorInterval:
             return cur_lat / min_lat
         return 1.0
 
+    # feature name: (metric, min value, max value, scale)
+    METRICS = {
+        "send rate": (send_rate_Bps, 0.0, 1500e9, 1500e7),
+        "recv rate": (recv_rate_Bps, 0.0, 1500e9, 1500e7),
+        "recv dur": (recv_dur_ms, 0.0, 100000, 1),
+        "send dur": (send_dur_ms, 0.0, 100000, 1),
+        "avg latency": (avg_latency_ms, 0.0, 100000, 1),
+        "avg queue delay": (avg_queue_delay_ms, 0.0, 100000, 1),
+        "loss ratio": (loss_ratio, 0.0, 1.0, 1),
+        "ack latency inflation": (ack_latency_inflation, -1.0, 10.0, 1),
+        "sent latency inflation": (sent_latency_inflation, -1.0, 10.0, 1),
+        "conn min latency": (conn_min_latency_ms, 0.0, 100000, 1),
+        "latency increase": (latency_increase_ms, 0.0, 100000, 1),
+        "latency ratio": (latency_ratio, 1.0, 10000.0, 1),
+        "send ratio": (send_ratio, 0.0, 1000.0, 1),
+        "recv ratio": (recv_ratio, 0.0, 1000.0, 1)}
+
 
 class MonitorIntervalHistory():
+    """Features of the last length MIs, oldest first.
+
+    The features of an MI are computed once, when the MI is appended, into
+    a preallocated float32 ring buffer. Every row is written at i and at
+    i + length, so that the last length rows are always a contiguous slice
+    of the buffer.
+    """
+
     def __init__(self, length, features):
         self.length = length
         self.features = features
-        self.values = []
-        # self.sender_id = sender_id
-        for _ in range(0, length):
-            self.values.append(MonitorInterval())
+        self.metrics = [MonitorInterval.METRICS[feat] for feat in features]
+        self.buf = np.empty((2 * length, len(features)), dtype=np.float32)
+        self.head = 0  # row of the oldest MI
+        mi = MonitorInterval()
+        self.buf[:] = self._feature_row(mi)
+        self.last_mi = mi
+
+    def _feature_row(self, mi):
+        return [func(mi) / scale for func, _, _, scale in self.metrics]
 
     def step(self, new_mi):
-        self.values.pop(0)
-        self.values.append(new_mi)
-
-    def as_array(self):
-        arrays = []
-        for mi in self.values:
-            arrays.append(mi.as_array(self.features))
-        arrays = np.array(arrays).flatten()
+        row = self._feature_row(new_mi)
+        self.buf[self.head] = row
+        self.buf[self.head + self.length] = row
+        self.head = (self.head + 1) % self.length
+        self.last_mi = new_mi
+
+    def as_array(self, copy=True):
+        """Return the features of the MIs, oldest first, flattened. With
+        copy=False, return a read-only view that the next step() changes."""
+        arrays = self.buf[self.head:self.head + self.length].reshape(-1)
+        if copy:
+            return arrays.copy()
+        arrays.flags.writeable = False
         return arrays
 
     def back(self):
-        return self.values[-1]
+        return self.last_mi
 
     def get_min_max_obs_vectors(self):
-        min_vals = []
-        max_vals = []
-        for feature_name in self.features:
-            val, min_val, max_val, scale = self.values[-1].get(feature_name)
-            min_vals.append(min_val)
-            max_vals.append(max_val)
+        min_vals = [min_val for _, min_val, _, _ in self.metrics]
+        max_vals = [max_val for _, _, max_val, _ in self.metrics]
         min_obs_vec = np.tile(np.array(min_vals), self.length)
         max_obs_vec = np.tile(np.array(max_vals), self.length)
         return min_obs_vec, max_obs_vec
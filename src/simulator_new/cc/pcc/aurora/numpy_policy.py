@@ -0,0 +1,210 @@
+"""NumPy inference of the Aurora MLP policy.
+
+export_checkpoint() reads the policy weights of a TF1 checkpoint saved by
+MyMlpPolicy into a .npz file, without importing tensorflow, and
+NumpyMlpPolicy runs the deterministic forward pass of the policy from it.
+
+    python -m simulator_new.cc.pcc.aurora.numpy_policy \
+        --ckpt models/cc/pretrained/pretrained.ckpt \
+        --save-path models/cc/pretrained/pretrained.npz
+"""
+import argparse
+import struct
+from typing import Dict
+
+import numpy as np
+
+# tensorflow DataType enum values of the tensors a policy checkpoint holds
+TF_DTYPES = {1: np.float32, 2: np.float64, 3: np.int32, 9: np.int64}
+
+# layers of MyMlpPolicy, net_arch [{"pi": [32, 16], "vf": [32, 16]}]
+PI_LAYERS = ('pi_fc0', 'pi_fc1')
+VF_LAYERS = ('vf_fc0', 'vf_fc1')
+
+
+def _read_varint(buf, i):
+    val = shift = 0
+    while True:
+        byte = buf[i]
+        i += 1
+        val |= (byte & 0x7f) << shift
+        shift += 7
+        if byte < 0x80:
+            return val, i
+
+
+def _read_block(data, offset, size):
+    """Yield the (key, value) entries of an uncompressed table block."""
+    block = data[offset:offset + size]
+    num_restarts = struct.unpack('<I', block[-4:])[0]
+    end = len(block) - 4 - 4 * num_restarts
+    i = 0
+    key = b''
+    while i < end:
+        shared, i = _read_varint(block, i)
+        non_shared, i = _read_varint(block, i)
+        value_len, i = _read_varint(block, i)
+        key = key[:shared] + block[i:i + non_shared]
+        i += non_shared
+        yield key, block[i:i + value_len]
+        i += value_len
+
+
+def _parse_proto(buf):
+    """Return the fields of a protobuf message as {field: [values]}, with
+    length-delimited values left as bytes."""
+    fields = {}
+    i = 0
+    while i < len(buf):
+        tag, i = _read_varint(buf, i)
+        field, wire_type = tag >> 3, tag & 7
+        if wire_type == 0:
+            val, i = _read_varint(buf, i)
+        elif wire_type == 1:
+            val, i = buf[i:i + 8], i + 8
+        elif wire_type == 2:
+            size, i = _read_varint(buf, i)
+            val, i = buf[i:i + size], i + size
+        elif wire_type == 5:
+            val, i = buf[i:i + 4], i + 4
+        else:
+            raise ValueError("Unsupported protobuf wire type {}.".format(wire_type))
+        fields.setdefault(field, []).append(val)
+    return fields
+
+
+def read_checkpoint(ckpt_path: str) -> Dict[str, np.ndarray]:
+    """Read all tensors of a TF checkpoint (tensor bundle) given by its
+    prefix, e.g. models/cc/pretrained/pretrained.ckpt."""
+    with open(ckpt_path + '.index', 'rb') as f:
+        index = f.read()
+    # the table footer holds the block handles of the metaindex and index
+    footer = index[-48:]
+    _, i = _read_varint(footer, 0)
+    _, i = _read_varint(footer, i)
+    index_offset, i = _read_varint(footer, i)
+    index_size, i = _read_varint(footer, i)
+    entries = {}
+    for _, handle in _read_block(index, index_offset, index_size):
+        offset, j = _read_varint(handle, 0)
+        size, _ = _read_varint(handle, j)
+        entries.update(_read_block(index, offset, size))
+
+    # BundleHeaderProto: num_shards = 1
+    num_shards = _parse_proto(entries.pop(b''))[1][0]
+    shards = []
+    for shard_id in range(num_shards):
+        with open('{}.data-{:05d}-of-{:05d}'.format(
+                ckpt_path, shard_id, num_shards), 'rb') as f:
+            shards.append(f.read())
+
+    tensors = {}
+    for key, entry in entries.items():
+        # BundleEntryProto: dtype = 1, shape = 2, shard_id = 3, offset = 4,
+        # size = 5
+        fields = _parse_proto(entry)
+        dtype = TF_DTYPES[fields[1][0]]
+        shape = [_parse_proto(dim).get(1, [0])[0]
+                 for dim in _parse_proto(fields[2][0]).get(2, [])] \
+            if 2 in fields else []
+        shard = shards[fields.get(3, [0])[0]]
+        offset = fields.get(4, [0])[0]
+        size = fields.get(5, [0])[0]
+        tensors[key.decode()] = np.frombuffer(
+            shard[offset:offset + size], dtype=dtype).reshape(shape).copy()
+    return tensors
+
+
+def policy_weights(tensors: Dict[str, np.ndarray],
+                   scope: str = 'model') -> Dict[str, np.ndarray]:
+    """Return the '<layer>.<param>' weights of the policy under scope in
+    tensors named '<scope>/<layer>/<param>', as in a checkpoint, or with a
+    ':0' suffix, as in model.get_parameters() of PPO1 and PPO2. Both keep
+    their live policy under 'model', PPO1 its old policy under
+    'oldpi/model'."""
+    prefix = scope + '/'
+    weights = {}
+    for key, val in tensors.items():
+        name = key[len(prefix):].rsplit(':', 1)[0]
+        # skips other scopes and optimizer slots, e.g. pi_fc0/w/Adam
+        if key.startswith(prefix) and name.count('/') == 1:
+            weights[name.replace('/', '.')] = val
+    return weights
+
+
+def export_checkpoint(ckpt_path: str, save_path: str, scope: str = 'model'):
+    """Save the weights of the policy under scope in a checkpoint to a .npz
+    file loadable by NumpyMlpPolicy."""
+    weights = policy_weights(read_checkpoint(ckpt_path), scope)
+    np.savez(save_path, **weights)
+    return weights
+
+
+class NumpyMlpPolicy:
+    """Deterministic forward pass of MyMlpPolicy in NumPy.
+
+    Args
+        weights: '<layer>.w' and '<layer>.b' arrays of the layers in
+            PI_LAYERS, VF_LAYERS, 'pi' and 'vf', as saved by
+            export_checkpoint().
+    """
+
+    def __init__(self, weights: Dict[str, np.ndarray]) -> None:
+        self.pi_layers = [(weights[name + '.w'], weights[name + '.b'])
+                          for name in PI_LAYERS]
+        self.vf_layers = [(weights[name + '.w'], weights[name + '.b'])
+                          for name in VF_LAYERS]
+        self.pi = (weights['pi.w'], weights['pi.b'])
+        self.vf = (weights['vf.w'], weights['vf.b'])
+        self.initial_state = None
+
+    @staticmethod
+    def load(path: str) -> 'NumpyMlpPolicy':
+        with np.load(path) as weights:
+            return NumpyMlpPolicy(dict(weights))
+
+    @staticmethod
+    def _linear(x, w, b):
+        """Return x @ w + b with every row summed on its own.
+
+        A BLAS matmul picks its kernel, and so its rounding, by the batch
+        size, so a row of a batch would not match the same observation
+        predicted on its own. NumPy sums the products of each row in the
+        same order whatever the batch size.
+        """
+        return b + (x[:, :, None] * w).sum(axis=1)
+
+    @staticmethod
+    def _forward(obs, layers, head):
+        latent = obs
+        for w, b in layers:
+            latent = np.tanh(NumpyMlpPolicy._linear(latent, w, b))
+        return NumpyMlpPolicy._linear(latent, *head)
+
+    def step(self, obs, state=None, mask=None, deterministic=False):
+        """Same interface as MyMlpPolicy.step(), but only the deterministic
+        action and the value are computed. neglogp is None. Every row of obs
+        gets the outputs it would get on its own."""
+        if not deterministic:
+            raise NotImplementedError(
+                "NumpyMlpPolicy only computes deterministic actions.")
+        obs = np.asarray(obs, dtype=np.float32)
+        action = self._forward(obs, self.pi_layers, self.pi)
+        value = self._forward(obs, self.vf_layers, self.vf)[:, 0]
+        return action, value, self.initial_state, None
+
+
+def main():
+    parser = argparse.ArgumentParser("Export an Aurora checkpoint to NumPy.")
+    parser.add_argument('--ckpt', type=str, required=True,
+                        help="Checkpoint prefix, e.g. "
+                        "models/cc/pretrained/pretrained.ckpt.")
+    parser.add_argument('--save-path', type=str, required=True,
+                        help="Output .npz file.")
+    args = parser.parse_args()
+    weights = export_checkpoint(args.ckpt, args.save_path)
+    print("exported {} arrays to {}".format(len(weights), args.save_path))
+
+
+if __name__ == '__main__':
+    main()
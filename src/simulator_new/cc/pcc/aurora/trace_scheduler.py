@@ -5,7 +5,8 @@ import numpy as np
 # from simulator.network_simulator.bbr import BBR
 # from simulator.network_simulator.bbr_old import BBR_old
 # from simulator.network_simulator.cubic import Cubic
-from simulator_new.trace import Trace, generate_trace_from_config
+from simulator_new.trace import (
+    Trace, generate_trace_from_config, generate_traces_batch)
 from simulator_new.utils import read_json_file
 
 
@@ -23,19 +24,43 @@ class TestScheduler(TraceScheduler):
 
 
 class UDRTrainScheduler(TraceScheduler):
+    """Schedule real traces with probability percent and traces generated
+    from config_file otherwise.
+
+    With batch_size > 0, generated traces are made batch_size at a time by
+    generate_traces_batch() instead of one by one.
+    """
+
     def __init__(
-        self, config_file: str, traces: List[Trace], percent: float = 0.0
+        self, config_file: str, traces: List[Trace], percent: float = 0.0,
+        batch_size: int = 0
     ):
         self.config_file = config_file
         self.config = read_json_file(config_file)
         self.traces = traces
         self.percent = percent
+        self.batch_size = batch_size
+        self.generated_traces = []
+
+    def __getstate__(self):
+        # copies, e.g. in AuroraVecEnv workers, generate their own traces
+        state = self.__dict__.copy()
+        state['generated_traces'] = []
+        return state
+
+    def _generate_trace(self):
+        if self.batch_size <= 0:
+            return generate_trace_from_config(self.config, duration=30)
+        if not self.generated_traces:
+            self.generated_traces = generate_traces_batch(
+                self.config, self.batch_size, duration=30)[::-1]
+        return self.generated_traces.pop()
 
     def get_trace(self):
         if self.traces and np.random.uniform(0, 1) < self.percent:
             return np.random.choice(self.traces)
         elif self.config_file:
-            return generate_trace_from_config(self.config, duration=30)
+            return self._generate_trace()
         else:
             raise ValueError
 
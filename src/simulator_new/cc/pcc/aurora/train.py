@@ -1,5 +1,6 @@
 import argparse
 import csv
+import multiprocessing as mp
 import os
 os.environ['CUDA_VISIBLE_DEVICES'] = ""
 import time
@@ -7,23 +8,25 @@ import types
 import warnings
 warnings.simplefilter(action='ignore', category=UserWarning)
 
-from typing import List
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
 
 import numpy as np
 import tensorflow as tf
 tf.compat.v1.logging.set_verbosity(tf.compat.v1.logging.ERROR)
 
 import gym
-import pandas as pd
 from mpi4py.MPI import COMM_WORLD
-from stable_baselines import PPO1
+from stable_baselines import PPO1, PPO2
 from stable_baselines.common.callbacks import BaseCallback
 
-from simulator_new.net_simulator import Simulator
 from simulator_new.cc.pcc.aurora import aurora_environment
-from simulator_new.cc.pcc.aurora.aurora_agent import MyMlpPolicy
+from simulator_new.cc.pcc.aurora.mlp_policy import MyMlpPolicy
+from simulator_new.cc.pcc.aurora.numpy_policy import policy_weights
 from simulator_new.cc.pcc.aurora.trace_scheduler import TraceScheduler, UDRTrainScheduler
+from simulator_new.cc.pcc.aurora.validation import validate_trace
 from simulator_new.trace import Trace, generate_traces
+from simulator_new.trace_archive import load_trace_list
 from simulator_new.utils import set_seed, save_args
 
 
@@ -75,10 +78,13 @@ class SaveOnBestTrainingRewardCallback(BaseCallback):
     :param log_dir: (str) Path to the folder where the model will be saved.
       It must contains the file created by the ``Monitor`` wrapper.
     :param verbose: (int)
+    :param num_val_workers: (int) Number of processes validating checkpoints
+      in the background while training goes on. One per cpu if 0.
     """
 
     def __init__(self, check_freq: int, log_dir: str, val_traces: List[Trace] = [],
-                 verbose=0, steps_trained=0, app='file_transfer', ae_guided=False):
+                 verbose=0, steps_trained=0, app='file_transfer', ae_guided=False,
+                 num_val_workers=0):
         super(SaveOnBestTrainingRewardCallback, self).__init__(verbose)
         self.ae_guided = ae_guided
         self.check_freq = check_freq
@@ -110,6 +116,11 @@ class SaveOnBestTrainingRewardCallback(BaseCallback):
         self.prev_t = time.time()
         self.steps_trained = steps_trained
         self.app = app
+        self.num_val_workers = num_val_workers or os.cpu_count()
+        self.val_executor = None
+        # (n_calls, num_timesteps, submit time, train time, futures) of the
+        # checkpoints under validation, oldest first
+        self.pending_vals = []
 
     def _init_callback(self) -> None:
         # Create folder if needed
@@ -117,6 +128,8 @@ class SaveOnBestTrainingRewardCallback(BaseCallback):
             os.makedirs(self.save_path, exist_ok=True)
 
     def _on_step(self) -> bool:
+        if self.val_log_writer is not None:
+            self._write_val_logs()
         if self.n_calls % self.check_freq == 0:
 
             if COMM_WORLD.Get_rank() == 0 and self.val_log_writer is not None:
@@ -130,72 +143,126 @@ class SaveOnBestTrainingRewardCallback(BaseCallback):
                     saver.save(self.model.sess, model_path_to_save)
                 if not self.val_traces:
                     return True
-                avg_tr_bw = []
-                avg_tr_min_rtt = []
-                avg_tr_loss = []
-                avg_rewards = []
-                avg_pkt_level_rewards = []
-                avg_losses = []
-                avg_tputs = []
-                avg_delays = []
-                avg_send_rates = []
-                val_start_t = time.time()
-
-                for idx, val_trace in enumerate(self.val_traces):
-
-                    lookup_table = "./data/AE_lookup_table/segment_0vu1_dwHF7g_480x360.mp4.csv"
-                    # lookup_table = None
-                    val_sim_dir = os.path.join(self.save_path, f"step_{int(self.num_timesteps)}", f"val_trace_{idx}")
-                    os.makedirs(val_sim_dir, exist_ok=True)
-                    val_sim = Simulator(val_trace, val_sim_dir, "aurora", app='video_streaming', # app=self.app,
-                                        model_path=None, lookup_table_path=lookup_table, ae_guided=self.ae_guided)
-                    val_sim.sender_cc.register_policy(self.model.policy_pi)
-                    val_sim.simulate(int(val_trace.duration), True)
-                    avg_tr_bw.append(val_trace.avg_bw)
-                    avg_tr_min_rtt.append(val_trace.avg_bw)
-                    df = pd.read_csv(os.path.join(val_sim_dir, 'aurora_mi_log.csv'))
-                    avg_rewards.append(df['reward'].mean())
-                    avg_losses.append(df['loss_ratio'].mean())
-                    avg_tputs.append(df['recv_rate_Bps'].mean())
-                    avg_delays.append(df['latency_ms'].mean())
-                    avg_send_rates.append(df['send_rate_Bps'].mean())
-
-                cur_t = time.time()
-                self.val_log_writer.writerow(
-                    map(lambda t: "%.3f" % t,
-                        [float(self.n_calls), float(self.num_timesteps),
-                         np.mean(np.array(avg_rewards)),
-                         np.mean(np.array(avg_pkt_level_rewards)),
-                         np.mean(np.array(avg_losses)),
-                         np.mean(np.array(avg_tputs)),
-                         np.mean(np.array(avg_delays)),
-                         np.mean(np.array(avg_send_rates)),
-                         (cur_t - self.t_start) / 60,
-                         (cur_t - val_start_t) / 60, (val_start_t - self.prev_t) / 60]))
-                self.prev_t = cur_t
+                self._submit_validation(model_save_dir)
         return True
 
+    def _on_training_end(self) -> None:
+        if self.val_log_writer is not None:
+            self._write_val_logs(wait=True)
+        if self.val_executor is not None:
+            self.val_executor.shutdown()
+            self.val_executor = None
+
+    def _submit_validation(self, model_save_dir: str) -> None:
+        """Validate the current policy on all validation traces in the
+        background."""
+        if self.val_executor is None:
+            # forkserver, so that workers do not inherit the tf session
+            self.val_executor = ProcessPoolExecutor(
+                max_workers=self.num_val_workers,
+                mp_context=mp.get_context('forkserver'))
+        lookup_table = "./data/AE_lookup_table/segment_0vu1_dwHF7g_480x360.mp4.csv"
+        weights = get_policy_weights(self.model)
+        val_start_t = time.time()
+        futures = [self.val_executor.submit(
+            validate_trace, weights, val_trace,
+            os.path.join(model_save_dir, f"val_trace_{idx}"), lookup_table,
+            self.ae_guided) for idx, val_trace in enumerate(self.val_traces)]
+        self.pending_vals.append((self.n_calls, self.num_timesteps, val_start_t,
+                                  val_start_t - self.prev_t, futures))
+        self.prev_t = val_start_t
+
+    def _write_val_logs(self, wait=False) -> None:
+        """Log the checkpoints whose validation finished, in order."""
+        while self.pending_vals:
+            n_calls, num_timesteps, val_start_t, train_t, futures = self.pending_vals[0]
+            if not wait and not all(future.done() for future in futures):
+                break
+            self.pending_vals.pop(0)
+            results = [future.result() for future in futures]
+            avg_pkt_level_rewards = []
+            cur_t = time.time()
+            self.val_log_writer.writerow(
+                map(lambda t: "%.3f" % t,
+                    [float(n_calls), float(num_timesteps),
+                     np.mean([res['reward'] for res in results]),
+                     np.mean(np.array(avg_pkt_level_rewards)),
+                     np.mean([res['loss'] for res in results]),
+                     np.mean([res['throughput'] for res in results]),
+                     np.mean([res['latency'] for res in results]),
+                     np.mean([res['sending_rate'] for res in results]),
+                     (cur_t - self.t_start) / 60,
+                     (cur_t - val_start_t) / 60, train_t / 60]))
+
+
+def get_policy_weights(model) -> Dict[str, np.ndarray]:
+    """Return the policy weights of a PPO1 or PPO2 model in the format of
+    numpy_policy.export_checkpoint()."""
+    return policy_weights(model.get_parameters())
+
+
+def get_ppo2_n_steps(timesteps_per_actorbatch: int, num_envs: int,
+                     nminibatches: int) -> int:
+    """Return the steps per env of a PPO2 update, the closest to
+    timesteps_per_actorbatch steps over all envs for which PPO2 can split
+    the num_envs * n_steps steps into nminibatches minibatches."""
+    if num_envs < 1 or nminibatches < 1 or timesteps_per_actorbatch < 1:
+        raise ValueError(
+            "PPO2 needs positive timesteps_per_actorbatch, num_envs and "
+            "nminibatches, got {}, {} and {}.".format(
+                timesteps_per_actorbatch, num_envs, nminibatches))
+    # num_envs * n_steps is a multiple of nminibatches
+    step = nminibatches // np.gcd(num_envs, nminibatches)
+    return max(1, int(round(timesteps_per_actorbatch / num_envs / step))) * step
+
 
 def train_aurora(train_scheduler: TraceScheduler, config_file: str,
                  total_timesteps: int, seed: int, log_dir: str,
                  timesteps_per_actorbatch: int, model_path: str = "",
                  tb_log_name: str = "", validation_traces: List[Trace] = [],
                  tensorboard_log=None, app='file_transfer', lookup_table_path='',
-                 ae_guided=False) -> None:
-    env = gym.make('AuroraEnv-v1', trace_scheduler=train_scheduler,
-                   app=app, lookup_table_path=lookup_table_path, ae_guided=ae_guided)
-    env.seed(seed)
-    model = MyPPO1(MyMlpPolicy, env, verbose=1, seed=seed,
-                   optim_stepsize=0.001, schedule='constant',
-                   timesteps_per_actorbatch=timesteps_per_actorbatch,
-                   optim_batchsize=int(timesteps_per_actorbatch/12),
-                   optim_epochs=12, gamma=0.99,
-                   tensorboard_log=tensorboard_log, n_cpu_tf_sess=1)
+                 ae_guided=False, num_workers=0, envs_per_worker=1,
+                 num_val_workers=0) -> None:
+    """Train Aurora with PPO1 on a single env, or with PPO2 on an
+    AuroraVecEnv of num_workers processes of envs_per_worker envs if
+    num_workers > 0. PPO2 uses the hyperparameters of PPO1, and collects
+    about timesteps_per_actorbatch steps over all envs per update, as many
+    as split into its 12 minibatches."""
+    check_freq = timesteps_per_actorbatch
+    if num_workers > 0:
+        from simulator_new.cc.pcc.aurora.aurora_vec_env import AuroraVecEnv
+        # the callback is called once per step of all envs
+        check_freq = get_ppo2_n_steps(timesteps_per_actorbatch,
+                                      num_workers * envs_per_worker, 12)
+        env = AuroraVecEnv(
+            dict(trace_scheduler=train_scheduler, app=app,
+                 lookup_table_path=lookup_table_path, ae_guided=ae_guided),
+            num_workers=num_workers, envs_per_worker=envs_per_worker, seed=seed)
+        model = PPO2(MyMlpPolicy, env, verbose=1, seed=seed,
+                     learning_rate=0.001, n_steps=check_freq,
+                     nminibatches=12, noptepochs=12, gamma=0.99, lam=0.95,
+                     cliprange=0.2, ent_coef=0.0, vf_coef=1.0,
+                     max_grad_norm=None, tensorboard_log=tensorboard_log,
+                     n_cpu_tf_sess=1)
+    else:
+        env = gym.make('AuroraEnv-v1', trace_scheduler=train_scheduler,
+                       app=app, lookup_table_path=lookup_table_path, ae_guided=ae_guided)
+        env.seed(seed)
+        model = MyPPO1(MyMlpPolicy, env, verbose=1, seed=seed,
+                       optim_stepsize=0.001, schedule='constant',
+                       timesteps_per_actorbatch=timesteps_per_actorbatch,
+                       optim_batchsize=int(timesteps_per_actorbatch/12),
+                       optim_epochs=12, gamma=0.99,
+                       tensorboard_log=tensorboard_log, n_cpu_tf_sess=1)
 
     steps_trained = 0
     if model_path:
         with model.graph.as_default():
-            saver = tf.train.Saver()
+            if num_workers > 0:
+                # only the policy, PPO1 checkpoints have no Adam slots of PPO2
+                saver = tf.train.Saver(var_list=tf.trainable_variables('model'))
+            else:
+                saver = tf.train.Saver()
             saver.restore(model.sess, model_path)
         try:
             steps_trained = int(os.path.splitext(model_path)[0].split('_')[-1])
@@ -208,10 +275,12 @@ def train_aurora(train_scheduler: TraceScheduler, config_file: str,
             config_file, 20, duration=30)
 
     callback = SaveOnBestTrainingRewardCallback(
-        check_freq=timesteps_per_actorbatch, log_dir=log_dir,
-        steps_trained=steps_trained, val_traces=validation_traces, app=app, ae_guided=ae_guided)
+        check_freq=check_freq, log_dir=log_dir,
+        steps_trained=steps_trained, val_traces=validation_traces, app=app, ae_guided=ae_guided,
+        num_val_workers=num_val_workers)
     model.learn(total_timesteps=total_timesteps, tb_log_name=tb_log_name,
                 callback=callback)
+    env.close()
 
 
 def parse_args():
@@ -274,6 +343,13 @@ def parse_args():
         default=7200,
         help="specify to enable validation.",
     )
+    parser.add_argument(
+        "--val-workers",
+        type=int,
+        default=0,
+        help="Number of processes validating checkpoints in the background "
+        "while training goes on. One per cpu if 0.",
+    )
     subparsers = parser.add_subparsers(dest="curriculum", help="CL parsers.")
     udr_parser = subparsers.add_parser("udr", help="udr")
     udr_parser.add_argument(
@@ -282,17 +358,41 @@ def parse_args():
         default=0.0,
         help="Probability of picking a real trace in training",
     )
+    parser.add_argument(
+        "--num-workers",
+        type=int,
+        default=0,
+        help="Collect rollouts with PPO2 from this many env processes on "
+        "this machine instead of one env per MPI rank with PPO1. 0 to use "
+        "PPO1. With PPO2, --pretrained-model-path only restores the policy "
+        "weights, so it can start from PPO1 checkpoints.",
+    )
+    parser.add_argument(
+        "--envs-per-worker",
+        type=int,
+        default=1,
+        help="Number of envs stepped by each env process of --num-workers.",
+    )
+    parser.add_argument(
+        "--trace-batch-size",
+        type=int,
+        default=0,
+        help="Generate training traces this many at a time with "
+        "simulator_new.trace.generate_traces_batch. One at a time if 0.",
+    )
     udr_parser.add_argument(
         "--train-trace-file",
         type=str,
         default="",
-        help="A file contains a list of paths to the training traces.",
+        help="A file contains a list of paths to the training traces. "
+        "Paths may also be .npz trace archives.",
     )
     udr_parser.add_argument(
         "--val-trace-file",
         type=str,
         default="",
-        help="A file contains a list of paths to the validation traces.",
+        help="A file contains a list of paths to the validation traces. "
+        "Paths may also be .npz trace archives.",
     )
     udr_parser.add_argument(
         "--config-file",
@@ -351,30 +451,28 @@ def main():
     if args.curriculum == "udr":
         config_file = args.config_file
         if args.train_trace_file:
-            with open(args.train_trace_file, "r") as f:
-                for line in f:
-                    line = line.strip()
-                    training_traces.append(Trace.load_from_file(line))
+            training_traces = load_trace_list(args.train_trace_file)
 
         if args.validation and args.val_trace_file:
-            with open(args.val_trace_file, "r") as f:
-                for line in f:
-                    line = line.strip()
-                    if args.dataset == "pantheon":
+            if args.dataset == "synthetic":
+                val_traces = load_trace_list(args.val_trace_file)
+            elif args.dataset == "pantheon":
+                with open(args.val_trace_file, "r") as f:
+                    for line in f:
+                        line = line.strip()
                         queue = 100  # dummy value
                         val_traces.append(
                             Trace.load_from_pantheon_file(
                                 line, queue=queue, loss=0
                             )
                         )
-                    elif args.dataset == "synthetic":
-                        val_traces.append(Trace.load_from_file(line))
-                    else:
-                        raise ValueError
+            else:
+                raise ValueError
         train_scheduler = UDRTrainScheduler(
             config_file,
             training_traces,
             percent=args.real_trace_prob,
+            batch_size=args.trace_batch_size,
         )
     # elif args.curriculum == "cl1":
     #     config_file = args.config_files[0]
@@ -401,6 +499,9 @@ def main():
         app=args.app,
         lookup_table_path=args.lookup_table,
         ae_guided=args.ae_guided,
+        num_workers=args.num_workers,
+        envs_per_worker=args.envs_per_worker,
+        num_val_workers=args.val_workers,
     )
 
 
@@ -0,0 +1,34 @@
+"""Validation of Aurora policies in worker processes.
+
+The policy is passed as NumpyMlpPolicy weights, so validation workers never
+import tensorflow and never touch the session of the training process.
+"""
+import os
+from typing import Dict
+
+import numpy as np
+
+from simulator_new.cc.pcc.aurora.numpy_policy import NumpyMlpPolicy
+from simulator_new.net_simulator import Simulator
+from simulator_new.trace import Trace
+
+
+def validate_trace(weights: Dict[str, np.ndarray], trace: Trace, save_dir: str,
+                   lookup_table_path: str, ae_guided: bool = False) -> Dict[str, float]:
+    """Simulate Aurora with the policy of weights, as exported by
+    numpy_policy.export_checkpoint(), on a trace and return the averages of
+    its MI log."""
+    import pandas as pd
+
+    os.makedirs(save_dir, exist_ok=True)
+    val_sim = Simulator(trace, save_dir, "aurora", app='video_streaming',
+                        model_path=None, lookup_table_path=lookup_table_path,
+                        ae_guided=ae_guided)
+    val_sim.sender_cc.register_policy(NumpyMlpPolicy(weights))
+    val_sim.simulate(int(trace.duration), True)
+    df = pd.read_csv(os.path.join(save_dir, 'aurora_mi_log.csv'))
+    return {'reward': df['reward'].mean(),
+            'loss': df['loss_ratio'].mean(),
+            'throughput': df['recv_rate_Bps'].mean(),
+            'latency': df['latency_ms'].mean(),
+            'sending_rate': df['send_rate_Bps'].mean()}
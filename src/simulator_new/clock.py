@@ -10,3 +10,11 @@ class ClockObserver(ABC):
     def reset(self):
         pass
 
+    def next_event_ts_ms(self, ts_ms):
+        """Return the earliest timestamp after ts_ms at which tick() has work
+        to do.
+
+        An event-driven simulator may skip the ticks in between. The default
+        asks to be ticked every millisecond.
+        """
+        return ts_ms + 1
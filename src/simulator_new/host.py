@@ -5,7 +5,8 @@ from simulator_new.rate_allocator import RateAllocator
 
 
 class Host(ClockObserver):
-    def __init__(self, id, tx_link, rx_link, cc, rtx_mngr, app, save_dir=None) -> None:
+    def __init__(self, id, tx_link, rx_link, cc, rtx_mngr, app, save_dir=None,
+                 log_config=None) -> None:
         self.id = id
         self.tx_link = tx_link
         self.tx_link.register_host(self)
@@ -14,7 +15,8 @@ class Host(ClockObserver):
         self.cc = cc
         self.cc.register_host(self)
         step_ms = 1000 / app.fps if hasattr(app, 'fps') else 1
-        self.pacer = Pacer(self, pacing_rate_update_step_ms=step_ms, save_dir=save_dir)
+        self.pacer = Pacer(self, pacing_rate_update_step_ms=step_ms,
+                           save_dir=save_dir, log_config=log_config)
         self.rtx_mngr = rtx_mngr
         if self.rtx_mngr:
             self.rtx_mngr.register_host(self)
@@ -24,6 +26,7 @@ class Host(ClockObserver):
         self.recorder = None
         self.pkt_id = 0
         self.pkt_cls = Packet
+        self.pkt_pool = None
 
         self.other_host = None
 
@@ -39,20 +42,32 @@ class Host(ClockObserver):
         pkt = self.rtx_mngr.get_pkt() if self.rtx_mngr else None
         # prioritize retransmission
         if pkt is not None:
-            # print(self.ts_ms, "rtx", pkt.pkt_id, pkt.app_data)
+            # print(self.ts_ms, "rtx", pkt.pkt_id, pkt.frame_id)
             return pkt
-        pkt_size_byte, app_data = self.app.get_pkt()
+        pkt_size_byte, frame = self.app.get_pkt()
         if pkt_size_byte > 0:
-            pkt = self.pkt_cls(self.pkt_id, self.pkt_cls.DATA_PKT, pkt_size_byte, app_data)
+            pkt = self.pkt_cls(self.pkt_id, self.pkt_cls.DATA_PKT, pkt_size_byte, frame)
             return pkt
         return None
 
     def register_stats_recorder(self, recorder):
         self.recorder = recorder
 
+    def register_pkt_pool(self, pkt_pool):
+        """Recycle control packets through pkt_pool."""
+        self.pkt_pool = pkt_pool
+
+    def _new_ctrl_pkt(self, pkt_id, pkt_type, size_bytes):
+        if self.pkt_pool is None:
+            return self.pkt_cls(pkt_id, pkt_type, size_bytes)
+        return self.pkt_pool.get(self.pkt_cls, pkt_id, pkt_type, size_bytes)
+
     def can_send(self, pkt_size_byte):
         return self.pacer.can_send(pkt_size_byte)
 
+    def next_send_ts_ms(self, pkt_size_byte):
+        return self.pacer.next_send_ts_ms(pkt_size_byte)
+
     def _on_pkt_sent(self, pkt):
         # do not count
         if pkt.ts_sent_ms == pkt.ts_first_sent_ms:
@@ -88,6 +103,9 @@ class Host(ClockObserver):
         while pkt is not None:
             pkt.ts_rcvd_ms = self.ts_ms
             self._on_pkt_rcvd(pkt)
+            # nothing holds on to a control packet after it is processed
+            if self.pkt_pool is not None and not pkt.is_data_pkt():
+                self.pkt_pool.put(pkt)
             pkt = self.rx_link.pull()
 
     def tick(self, ts_ms) -> None:
@@ -101,6 +119,18 @@ class Host(ClockObserver):
         self.send()
         self.receive()
 
+    def next_event_ts_ms(self, ts_ms):
+        next_ts_ms = min(self.app.next_event_ts_ms(ts_ms),
+                         self.cc.next_event_ts_ms(ts_ms))
+        if self.rtx_mngr:
+            next_ts_ms = min(next_ts_ms, self.rtx_mngr.next_event_ts_ms(ts_ms))
+        if next_ts_ms <= ts_ms + 1:
+            return ts_ms + 1
+        pkt_size_byte = self._peek_pkt()
+        if pkt_size_byte > 0:
+            next_ts_ms = min(next_ts_ms, self.next_send_ts_ms(pkt_size_byte))
+        return max(ts_ms + 1, next_ts_ms)
+
     def reset(self) -> None:
         self.ts_ms = 0
         self.cc.reset()
@@ -1,27 +1,47 @@
+import math
 import random
+from collections import deque
 from typing import Optional
 
 from simulator_new.clock import ClockObserver
+from simulator_new.queue_discipline import DropTailQueue, QueueDiscipline
 from simulator_new.trace import Trace
 
 class Link(ClockObserver):
     def __init__(self, id, bw_trace: Optional[Trace] = None,
                  prop_delay_ms=25, queue_cap_bytes=-1,
-                 pkt_loss_rate=0) -> None:
+                 pkt_loss_rate=0,
+                 queue: Optional[QueueDiscipline] = None) -> None:
         self.id = id
         self.bw_trace = bw_trace
         self.prop_delay_ms = prop_delay_ms
-        self.queue_cap_bytes = queue_cap_bytes
-        self.queue_size_bytes = 0
         self.pkt_loss_rate = pkt_loss_rate
         self.ts_ms = 0
-        self.queue = []
-        self.ready_pkts = []
-        self.budget_bytes = 0
+        self.queue = DropTailQueue(queue_cap_bytes) if queue is None else queue
+        self.ready_pkts = deque()
+        # budget left at the last dequeue, at last_budget_update_ts_ms
+        self._budget_bytes = 0.0
         self.last_budget_update_ts_ms = 0
         self.host = None
+        self.next_dequeue_ts_ms = None
         # self.num_lost_pkts = 0
 
+    @property
+    def queue_cap_bytes(self):
+        return self.queue.cap_bytes
+
+    @property
+    def queue_size_bytes(self):
+        return self.queue.size_bytes
+
+    @property
+    def budget_bytes(self):
+        """Bytes the link can send to the head packet at ts_ms."""
+        if self.queue and isinstance(self.bw_trace, Trace) and \
+            self.queue.peek().ts_sent_ms < self.ts_ms:
+            return self._get_head_budget_bytes(self.ts_ms)
+        return self._budget_bytes
+
     def register_host(self, host):
         self.host = host
 
@@ -29,14 +49,13 @@ class Link(ClockObserver):
         """Push a packet onto the link"""
         if random.random() < self.pkt_loss_rate:
             return
-        if self.queue_cap_bytes == -1 or \
-            pkt.size_bytes + self.queue_size_bytes <= self.queue_cap_bytes:
+        was_empty = not self.queue
+        if self.queue.enqueue(pkt):
             pkt.add_prop_delay_ms(self.prop_delay_ms)
             if self.bw_trace is None:
-                self.ready_pkts.append(pkt)
-            else:
-                self.queue.append(pkt)
-                self.queue_size_bytes += pkt.size_bytes
+                self.ready_pkts.append(self.queue.dequeue())
+            elif was_empty:
+                self.next_dequeue_ts_ms = None
         else:
             # self.num_lost_pkts += 1
             # print(self.ts_ms, "link lost:", pkt.pkt_id, ", num lost:", self.num_lost_pkts)
@@ -47,37 +66,83 @@ class Link(ClockObserver):
         #         print(self.queue[i].pkt_id, self.queue[i].ts_sent_ms, self.queue[i].delay_ms(), self.queue[i].ts_sent_ms + self.queue[i].delay_ms())
         #     print("drop", self.ts_ms, pkt.pkt_id,
         #           pkt.size_bytes + self.queue_size_bytes, self.queue_cap_bytes,
-        #           pkt.app_data)
+        #           pkt.frame_id)
 
     def pull(self):
         """Pull a packet from the link"""
         # check pkt timestamp to determine whether to dequeue a pkt
         if self.ready_pkts and \
             self.ready_pkts[0].ts_sent_ms + self.ready_pkts[0].delay_ms() <= self.ts_ms:
-            return self.ready_pkts.pop(0)
+            return self.ready_pkts.popleft()
         return None
 
     def update_bw_budget(self):
         if not isinstance(self.bw_trace, Trace):
             return
         while self.queue:
-            pkt = self.queue[0]
-            prev_ts_ms = max(pkt.ts_sent_ms, self.last_budget_update_ts_ms)
-            delta = int(self.bw_trace.get_avail_bits2send(
-                prev_ts_ms / 1000, self.ts_ms / 1000)) / 8
-            if prev_ts_ms == pkt.ts_sent_ms:
-                self.budget_bytes = delta
-            else:
-                self.budget_bytes += delta
-            self.last_budget_update_ts_ms = self.ts_ms
-            if self.budget_bytes >= pkt.size_bytes:
-                self.budget_bytes -= pkt.size_bytes
-                pkt.add_queue_delay_ms(self.ts_ms - pkt.ts_sent_ms)
-                self.queue.pop(0)
-                self.queue_size_bytes -= pkt.size_bytes
-                self.ready_pkts.append(pkt)
-            else:
+            ts_ms = self._get_next_dequeue_ts_ms()
+            if ts_ms > self.ts_ms:
                 break
+            pkt = self.queue.peek()
+            self._budget_bytes = self._get_head_budget_bytes(ts_ms) - pkt.size_bytes
+            self.last_budget_update_ts_ms = ts_ms
+            pkt.add_queue_delay_ms(ts_ms - pkt.ts_sent_ms)
+            self.ready_pkts.append(self.queue.dequeue())
+            self.next_dequeue_ts_ms = None
+
+    def _get_head_budget_bytes(self, ts_ms):
+        """Return the bytes the link can send to the head packet by ts_ms.
+
+        The budget left at the last dequeue carries over to a packet which
+        was already queued then. Bits are truncated once per packet, so the
+        budget does not depend on how often the link is ticked.
+        """
+        pkt = self.queue.peek()
+        if pkt.ts_sent_ms >= self.last_budget_update_ts_ms:
+            return int(self.bw_trace.get_avail_bits2send(
+                pkt.ts_sent_ms / 1000, ts_ms / 1000)) / 8
+        return self._budget_bytes + int(self.bw_trace.get_avail_bits2send(
+            self.last_budget_update_ts_ms / 1000, ts_ms / 1000)) / 8
+
+    def _get_next_dequeue_ts_ms(self):
+        """Return the timestamp at which the head packet leaves the queue.
+
+        It is solved in closed form from the cumulative bits of the trace and
+        then checked against _get_head_budget_bytes(), so that it is the
+        first ms at which a ms-by-ms simulation would dequeue the packet.
+        """
+        if self.next_dequeue_ts_ms is None:
+            pkt = self.queue.peek()
+            if pkt.ts_sent_ms >= self.last_budget_update_ts_ms:
+                # a packet pushed at ts_sent_ms is first seen on the next tick
+                start_ts_ms = pkt.ts_sent_ms
+                min_ts_ms = pkt.ts_sent_ms + 1
+                budget_bytes = 0
+            else:
+                start_ts_ms = self.last_budget_update_ts_ms
+                min_ts_ms = self.last_budget_update_ts_ms
+                budget_bytes = self._budget_bytes
+            ts_ms = min_ts_ms
+            if self._get_head_budget_bytes(ts_ms) < pkt.size_bytes:
+                end_ts = self.bw_trace.get_sending_end_ts(
+                    start_ts_ms / 1000, (pkt.size_bytes - budget_bytes) * 8)
+                ts_ms = max(min_ts_ms, math.ceil(end_ts * 1000))
+                while ts_ms > min_ts_ms and \
+                    self._get_head_budget_bytes(ts_ms - 1) >= pkt.size_bytes:
+                    ts_ms -= 1
+                while self._get_head_budget_bytes(ts_ms) < pkt.size_bytes:
+                    ts_ms += 1
+            self.next_dequeue_ts_ms = ts_ms
+        return self.next_dequeue_ts_ms
+
+    def next_event_ts_ms(self, ts_ms):
+        next_ts_ms = math.inf
+        if self.ready_pkts:
+            pkt = self.ready_pkts[0]
+            next_ts_ms = math.ceil(pkt.ts_sent_ms + pkt.delay_ms())
+        if self.queue and isinstance(self.bw_trace, Trace):
+            next_ts_ms = min(next_ts_ms, self._get_next_dequeue_ts_ms())
+        return max(ts_ms + 1, next_ts_ms)
 
     def tick(self, ts_ms) -> None:
         assert ts_ms >= self.ts_ms
@@ -90,9 +155,85 @@ class Link(ClockObserver):
         if isinstance(self.bw_trace, Trace):
             self.bw_trace.reset()
         self.ts_ms = 0
-        self.queue = []
-        self.queue_size_bytes = 0
-        self.budget_bytes = 0
+        self.queue.reset()
+        self._budget_bytes = 0.0
         self.last_budget_update_ts_ms = 0
-        self.ready_pkts = []
+        self.ready_pkts.clear()
+        self.next_dequeue_ts_ms = None
         # self.num_lost_pkts = 0
+
+
+class SharedLink(Link):
+    """A Link shared by several flows, e.g. a bottleneck.
+
+    Hosts are connected through the LinkPort of their flow. Arrived packets
+    are demultiplexed into per-flow queues, so that every flow only pulls its
+    own packets in O(1) per packet.
+    """
+
+    def __init__(self, id, bw_trace: Optional[Trace] = None,
+                 prop_delay_ms=25, queue_cap_bytes=-1,
+                 pkt_loss_rate=0,
+                 queue: Optional[QueueDiscipline] = None) -> None:
+        super().__init__(id, bw_trace, prop_delay_ms, queue_cap_bytes,
+                         pkt_loss_rate, queue)
+        self.flow_pkts = {}
+        self.num_flow_pkts = 0
+
+    def port(self, flow_id) -> 'LinkPort':
+        self.flow_pkts[flow_id] = deque()
+        return LinkPort(self, flow_id)
+
+    def pull_flow(self, flow_id):
+        """Pull a packet of flow_id from the link"""
+        pkt = self.pull()
+        while pkt is not None:
+            self.flow_pkts[pkt.flow_id].append(pkt)
+            self.num_flow_pkts += 1
+            pkt = self.pull()
+        flow_pkts = self.flow_pkts[flow_id]
+        if flow_pkts:
+            self.num_flow_pkts -= 1
+            return flow_pkts.popleft()
+        return None
+
+    def next_event_ts_ms(self, ts_ms):
+        if self.num_flow_pkts:
+            # arrived packets wait for the next tick of their host
+            return ts_ms + 1
+        return super().next_event_ts_ms(ts_ms)
+
+    def reset(self) -> None:
+        super().reset()
+        for flow_pkts in self.flow_pkts.values():
+            flow_pkts.clear()
+        self.num_flow_pkts = 0
+
+
+class LinkPort:
+    """The end of a SharedLink used by the hosts of one flow.
+
+    Packets pushed through the port are tagged with its flow id and pull()
+    only returns packets of that flow. Everything else is read from the
+    link.
+    """
+
+    def __init__(self, link: SharedLink, flow_id) -> None:
+        self.link = link
+        self.flow_id = flow_id
+        self.host = None
+
+    def register_host(self, host):
+        self.host = host
+
+    def push(self, pkt) -> None:
+        pkt.flow_id = self.flow_id
+        self.link.push(pkt)
+
+    def pull(self):
+        return self.link.pull_flow(self.flow_id)
+
+    def __getattr__(self, name):
+        if name == 'link':  # not set yet, e.g. while unpickling
+            raise AttributeError(name)
+        return getattr(self.link, name)
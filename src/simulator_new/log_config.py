@@ -0,0 +1,215 @@
+"""Logging configuration shared by all per-event log writers of a Simulator.
+
+Levels
+    off: no log files.
+    summary: no per-event logs, only summary.json with the summary stats.
+    sampled: like full, but each stream only keeps a fraction of its rows,
+        given by sample_rates[stream] (1.0 if missing).
+    full: every row of every stream.
+
+Streams are 'pkt' (pkt_log), 'pacer' (pacer_log.csv), 'aurora_mi'
+(aurora_mi_log.csv), 'gcc' (gcc_log_{id}.csv) and 'decoder'
+(decoder_log.csv). Rows of all csv streams go through one LogWriter which
+formats them into memory and writes them to disk in blocks. Headers are
+written at once, and pending rows are written when a Simulator run ends,
+also by an exception, and at interpreter exit.
+"""
+import atexit
+import csv
+import io
+import json
+import os
+import weakref
+from typing import Dict, Optional
+
+LOG_LEVELS = ('off', 'summary', 'sampled', 'full')
+LOG_STREAMS = ('pkt', 'pacer', 'aurora_mi', 'gcc', 'decoder')
+
+# LogWriters with open streams, flushed at interpreter exit
+_LOG_WRITERS = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_log_writers():
+    for log_writer in list(_LOG_WRITERS):
+        log_writer.flush()
+
+
+class CsvLogStream:
+    """csv.writer-like stream of one log file, buffered by a LogWriter."""
+
+    def __init__(self, log_writer: 'LogWriter', filename: str) -> None:
+        self.log_writer = log_writer
+        self.filename = filename
+        self.fh = open(filename, 'w')
+        self.buf = io.StringIO()
+        self.writer = csv.writer(self.buf, lineterminator='\n')
+
+    def __getstate__(self):
+        # copies, e.g. in a Simulator checkpoint, are detached from the file
+        # and drop their rows
+        return {'log_writer': self.log_writer, 'filename': self.filename}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.fh = None
+        self.buf = io.StringIO()
+        self.writer = csv.writer(self.buf, lineterminator='\n')
+
+    def writeheader(self, header):
+        """Write header to the file at once, so that the log is readable
+        even if the simulation fails before the first block is flushed."""
+        self.writer.writerow(header)
+        self.flush()
+
+    def writerow(self, row):
+        self.writer.writerow(row)
+        self.log_writer.on_row_written()
+
+    def flush(self):
+        if self.buf.tell():
+            if self.fh is not None:
+                self.fh.write(self.buf.getvalue())
+            self.buf.seek(0)
+            self.buf.truncate()
+        if self.fh is not None:
+            self.fh.flush()
+
+    def close(self):
+        if self.fh is not None and not self.fh.closed:
+            self.flush()
+            self.fh.close()
+
+
+class SampledLogStream:
+    """Keep every (1 / sample_rate)-th row of a log stream, deterministically.
+
+    The first row is always kept.
+    """
+
+    def __init__(self, stream, sample_rate: float) -> None:
+        self.stream = stream
+        self.sample_rate = sample_rate
+        self.credit = 1.0
+
+    def writerow(self, row):
+        if self.credit >= 1:
+            self.credit -= 1
+            self.stream.writerow(row)
+        self.credit += self.sample_rate
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        self.stream.close()
+
+
+class LogWriter:
+    """Single buffered writer of the csv streams of a simulation.
+
+    All streams are flushed together once block_rows rows are pending.
+    """
+
+    def __init__(self, block_rows: int = 65536) -> None:
+        self.block_rows = block_rows
+        self.pending_rows = 0
+        self.streams = []
+        _LOG_WRITERS.add(self)
+
+    def open_csv(self, filename: str) -> CsvLogStream:
+        stream = CsvLogStream(self, filename)
+        self.streams.append(stream)
+        return stream
+
+    def add_stream(self, stream) -> None:
+        """Flush and close a writer with its own buffering, e.g. a
+        PacketLogWriter, together with the csv streams."""
+        self.streams.append(stream)
+
+    def on_row_written(self) -> None:
+        self.pending_rows += 1
+        if self.pending_rows >= self.block_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        for stream in self.streams:
+            stream.flush()
+        self.pending_rows = 0
+
+    def close(self) -> None:
+        for stream in self.streams:
+            stream.close()
+        self.streams = []
+        self.pending_rows = 0
+
+
+class LogConfig:
+    """What a Simulator logs to save_dir, see the module docstring."""
+
+    def __init__(self, level: str = 'full',
+                 sample_rates: Optional[Dict[str, float]] = None,
+                 block_rows: int = 65536) -> None:
+        if level not in LOG_LEVELS:
+            raise ValueError("Unsupported log level {}.".format(level))
+        sample_rates = sample_rates or {}
+        for stream, sample_rate in sample_rates.items():
+            if stream not in LOG_STREAMS:
+                raise ValueError("Unknown log stream {}.".format(stream))
+            if not 0 <= sample_rate <= 1:
+                raise ValueError("Sample rate of {} is not in [0, 1].".format(stream))
+        self.level = level
+        self.sample_rates = sample_rates
+        self.writer = LogWriter(block_rows)
+
+    def __del__(self):
+        self.close()
+
+    def __setstate__(self, state):
+        # a copy does not write to the logs of the original, see CsvLogStream
+        self.__dict__.update(state)
+        self.level = 'off'
+
+    def sample_rate(self, stream: str) -> float:
+        if self.level == 'full':
+            return 1.0
+        if self.level == 'sampled':
+            return self.sample_rates.get(stream, 1.0)
+        return 0.0
+
+    def is_enabled(self, stream: str) -> bool:
+        return self.sample_rate(stream) > 0
+
+    def open_csv(self, save_dir: Optional[str], stream: str, fname: str,
+                 header):
+        """Open the csv log of a stream under save_dir.
+
+        Return the log path and a csv.writer-like object, or (None, None) if
+        the stream is not logged.
+        """
+        if not save_dir or not self.is_enabled(stream):
+            return None, None
+        os.makedirs(save_dir, exist_ok=True)
+        log_path = os.path.join(save_dir, fname)
+        csv_writer = self.writer.open_csv(log_path)
+        csv_writer.writeheader(header)  # the header is never sampled
+        return log_path, self.sampled(stream, csv_writer)
+
+    def sampled(self, stream: str, writer):
+        sample_rate = self.sample_rate(stream)
+        if sample_rate >= 1:
+            return writer
+        return SampledLogStream(writer, sample_rate)
+
+    def save_summary(self, save_dir: Optional[str], stats: Dict) -> None:
+        if not save_dir or self.level == 'off':
+            return
+        os.makedirs(save_dir, exist_ok=True)
+        with open(os.path.join(save_dir, 'summary.json'), 'w') as f:
+            json.dump(stats, f, indent=4)
+
+    def flush(self) -> None:
+        self.writer.flush()
+
+    def close(self) -> None:
+        self.writer.close()
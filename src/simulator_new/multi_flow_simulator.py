@@ -0,0 +1,234 @@
+import argparse
+import os
+import time
+from typing import Dict, List
+
+from simulator_new.constant import MSS
+from simulator_new.link import SharedLink
+from simulator_new.log_config import LogConfig
+from simulator_new.net_simulator import make_hosts
+from simulator_new.packet import PacketPool
+from simulator_new.registry import APP_SPECS, CC_SPECS
+from simulator_new.stats_recorder import StatsRecorder
+from simulator_new.trace import Trace, generate_trace
+
+
+def jain_fairness_index(rates) -> float:
+    """Jain's fairness index of per-flow rates, 1 if all rates are equal."""
+    sum_sq = sum(rate * rate for rate in rates)
+    if sum_sq == 0:
+        return 0
+    return sum(rates) ** 2 / (len(rates) * sum_sq)
+
+
+class MultiFlowSimulator:
+    """Simulate flows sharing a bottleneck link over a trace.
+
+    All data packets go through one SharedLink with the bandwidth, delay,
+    queue and loss rate of the trace, and all ack packets through one
+    unlimited SharedLink. Flow i has its own hosts, stats recorder and logs,
+    saved to save_dir/flow_i.
+
+    Args
+        flows: one dict per flow with the names of its 'cc' and 'app', see
+            simulator_new.registry, and optionally Simulator kwargs for this
+            flow only, e.g. {'cc': 'aurora', 'app': 'file_transfer',
+            'model_path': ...}.
+        kwargs: Simulator kwargs shared by all flows.
+    """
+
+    def __init__(self, trace, save_dir, flows: List[Dict], **kwargs) -> None:
+        self.trace = trace
+        self.save_dir = save_dir
+        self.log_config = kwargs.get('log_config', None) or LogConfig(
+            kwargs.get('log_level', 'full'), kwargs.get('log_sample_rates', None))
+        self.data_link = SharedLink(
+            'datalink', trace, prop_delay_ms=trace.min_delay,
+            queue_cap_bytes=trace.queue_size * MSS,
+            pkt_loss_rate=trace.loss_rate)
+        self.ack_link = SharedLink('acklink', None, prop_delay_ms=trace.min_delay)
+        self.pkt_pool = PacketPool() if kwargs.get('pool_pkts', False) else None
+
+        self.flows = flows
+        self.recorders = []
+        self.senders = []
+        self.receivers = []
+        for flow_id, flow in enumerate(flows):
+            flow_kwargs = dict(kwargs, **flow, log_config=self.log_config)
+            flow_dir = os.path.join(save_dir, 'flow_{}'.format(flow_id)) \
+                if save_dir else save_dir
+            recorder = StatsRecorder(
+                flow_dir, self.data_link, self.ack_link,
+                log_format=flow_kwargs.get('pkt_log_format', 'csv'),
+                log_config=self.log_config)
+            sender, receiver = make_hosts(
+                flow_kwargs.pop('cc'), flow_kwargs.pop('app'), trace,
+                self.data_link.port(flow_id), self.ack_link.port(flow_id),
+                recorder, flow_dir, **flow_kwargs)
+            if self.pkt_pool is not None:
+                sender.register_pkt_pool(self.pkt_pool)
+                receiver.register_pkt_pool(self.pkt_pool)
+            self.recorders.append(recorder)
+            self.senders.append(sender)
+            self.receivers.append(receiver)
+        self.hosts = [host for hosts in zip(self.senders, self.receivers)
+                      for host in hosts]
+
+    def simulate(self, dur_sec, summary=True, event_driven=False):
+        """Run the simulation for dur_sec seconds, see Simulator.simulate()."""
+        dur_ms = dur_sec * 1000
+        ts_ms = 0
+        try:
+            while ts_ms < dur_ms:
+                self.tick(ts_ms)
+                if ts_ms == dur_ms - 1:
+                    break
+                ts_ms = min(self.next_event_ts_ms(ts_ms), dur_ms - 1) \
+                    if event_driven else ts_ms + 1
+        finally:
+            # keep the logs up to a failure
+            self.log_config.flush()
+        self.finish(summary)
+
+    def finish(self, summary=True):
+        """Flush the logs of a finished simulation and save the summary of
+        every flow and of the bottleneck."""
+        self.log_config.flush()
+        for recorder in self.recorders:
+            self.log_config.save_summary(recorder.log_dir, recorder.summary_stats())
+        self.log_config.save_summary(self.save_dir, self.summary_stats())
+        if summary:
+            self.summary()
+
+    def summary_stats(self):
+        flow_stats = []
+        for flow, recorder in zip(self.flows, self.recorders):
+            stats = recorder.summary_stats()
+            stats['cc'] = flow['cc']
+            stats['app'] = flow['app']
+            flow_stats.append(stats)
+        rx_rates_Bps = [stats['rx_rate_Bps'] for stats in flow_stats]
+        rcvd = [recorder for recorder in self.recorders if recorder.pkts_rcvd]
+        rx_dur_ms = max(recorder.pkt_rcvd_ts_ms for recorder in rcvd) - \
+            min(recorder.first_pkt_rcvd_ts_ms for recorder in rcvd) if rcvd else 0
+        bytes_rcvd = sum(stats['bytes_rcvd'] for stats in flow_stats)
+        return {'num_flows': len(flow_stats),
+                'bytes_rcvd': bytes_rcvd,
+                'rx_rate_Bps': bytes_rcvd * 1000 / rx_dur_ms if rx_dur_ms > 0 else 0,
+                'jain_fairness_index': jain_fairness_index(rx_rates_Bps),
+                'flows': flow_stats}
+
+    def summary(self):
+        stats = self.summary_stats()
+        for flow_id, flow_stats in enumerate(stats['flows']):
+            print("flow {} {} {}: recving rate {:.2f}Mbps".format(
+                flow_id, flow_stats['cc'], flow_stats['app'],
+                flow_stats['rx_rate_Bps'] * 8 / 1e6))
+        print("total recving rate: {:.2f}Mbps, jain fairness index: {:.3f}".format(
+            stats['rx_rate_Bps'] * 8 / 1e6, stats['jain_fairness_index']))
+        print(f'trace avg bw={self.trace.avg_bw:.2f}Mbps')
+
+    def tick(self, ts_ms):
+        self.data_link.tick(ts_ms)
+        self.ack_link.tick(ts_ms)
+        for host in self.hosts:
+            host.tick(ts_ms)
+
+    def next_event_ts_ms(self, ts_ms):
+        next_ts_ms = min(self.data_link.next_event_ts_ms(ts_ms),
+                         self.ack_link.next_event_ts_ms(ts_ms))
+        if next_ts_ms == ts_ms + 1:
+            return next_ts_ms
+        for host in self.hosts:
+            next_ts_ms = min(next_ts_ms, host.next_event_ts_ms(ts_ms))
+            if next_ts_ms == ts_ms + 1:
+                break  # nothing can happen earlier than the next ms
+        return next_ts_ms
+
+    def reset(self):
+        self.data_link.reset()
+        self.ack_link.reset()
+        for host in self.hosts:
+            host.reset()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("Simulate flows sharing a bottleneck")
+    parser.add_argument(
+        '--trace',
+        type=str,
+        default="",
+        help="A network trace file.",
+    )
+    parser.add_argument(
+        "--lookup-table",
+        type=str,
+        default="./AE_lookup_table/segment_3IY83M-m6is_480x360.mp4.csv",
+        help="A look up table file.",
+    )
+    parser.add_argument(
+        "--save-dir",
+        type=str,
+        default=".",
+        help="A direcotry to save the results.",
+    )
+    parser.add_argument(
+        "--flows",
+        type=str,
+        nargs="+",
+        default=["gcc:video_streaming"],
+        help="Flows as cc:app, e.g. aurora:file_transfer. Congestion "
+        "controls: {}. Applications: {}.".format(
+            ', '.join(CC_SPECS), ', '.join(APP_SPECS)),
+    )
+    parser.add_argument(
+        '--num-flows',
+        type=int,
+        default=1,
+        help="Number of copies of every flow given by --flows.",
+    )
+    parser.add_argument(
+        '--model',
+        type=str,
+        default="",
+        help='Path to an RL model (Aurora).'
+    )
+    parser.add_argument(
+        '--log-level',
+        type=str,
+        default="full",
+        choices=("off", "summary", "sampled", "full"),
+        help='Log level, see simulator_new.log_config.'
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if args.trace:
+        trace = Trace.load_from_file(args.trace)
+    else:
+        trace = generate_trace(duration_range=(30, 30),
+                               bandwidth_lower_bound_range=(1, 1),
+                               bandwidth_upper_bound_range=(5, 5),
+                               delay_range=(25, 25),
+                               loss_rate_range=(0.0, 0.0),
+                               queue_size_range=(20, 20),
+                               T_s_range=(10, 10),
+                               delay_noise_range=(0, 0), seed=42)
+
+    flows = []
+    for _ in range(args.num_flows):
+        for flow in args.flows:
+            cc, app = flow.split(':')
+            flows.append({'cc': cc, 'app': app})
+    simulator = MultiFlowSimulator(
+        trace, args.save_dir, flows, model_path=args.model,
+        lookup_table_path=args.lookup_table, log_level=args.log_level)
+    simulator.simulate(int(trace.duration))
+
+if __name__ == "__main__":
+    t_start = time.time()
+    main()
+    print("time used: {:.2f}s".format(time.time() - t_start))
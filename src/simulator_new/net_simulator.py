@@ -1,105 +1,171 @@
-from simulator_new.app import FileSender, FileReceiver, VideoSender, VideoReceiver
-from simulator_new.cc import Aurora, BBRv1, NoCC, GCC, OracleCC, OracleNoPredictCC
+import copy
+import math
+import pickle
+import random
+
+import numpy as np
+
 from simulator_new.constant import MSS
-from simulator_new.host import Host
-from simulator_new.aurora_host import AuroraHost
-from simulator_new.tcp_host import TCPHost
-from simulator_new.rtp_host import RTPHost
 from simulator_new.link import Link
-from simulator_new.rtx_manager import AuroraRtxManager, WebRtcRtxManager, TCPRtxManager
+from simulator_new.log_config import LogConfig
+from simulator_new.packet import PacketPool
+from simulator_new.registry import get_app_spec, get_cc_spec
 from simulator_new.stats_recorder import StatsRecorder
-from simulator_new.plot.plot import plot_gcc_log, plot_mi_log, plot_pkt_log
+
+def make_hosts(cc, app, trace, data_link, ack_link, recorder, save_dir,
+               **kwargs):
+    """Set up and connect the sender and receiver hosts of a flow running the
+    registered cc and app. The sender sends on data_link and receives on
+    ack_link. kwargs are the Simulator kwargs, with the LogConfig of the
+    simulation in log_config. Return the sender and the receiver."""
+    log_config = kwargs.pop('log_config')
+    cc_spec = get_cc_spec(cc or 'nocc')
+    sender_cc = cc_spec.make_sender_cc(trace, save_dir, log_config, **kwargs)
+    sender_rtx_mngr = cc_spec.make_sender_rtx_mngr()
+    receiver_cc = cc_spec.make_receiver_cc(trace, save_dir, log_config, **kwargs)
+    host_cls = cc_spec.get_host_class()
+
+    app_spec = get_app_spec(app)
+    sender_app = app_spec.make_sender_app(save_dir, log_config, **kwargs)
+    receiver_app = app_spec.make_receiver_app(save_dir, log_config, **kwargs)
+
+    sender = host_cls(0, data_link, ack_link, sender_cc, sender_rtx_mngr,
+                      sender_app, save_dir=save_dir, log_config=log_config)
+    sender.register_stats_recorder(recorder)
+
+    receiver = host_cls(1, ack_link, data_link, receiver_cc, None,
+                        receiver_app)
+    receiver.register_stats_recorder(recorder)
+
+    sender.register_other_host(receiver)
+    receiver.register_other_host(sender)
+    return sender, receiver
+
 
 class Simulator:
+    """Simulate a flow over a trace.
+
+    What is logged to save_dir is set by the kwargs log_level ('off',
+    'summary', 'sampled' or 'full', the default) and log_sample_rates, a dict
+    of stream name to sample rate used at the 'sampled' level, or by a
+    ready-made LogConfig in log_config. See simulator_new.log_config.
+
+    cc and app are names registered in simulator_new.registry. The other
+    kwargs (model_path, lookup_table_path, ...) are passed on to the
+    registered factories.
+
+    A simulation can be paused with run(), saved with checkpoint() and
+    resumed with restore(), or branched with fork(). Copies of a simulator
+    do not write logs (their log level is 'off'), but keep all stats.
+    """
     def __init__(self, trace, save_dir, cc="", app="file_transfer", **kwargs) -> None:
         self.trace = trace
         self.save_dir = save_dir
+        self.log_config = kwargs.get('log_config', None) or LogConfig(
+            kwargs.get('log_level', 'full'), kwargs.get('log_sample_rates', None))
         self.data_link = Link('datalink', trace, prop_delay_ms=trace.min_delay,
                               queue_cap_bytes=trace.queue_size * MSS,
                               pkt_loss_rate=trace.loss_rate)
         self.ack_link = Link('acklink', None, prop_delay_ms=trace.min_delay)
 
-        self.recorder = StatsRecorder(self.save_dir, self.data_link, self.ack_link)
-
-        if cc == 'aurora':
-            self.aurora_model_path = kwargs.get("model_path", "")
-            ae_guided = kwargs.get("ae_guided", False)
-            self.sender_cc = Aurora(self.aurora_model_path, save_dir=self.save_dir,
-                                    ae_guided=ae_guided)
-            self.sender_rtx_mngr = AuroraRtxManager()
-            sender_host = AuroraHost
-
-            self.receiver_cc = NoCC()
-            self.receiver_rtx_mngr = None
-            receiver_host = AuroraHost
-        elif cc == 'bbr':
-            self.sender_cc = BBRv1(seed=42)
-            self.sender_rtx_mngr = TCPRtxManager()
-            sender_host = TCPHost
-            self.receiver_cc = NoCC()
-            self.receiver_rtx_mngr = None
-            receiver_host = TCPHost
-        elif cc == 'cubic':
-            sender_host = TCPHost
-            receiver_host = TCPHost
-            self.receiver_cc = NoCC()
-            self.receiver_rtx_mngr = None
-            raise NotImplementedError
-        elif cc == 'gcc':
-            sender_host = RTPHost
-            self.sender_cc = GCC(save_dir)
-            self.sender_rtx_mngr = WebRtcRtxManager()
-
-            self.receiver_cc = GCC(save_dir)
-            self.receiver_rtx_mngr = None
-            receiver_host = RTPHost
-        elif cc == 'oracle':
-            self.sender_cc = OracleCC(trace)
-            self.sender_rtx_mngr = AuroraRtxManager()
-            sender_host = AuroraHost
-
-            self.receiver_cc = NoCC()
-            self.receiver_rtx_mngr = None
-            receiver_host = AuroraHost
-        elif cc == 'oracle_no_predict':
-            self.sender_cc = OracleNoPredictCC(trace)
-            self.sender_rtx_mngr = AuroraRtxManager()
-            sender_host = AuroraHost
-
-            self.receiver_cc = NoCC()
-            self.receiver_rtx_mngr = None
-            receiver_host = AuroraHost
-        else:
-            self.sender_cc = NoCC()
-            self.sender_rtx_mngr = None
-            sender_host = Host
-        if app == 'file_transfer':
-            self.sender_app = FileSender()
-            self.receiver_app = FileReceiver()
-        elif app == 'video_streaming':
-            lookup_table_path = kwargs['lookup_table_path']
-            self.sender_app = VideoSender(lookup_table_path)
-            self.receiver_app = VideoReceiver(lookup_table_path, save_dir=self.save_dir)
-        else:
-            raise NotImplementedError
-
-        self.sender = sender_host(0, self.data_link, self.ack_link,
-                                  self.sender_cc, self.sender_rtx_mngr,
-                                  self.sender_app, save_dir=self.save_dir)
-        self.sender.register_stats_recorder(self.recorder)
-
-        self.receiver = receiver_host(1, self.ack_link, self.data_link,
-                                      self.receiver_cc, self.receiver_rtx_mngr,
-                                      self.receiver_app)
-        self.receiver.register_stats_recorder(self.recorder)
-
-        self.sender.register_other_host(self.receiver)
-        self.receiver.register_other_host(self.sender)
-
-    def simulate(self, dur_sec, summary=True):
+        self.recorder = StatsRecorder(
+            self.save_dir, self.data_link, self.ack_link,
+            log_format=kwargs.get('pkt_log_format', 'csv'),
+            log_config=self.log_config)
+
+        self.sender, self.receiver = make_hosts(
+            cc, app, trace, self.data_link, self.ack_link, self.recorder,
+            self.save_dir, **dict(kwargs, log_config=self.log_config))
+        self.sender_cc = self.sender.cc
+        self.sender_rtx_mngr = self.sender.rtx_mngr
+        self.sender_app = self.sender.app
+        self.receiver_cc = self.receiver.cc
+        self.receiver_rtx_mngr = self.receiver.rtx_mngr
+        self.receiver_app = self.receiver.app
+
+        # recycle ack/nack packets instead of allocating one per data packet
+        self.pkt_pool = PacketPool() if kwargs.get('pool_pkts', False) else None
+        if self.pkt_pool is not None:
+            self.sender.register_pkt_pool(self.pkt_pool)
+            self.receiver.register_pkt_pool(self.pkt_pool)
+        # next timestamp to tick
+        self.ts_ms = 0
+
+    def simulate(self, dur_sec, summary=True, event_driven=False):
+        """Run the simulation for dur_sec seconds, from where it is, e.g.
+        after run() or restore().
+
+        In event-driven mode, the simulator jumps from one due timestamp to
+        the next instead of ticking every millisecond. Both modes produce the
+        same logs. Event-driven mode is faster when there are fewer events
+        than milliseconds, e.g. on low bandwidth traces, and slower otherwise.
+        """
         dur_ms = dur_sec * 1000
-        for ts_ms in range(dur_ms):
-            self.tick(ts_ms)
+        self.run(dur_ms, dur_ms, event_driven)
+        self.finish(summary)
+
+    def run(self, until_ms, dur_ms=None, event_driven=False):
+        """Tick a simulation of dur_ms ms (until_ms by default) up to, but
+        excluding, until_ms. Pausing a run with run() and resuming it
+        ticks the same timestamps as an uninterrupted run."""
+        dur_ms = until_ms if dur_ms is None else dur_ms
+        end_ms = min(until_ms, dur_ms)
+        try:
+            if event_driven:
+                while self.ts_ms < end_ms:
+                    ts_ms = self.ts_ms
+                    self.tick(ts_ms)
+                    if ts_ms == dur_ms - 1:
+                        self.ts_ms = dur_ms
+                        break
+                    # always end on the last ms to flush the skipped ticks
+                    self.ts_ms = min(self.next_event_ts_ms(ts_ms), dur_ms - 1)
+            else:
+                for ts_ms in range(self.ts_ms, end_ms):
+                    self.tick(ts_ms)
+                self.ts_ms = max(self.ts_ms, end_ms)
+        finally:
+            # keep the logs up to a failure
+            self.log_config.flush()
+
+    def checkpoint(self) -> bytes:
+        """Return the state of the simulation and of the random and
+        np.random generators, which links and apps draw from.
+
+        Traces are saved in full. Lookup tables and agents restored from a
+        model path are saved by reference and shared with the simulators of
+        the restoring process.
+        """
+        self.log_config.flush()
+        return pickle.dumps((self, random.getstate(), np.random.get_state()),
+                            protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def restore(data: bytes, restore_rng=True) -> 'Simulator':
+        """Return the simulator of a checkpoint(), with the random generators
+        set as they were at the checkpoint if restore_rng."""
+        simulator, random_state, np_random_state = pickle.loads(data)
+        if restore_rng:
+            random.setstate(random_state)
+            np.random.set_state(np_random_state)
+        return simulator
+
+    def fork(self) -> 'Simulator':
+        """Return an in-memory copy of the simulation. The trace series,
+        lookup tables and agents are shared with the copy, everything else is
+        copied.
+
+        The global random generators are not copied. To give forks the same
+        draws, save random.getstate() and np.random.get_state() at the fork
+        and set them before running each fork.
+        """
+        self.log_config.flush()
+        return copy.deepcopy(self)
+
+    def finish(self, summary=True):
+        """Flush the logs of a finished simulation and save its summary."""
+        self.log_config.flush()
+        self.log_config.save_summary(self.save_dir, self.recorder.summary_stats())
         if summary:
             self.summary()
 
@@ -107,16 +173,19 @@ class Simulator:
         sender_cc_name = self.sender_cc.__class__.__name__.lower()
         self.recorder.summary()
         print(f'trace avg bw={self.trace.avg_bw:.2f}Mbps')
-        if isinstance(self.sender_cc, Aurora) and self.sender_cc.mi_log_path:
+        if self.log_config.level == 'off':
+            return  # no logs to plot, e.g. in a copy of a simulator
+        # matplotlib is only imported to plot a summary
+        from simulator_new.plot.plot import plot_gcc_log, plot_mi_log, plot_pkt_log
+        if getattr(self.sender_cc, 'mi_log_path', None):
             plot_mi_log(self.data_link.bw_trace, self.sender_cc.mi_log_path,
                         self.save_dir, sender_cc_name)
-        if isinstance(self.sender_cc, GCC) and isinstance(self.receiver_cc, GCC) \
-            and self.sender_cc.gcc_log_path and self.receiver_cc.gcc_log_path:
+        if getattr(self.sender_cc, 'gcc_log_path', None) and \
+            getattr(self.receiver_cc, 'gcc_log_path', None):
             plot_gcc_log(self.data_link.bw_trace, self.sender_cc.gcc_log_path,
                          self.receiver_cc.gcc_log_path, self.sender.pacer.log_path, self.save_dir)
         if self.recorder.log_fname:
-            rcvr_app_log_name = self.receiver_app.log_fname \
-                if isinstance(self.receiver_app, VideoReceiver) else None
+            rcvr_app_log_name = getattr(self.receiver_app, 'log_fname', None)
             plot_pkt_log(self.data_link.bw_trace, self.recorder.log_fname,
                          self.save_dir, sender_cc_name, rcvr_app_log_name)
 
@@ -126,7 +195,16 @@ class Simulator:
         self.sender.tick(ts_ms)
         self.receiver.tick(ts_ms)
 
+    def next_event_ts_ms(self, ts_ms):
+        next_ts_ms = math.inf
+        for observer in (self.sender, self.receiver, self.data_link, self.ack_link):
+            next_ts_ms = min(next_ts_ms, observer.next_event_ts_ms(ts_ms))
+            if next_ts_ms == ts_ms + 1:
+                break  # nothing can happen earlier than the next ms
+        return next_ts_ms
+
     def reset(self):
+        self.ts_ms = 0
         self.data_link.reset()
         self.ack_link.reset()
         self.sender.reset()
@@ -1,38 +1,44 @@
-import csv
-import os
+import math
 
 from simulator_new.constant import MSS
+from simulator_new.log_config import LogConfig
 
 class Pacer:
     def __init__(self, host, max_budget_byte=2* MSS,
-                 pacing_rate_update_step_ms=40, save_dir=None) -> None:
+                 pacing_rate_update_step_ms=40, save_dir=None,
+                 log_config=None) -> None:
         self.host = host
         self.max_budget_byte = max_budget_byte
         self.pacing_rate_update_step_ms = pacing_rate_update_step_ms
         self.budget_byte = MSS
         self.ts_last_update_ms = 0
-        if save_dir:
-            os.makedirs(save_dir, exist_ok=True)
-            self.log_path = os.path.join(save_dir, 'pacer_log.csv')
-            self.pacer_log = open(self.log_path, 'w', 1)
-            self.csv_writer = csv.writer(self.pacer_log, lineterminator='\n')
-            self.csv_writer.writerow(['timestamp_ms', "pacing_rate_Bps"])
-        else:
-            self.log_path = None
-            self.pacer_log = None
-            self.csv_writer = None
+        # the budget grows linearly at the pacing rate from budget_base_byte
+        # at ts_budget_base_ms, until the next packet sent or rate update
+        self.budget_base_byte = MSS
+        self.ts_budget_base_ms = 0
+        self.pacing_rate_Bps = 0
+        # (pkt_size_byte, next_send_ts_ms()) while the estimate is a function
+        # of time only and nothing but ticks changed the budget since
+        self.next_send = None
+        self.log_config = log_config or LogConfig()
+        self.log_path, self.csv_writer = self.log_config.open_csv(
+            save_dir, 'pacer', 'pacer_log.csv',
+            ['timestamp_ms', "pacing_rate_Bps"])
         self.set_pacing_rate_Bps(0, self.host.cc.get_est_rate_Bps(
             0, self.pacing_rate_update_step_ms))
 
-    def __del__(self):
-        if self.pacer_log:
-            self.pacer_log.close()
-
     def set_pacing_rate_mbps(self, ts_ms, rate_mbps):
         self.set_pacing_rate_Bps(ts_ms, rate_mbps * 1e6 / 8)
 
     def set_pacing_rate_Bps(self, ts_ms, rate_Bps):
-        self.pacing_rate_Bps = rate_Bps
+        self.next_send = None
+        self._update_pacing_rate_Bps(ts_ms, rate_Bps)
+
+    def _update_pacing_rate_Bps(self, ts_ms, rate_Bps):
+        if rate_Bps != self.pacing_rate_Bps:
+            # the budget grew at the old rate until ts_ms
+            self._rebase_budget(self._budget_at(ts_ms), ts_ms)
+            self.pacing_rate_Bps = rate_Bps
         self.ts_last_pacing_rate_update_ms = ts_ms
         if self.csv_writer:
             self.csv_writer.writerow(
@@ -44,21 +50,106 @@ class Pacer:
     def on_pkt_sent(self, pkt_size_byte):
         assert pkt_size_byte <= self.budget_byte, f"{pkt_size_byte} {self.budget_byte}"
         self.budget_byte -= pkt_size_byte
+        self.next_send = None
+        self._rebase_budget(self.budget_byte, self.ts_last_update_ms)
+
+    def _rebase_budget(self, budget_byte, ts_ms):
+        self.budget_base_byte = budget_byte
+        self.ts_budget_base_ms = ts_ms
+
+    def _grow_budget(self, budget_byte, rate_Bps, elapsed_time_ms):
+        return min(self.max_budget_byte, budget_byte + rate_Bps * elapsed_time_ms / 1000)
+
+    def _budget_at(self, ts_ms):
+        return self._grow_budget(self.budget_base_byte, self.pacing_rate_Bps,
+                                 ts_ms - self.ts_budget_base_ms)
+
+    def _rate_update_interval_ms(self):
+        """Return the ms between two pacing rate updates, the first whole ms
+        at least pacing_rate_update_step_ms after the previous update."""
+        interval_ms = math.ceil(self.pacing_rate_update_step_ms)
+        return interval_ms if interval_ms >= self.pacing_rate_update_step_ms \
+            else interval_ms + 1
+
+    def next_send_ts_ms(self, pkt_size_byte):
+        """Return the first timestamp at which a packet of pkt_size_byte can
+        be sent, assuming the congestion control rate estimate does not change
+        in the meantime."""
+        if pkt_size_byte > self.max_budget_byte:
+            return math.inf
+        time_varying = self.host.cc.TIME_VARYING_EST_RATE
+        if time_varying and self.next_send is not None and \
+            self.next_send[0] == pkt_size_byte and \
+            self.next_send[1] >= self.ts_last_update_ms:
+            # ticks follow the predicted rate updates
+            return self.next_send[1]
+        interval_ms = self._rate_update_interval_ms()
+        base_byte = self.budget_base_byte
+        ts_base_ms = self.ts_budget_base_ms
+        rate_Bps = self.pacing_rate_Bps
+        ts_rate_update_ms = self.ts_last_pacing_rate_update_ms
+        ts_ms = self.ts_last_update_ms
+        while self._grow_budget(base_byte, rate_Bps, ts_ms - ts_base_ms) < pkt_size_byte:
+            predicted = ts_rate_update_ms > self.ts_last_pacing_rate_update_ms
+            if rate_Bps <= 0 and predicted:
+                return math.inf
+            # once updated, a rate which does not depend on time stays
+            ts_update_ms = ts_rate_update_ms + interval_ms \
+                if time_varying or not predicted else math.inf
+            if rate_Bps > 0:
+                # first ms at which the budget reaches pkt_size_byte at this
+                # rate, corrected for the rounding of the division
+                send_ts_ms = max(ts_ms + 1, ts_base_ms + math.ceil(
+                    (pkt_size_byte - base_byte) * 1000 / rate_Bps))
+                while send_ts_ms - 1 > ts_ms and self._grow_budget(
+                        base_byte, rate_Bps, send_ts_ms - 1 - ts_base_ms) >= pkt_size_byte:
+                    send_ts_ms -= 1
+                while send_ts_ms < ts_update_ms and self._grow_budget(
+                        base_byte, rate_Bps, send_ts_ms - ts_base_ms) < pkt_size_byte:
+                    send_ts_ms += 1
+                if send_ts_ms < ts_update_ms:
+                    ts_ms = send_ts_ms
+                    break
+            ts_ms = ts_update_ms
+            next_rate_Bps = self.host.cc.get_est_rate_Bps(
+                ts_ms, ts_ms + self.pacing_rate_update_step_ms)
+            if next_rate_Bps != rate_Bps:
+                base_byte = self._grow_budget(base_byte, rate_Bps, ts_ms - ts_base_ms)
+                ts_base_ms = ts_ms
+                rate_Bps = next_rate_Bps
+            ts_rate_update_ms = ts_ms
+        if time_varying:
+            self.next_send = (pkt_size_byte, ts_ms)
+        return ts_ms
 
     def tick(self, ts_ms):
-        # update_budget
-        elapsed_time_ms = ts_ms - self.ts_last_update_ms
-        budget_inc = self.pacing_rate_Bps * elapsed_time_ms / 1000
-        self.budget_byte = min(self.max_budget_byte, self.budget_byte + budget_inc)
+        # the budget grows in closed form between rate updates, so skipped
+        # milliseconds only cost the rate updates due in between
+        interval_ms = self._rate_update_interval_ms()
+        ts_update_ms = self.ts_last_pacing_rate_update_ms + interval_ms
+        while ts_update_ms <= ts_ms:
+            self._update_pacing_rate_Bps(ts_update_ms, self.host.cc.get_est_rate_Bps(
+                ts_update_ms, ts_update_ms + self.pacing_rate_update_step_ms))
+            if not self.host.cc.TIME_VARYING_EST_RATE:
+                # the estimate cannot change before the next tick, so the
+                # skipped updates only have to be logged
+                ts_updates_ms = range(ts_update_ms + interval_ms, ts_ms + 1, interval_ms)
+                if ts_updates_ms:
+                    self.ts_last_pacing_rate_update_ms = ts_updates_ms[-1]
+                    if self.csv_writer:
+                        for ts in ts_updates_ms:
+                            self.csv_writer.writerow([ts, self.pacing_rate_Bps])
+                break
+            ts_update_ms += interval_ms
+        self.budget_byte = self._budget_at(ts_ms)
         self.ts_last_update_ms = ts_ms
 
-        if ts_ms - self.ts_last_pacing_rate_update_ms >= self.pacing_rate_update_step_ms:
-            self.set_pacing_rate_Bps(ts_ms, self.host.cc.get_est_rate_Bps(
-                ts_ms, ts_ms + self.pacing_rate_update_step_ms))
-
     def reset(self):
         self.budget_byte = MSS
         self.ts_last_update_ms = 0
+        self._rebase_budget(MSS, 0)
+        self.pacing_rate_Bps = 0
+        self.next_send = None
         self.set_pacing_rate_Bps(0, self.host.cc.get_est_rate_Bps(
             0, self.pacing_rate_update_step_ms))
 # pacer = Pacer(MSS * 10)
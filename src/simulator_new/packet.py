@@ -1,8 +1,34 @@
+class FrameInfo:
+    """Metadata of an encoded video frame shared by all its packets."""
+    __slots__ = ('frame_id', 'num_pkts', 'frame_size_bytes', 'padding_bytes',
+                 'model_id', 'frame_encode_ts_ms', 'target_bitrate_Bps',
+                 'padding')
+
+    def __init__(self, frame_id: int, num_pkts: int, frame_size_bytes: int,
+                 padding_bytes: int, model_id, frame_encode_ts_ms: int,
+                 target_bitrate_Bps: float, padding: int) -> None:
+        self.frame_id = frame_id
+        self.num_pkts = num_pkts
+        self.frame_size_bytes = frame_size_bytes
+        self.padding_bytes = padding_bytes
+        self.model_id = model_id
+        self.frame_encode_ts_ms = frame_encode_ts_ms
+        self.target_bitrate_Bps = target_bitrate_Bps
+        self.padding = padding  # 1 if the packet only carries padding
+
+
 class Packet:
     DATA_PKT = "data"
     ACK_PKT = "ack"
 
-    def __init__(self, pkt_id, pkt_type, size_bytes: int, app_data) -> None:
+    __slots__ = ('pkt_id', 'pkt_type', 'size_bytes', 'prop_delay_ms',
+                 'queue_delay_ms', 'ts_sent_ms', 'ts_first_sent_ms',
+                 'ts_rcvd_ms', 'data_pkt_ts_sent_ms', 'acked_size_bytes',
+                 'pacing_rate_Bps', 'frame', 'frame_id', 'frame_quality',
+                 'frame_delay_ms', 'probe_cluster_id', 'flow_id')
+
+    def __init__(self, pkt_id, pkt_type, size_bytes: int,
+                 frame: 'FrameInfo' = None) -> None:
         self.pkt_id = pkt_id
         self.pkt_type = pkt_type
         self.size_bytes = size_bytes
@@ -13,8 +39,16 @@ class Packet:
         self.ts_rcvd_ms = 0
         self.data_pkt_ts_sent_ms = 0
         self.acked_size_bytes = 0
-        self.app_data = app_data
         self.pacing_rate_Bps = 0  # pacing rate when sent
+        # video frame carried by a data packet
+        self.frame = frame
+        # frame id of a data packet, or frame id to decode in an ack packet
+        self.frame_id = None if frame is None else frame.frame_id
+        # quality and delay of the last decoded frame in an ack packet
+        self.frame_quality = None
+        self.frame_delay_ms = None
+        self.probe_cluster_id = -1  # -1 if not sent in a bandwidth probe
+        self.flow_id = 0  # set when pushed onto a SharedLink
 
     def add_prop_delay_ms(self, delay_ms: int) -> None:
         """Add to the propagation delay."""
@@ -33,14 +67,21 @@ class Packet:
     def is_ack_pkt(self):
         return self.pkt_type == self.ACK_PKT
 
+    def is_padding(self):
+        return self.frame is not None and self.frame.padding == 1
+
     def rtt_ms(self):
         assert self.pkt_type == Packet.ACK_PKT
         return self.ts_rcvd_ms - self.data_pkt_ts_sent_ms
 
 
 class TCPPacket(Packet):
-    def __init__(self, pkt_id: int, pkt_type, pkt_size_bytes, app_data):
-        super().__init__(pkt_id, pkt_type, pkt_size_bytes, app_data)
+    __slots__ = ('delivered_byte', 'delivered_time_ms', 'is_app_limited',
+                 'in_fast_recovery_mode')
+
+    def __init__(self, pkt_id: int, pkt_type, pkt_size_bytes,
+                 frame: FrameInfo = None):
+        super().__init__(pkt_id, pkt_type, pkt_size_bytes, frame)
         self.delivered_byte = 0
         self.delivered_time_ms = 0
         self.is_app_limited = False
@@ -51,11 +92,15 @@ class RTPPacket(Packet):
     DATA_PKT = "RTP"
     ACK_PKT = "RTCP"
     NACK_PKT = "NACK"
-    def __init__(self, pkt_id, pkt_type, size_bytes: int, app_data) -> None:
-        super().__init__(pkt_id, pkt_type, size_bytes, app_data)
+
+    __slots__ = ('estimated_rate_Bps', 'loss_fraction', 'probe_info')
+
+    def __init__(self, pkt_id, pkt_type, size_bytes: int,
+                 frame: FrameInfo = None) -> None:
+        super().__init__(pkt_id, pkt_type, size_bytes, frame)
         self.estimated_rate_Bps = 0
         self.loss_fraction = 0.0
-        self.probe_info = {}
+        self.probe_info = None
 
     def is_rtcp_pkt(self):
         return self.pkt_type == self.ACK_PKT
@@ -65,3 +110,61 @@ class RTPPacket(Packet):
 
     def is_nack_pkt(self):
         return self.pkt_type == self.NACK_PKT
+
+
+class PacketRecord:
+    """Snapshot of the fields of a sent packet needed to detect its loss and
+    retransmit it. Much cheaper than a deep copy of the packet."""
+    __slots__ = ('pkt_cls', 'pkt_id', 'pkt_type', 'size_bytes', 'frame',
+                 'frame_id', 'prop_delay_ms', 'queue_delay_ms', 'ts_sent_ms',
+                 'ts_first_sent_ms', 'probe_cluster_id')
+
+    def __init__(self, pkt) -> None:
+        self.pkt_cls = type(pkt)
+        self.pkt_id = pkt.pkt_id
+        self.pkt_type = pkt.pkt_type
+        self.size_bytes = pkt.size_bytes
+        self.frame = pkt.frame  # FrameInfo is never modified, so share it
+        self.frame_id = pkt.frame_id
+        self.prop_delay_ms = pkt.prop_delay_ms
+        self.queue_delay_ms = pkt.queue_delay_ms
+        self.ts_sent_ms = pkt.ts_sent_ms
+        self.ts_first_sent_ms = pkt.ts_first_sent_ms
+        self.probe_cluster_id = pkt.probe_cluster_id
+
+    def to_pkt(self):
+        """Rebuild the packet for retransmission."""
+        pkt = self.pkt_cls(self.pkt_id, self.pkt_type, self.size_bytes,
+                           self.frame)
+        pkt.frame_id = self.frame_id
+        pkt.prop_delay_ms = self.prop_delay_ms
+        pkt.queue_delay_ms = self.queue_delay_ms
+        pkt.ts_sent_ms = self.ts_sent_ms
+        pkt.ts_first_sent_ms = self.ts_first_sent_ms
+        pkt.probe_cluster_id = self.probe_cluster_id
+        return pkt
+
+
+class PacketPool:
+    """Free list of control packets (ACK, RTCP and NACK).
+
+    Hosts release a control packet once it has been processed on arrival, and
+    get() hands it out again with all fields reinitialized.
+    """
+
+    def __init__(self) -> None:
+        self.free_pkts = {}
+
+    def get(self, pkt_cls, pkt_id, pkt_type, size_bytes: int):
+        free_pkts = self.free_pkts.get(pkt_cls)
+        if not free_pkts:
+            return pkt_cls(pkt_id, pkt_type, size_bytes)
+        pkt = free_pkts.pop()
+        pkt.__init__(pkt_id, pkt_type, size_bytes)
+        return pkt
+
+    def put(self, pkt) -> None:
+        self.free_pkts.setdefault(type(pkt), []).append(pkt)
+
+    def reset(self) -> None:
+        self.free_pkts = {}
@@ -0,0 +1,139 @@
+"""Binary packet log.
+
+Rows are buffered in memory and appended to disk in large blocks as raw
+records of PKT_LOG_DTYPE, so logging costs one write per block instead of
+one per packet event. Use pkt_log_to_csv(), or run this module, to convert a
+binary log into the CSV format written by StatsRecorder.
+"""
+import argparse
+import csv
+import os
+
+import numpy as np
+
+PKT_LOG_HEADER = ["timestamp_ms", "pkt_id", "pkt_type", "size_bytes",
+                  "one_way_delay_ms", "rtt_ms", 'queue_size_bytes',
+                  'budget_bytes', 'frame_id', 'is_rtx', 'padding']
+
+PKT_TYPES = ('data', 'ack', 'RTP', 'RTCP', 'NACK', 'lost', 'arrived')
+PKT_TYPE_CODES = {pkt_type: code for code, pkt_type in enumerate(PKT_TYPES)}
+
+# frame_id and padding are -1 when a row has no value for them
+PKT_LOG_DTYPE = np.dtype([
+    ('timestamp_ms', np.int64), ('pkt_id', np.int64), ('pkt_type', np.uint8),
+    ('size_bytes', np.int64), ('one_way_delay_ms', np.float64),
+    ('rtt_ms', np.float64), ('queue_size_bytes', np.int64),
+    ('budget_bytes', np.float64), ('frame_id', np.int64),
+    ('is_rtx', np.int8), ('padding', np.int8)])
+
+
+class PacketLogWriter:
+    """Drop-in replacement of csv.writer for StatsRecorder rows."""
+
+    def __init__(self, filename: str, block_size: int = 65536) -> None:
+        self.filename = filename
+        self.block_size = block_size
+        self.rows = []
+        self.fh = open(filename, 'wb')
+
+    def __getstate__(self):
+        # copies, e.g. in a Simulator checkpoint, are detached from the file
+        # and drop their rows
+        return {'filename': self.filename, 'block_size': self.block_size}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.rows = []
+        self.fh = None
+
+    def writerow(self, row):
+        if len(row) == 4:
+            ts_ms, pkt_id, pkt_type, size_bytes = row
+            self.rows.append((ts_ms, pkt_id, PKT_TYPE_CODES[pkt_type],
+                              size_bytes, 0, 0, 0, 0, -1, -1, -1))
+        elif len(row) == 8:
+            self.rows.append((row[0], row[1], PKT_TYPE_CODES[row[2]], *row[3:],
+                              -1, -1, -1))
+        else:
+            ts_ms, pkt_id, pkt_type, size_bytes, owd_ms, rtt_ms, qsize_bytes, \
+                budget_bytes, frame_id, is_rtx, padding = row
+            self.rows.append((
+                ts_ms, pkt_id, PKT_TYPE_CODES[pkt_type], size_bytes, owd_ms,
+                rtt_ms, qsize_bytes, budget_bytes,
+                -1 if frame_id is None else frame_id, is_rtx,
+                -1 if padding is None else padding))
+        if len(self.rows) >= self.block_size:
+            self.flush()
+
+    def flush(self):
+        if self.fh is None:
+            self.rows = []
+            return
+        if self.rows:
+            np.array(self.rows, dtype=PKT_LOG_DTYPE).tofile(self.fh)
+            self.rows = []
+        self.fh.flush()
+
+    def close(self):
+        if self.fh is not None and not self.fh.closed:
+            self.flush()
+            self.fh.close()
+
+
+def load_pkt_log(filename: str) -> np.ndarray:
+    """Return a binary packet log as a read-only structured array."""
+    if os.path.getsize(filename) == 0:
+        return np.empty(0, dtype=PKT_LOG_DTYPE)
+    return np.memmap(filename, dtype=PKT_LOG_DTYPE, mode='r')
+
+
+def iter_pkt_log_rows(filename: str):
+    """Yield the rows of a binary packet log as CSV fields, header first."""
+    yield PKT_LOG_HEADER
+    for rec in load_pkt_log(filename):
+        pkt_type = PKT_TYPES[rec['pkt_type']]
+        row = [str(rec['timestamp_ms']), str(rec['pkt_id']), pkt_type,
+               str(rec['size_bytes'])]
+        if pkt_type == 'lost':
+            yield row
+            continue
+        owd_ms = repr(float(rec['one_way_delay_ms']))
+        if pkt_type in ('data', 'RTP'):
+            row += ['0', '0']
+        elif pkt_type in ('ack', 'RTCP'):
+            row += [owd_ms, str(int(rec['rtt_ms']))]
+        else:
+            row += [owd_ms, owd_ms]
+        row += [str(rec['queue_size_bytes']),
+                repr(float(rec['budget_bytes']))]
+        if pkt_type in ('data', 'RTP', 'arrived'):
+            row += ['' if rec['frame_id'] == -1 else str(rec['frame_id']),
+                    str(rec['is_rtx']),
+                    '' if rec['padding'] == -1 else str(rec['padding'])]
+        yield row
+
+
+def read_pkt_log_rows(filename: str):
+    """Yield the rows of a csv or binary (.bin) packet log as CSV fields."""
+    if filename.endswith('.bin'):
+        yield from iter_pkt_log_rows(filename)
+    else:
+        with open(filename, 'r') as f:
+            yield from csv.reader(f)
+
+
+def pkt_log_to_csv(filename: str, csv_filename: str):
+    with open(csv_filename, 'w', newline='') as f:
+        csv.writer(f, lineterminator="\n").writerows(iter_pkt_log_rows(filename))
+
+
+def main():
+    parser = argparse.ArgumentParser("Convert a binary packet log to csv.")
+    parser.add_argument('log', type=str, help="A binary packet log.")
+    parser.add_argument('csv', type=str, help="Output csv file.")
+    args = parser.parse_args()
+    pkt_log_to_csv(args.log, args.csv)
+
+
+if __name__ == '__main__':
+    main()
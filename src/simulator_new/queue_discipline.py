@@ -0,0 +1,49 @@
+from abc import ABC, abstractmethod
+from collections import deque
+
+
+class QueueDiscipline(ABC):
+    """FIFO packet queue in front of a bottleneck link.
+
+    Subclasses decide which packets are admitted. All operations are O(1).
+    """
+
+    def __init__(self, cap_bytes=-1) -> None:
+        self.cap_bytes = cap_bytes
+        self.size_bytes = 0
+        self.pkts = deque()
+
+    @abstractmethod
+    def enqueue(self, pkt) -> bool:
+        """Add a packet to the queue. Return False if it is dropped."""
+        pass
+
+    def dequeue(self):
+        pkt = self.pkts.popleft()
+        self.size_bytes -= pkt.size_bytes
+        return pkt
+
+    def peek(self):
+        return self.pkts[0]
+
+    def __len__(self):
+        return len(self.pkts)
+
+    def __iter__(self):
+        return iter(self.pkts)
+
+    def reset(self) -> None:
+        self.size_bytes = 0
+        self.pkts.clear()
+
+
+class DropTailQueue(QueueDiscipline):
+    """Drop arriving packets which do not fit. cap_bytes=-1 means unbounded."""
+
+    def enqueue(self, pkt) -> bool:
+        if self.cap_bytes != -1 and \
+            pkt.size_bytes + self.size_bytes > self.cap_bytes:
+            return False
+        self.pkts.append(pkt)
+        self.size_bytes += pkt.size_bytes
+        return True
@@ -12,7 +12,7 @@ class RateAllocator:
             pkt = self.rtx_mngr.get_buffered_pkt(pkt_id)
             if pkt:
                 rtx_qsize_bytes += pkt.size_bytes
-        app_qsize_bytes = sum([pkt["pkt_size_bytes"] for pkt in self.app.pkt_queue])
+        app_qsize_bytes = sum([pkt_size for pkt_size, _ in self.app.pkt_queue])
         pace_bytes = int(pacing_rate_Bps * self.pacer.pacing_rate_update_step_ms / 1000)
         encode_bytes = max(pace_bytes - rtx_qsize_bytes - app_qsize_bytes, 0)
         return encode_bytes * self.app.fps
@@ -0,0 +1,203 @@
+"""Congestion controls and applications by name.
+
+Every congestion control is registered with the hosts, retransmission
+manager and receiver congestion control it runs with, and every application
+with its sender and receiver. Simulator looks them up by name, so that a new
+congestion control or application is added with register_cc() or
+register_app() instead of by editing the simulator:
+
+    from simulator_new.registry import register_cc
+    register_cc('my_aurora', 'my_package.MyAurora', 'simulator_new.aurora_host.AuroraHost',
+                'simulator_new.rtx_manager.AuroraRtxManager', make_cc=make_aurora)
+    Simulator(trace, save_dir, 'my_aurora', 'file_transfer')
+
+Classes may be given by their import path, in which case they are only
+imported when first looked up, so that a simulation does not import the
+dependencies (tensorflow, gym, pandas, ...) of the congestion controls and
+applications it does not use.
+"""
+import importlib
+
+
+def import_class(class_path):
+    """Import a class given as 'package.module.ClassName'. Classes are
+    returned as is."""
+    if not isinstance(class_path, str):
+        return class_path
+    module_name, _, class_name = class_path.rpartition('.')
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def _make_default(cc_class, trace, save_dir, log_config, **kwargs):
+    return cc_class()
+
+
+def _make_default_app(app_class, save_dir, log_config, **kwargs):
+    return app_class()
+
+
+def make_aurora(cc_class, trace, save_dir, log_config, **kwargs):
+    return cc_class(kwargs.get('model_path', ''), save_dir=save_dir,
+                    ae_guided=kwargs.get('ae_guided', False),
+                    log_config=log_config)
+
+
+def make_bbr(cc_class, trace, save_dir, log_config, **kwargs):
+    return cc_class(seed=kwargs.get('seed', 42))
+
+
+def make_gcc(cc_class, trace, save_dir, log_config, **kwargs):
+    return cc_class(save_dir, log_config)
+
+
+def make_oracle(cc_class, trace, save_dir, log_config, **kwargs):
+    return cc_class(trace)
+
+
+def make_video_sender(app_class, save_dir, log_config, **kwargs):
+    return app_class(kwargs['lookup_table_path'])
+
+
+def make_video_receiver(app_class, save_dir, log_config, **kwargs):
+    return app_class(kwargs['lookup_table_path'], save_dir=save_dir,
+                     log_config=log_config)
+
+
+class CCSpec:
+    """How Simulator sets up a congestion control.
+
+    Args
+        cc_class: class of the sender cc.
+        host_class: class of the sender and receiver hosts.
+        rtx_mngr_class: class of the sender retransmission manager, or None.
+        receiver_cc_class: class of the receiver cc. NoCC if None.
+        make_cc: make_cc(cc_class, trace, save_dir, log_config, **kwargs)
+            returns a cc given the Simulator arguments. Used for the sender
+            cc and a receiver_cc_class if given. Calls cc_class() if None.
+    """
+
+    def __init__(self, cc_class, host_class, rtx_mngr_class=None,
+                 receiver_cc_class=None, make_cc=None) -> None:
+        self.cc_class = cc_class
+        self.host_class = host_class
+        self.rtx_mngr_class = rtx_mngr_class
+        self.receiver_cc_class = receiver_cc_class
+        self.make_cc = make_cc or _make_default
+
+    def make_sender_cc(self, trace, save_dir, log_config, **kwargs):
+        return self.make_cc(import_class(self.cc_class), trace, save_dir,
+                            log_config, **kwargs)
+
+    def make_receiver_cc(self, trace, save_dir, log_config, **kwargs):
+        if self.receiver_cc_class is None:
+            from simulator_new.cc import NoCC
+            return NoCC()
+        return self.make_cc(import_class(self.receiver_cc_class), trace,
+                            save_dir, log_config, **kwargs)
+
+    def make_sender_rtx_mngr(self):
+        if self.rtx_mngr_class is None:
+            return None
+        return import_class(self.rtx_mngr_class)()
+
+    def get_host_class(self):
+        return import_class(self.host_class)
+
+
+class AppSpec:
+    """How Simulator sets up an application.
+
+    Args
+        sender_class: class of the sender app.
+        receiver_class: class of the receiver app.
+        make_sender: make_sender(sender_class, save_dir, log_config,
+            **kwargs) returns the sender app given the Simulator arguments.
+            Calls sender_class() if None.
+        make_receiver: same as make_sender for the receiver app.
+    """
+
+    def __init__(self, sender_class, receiver_class, make_sender=None,
+                 make_receiver=None) -> None:
+        self.sender_class = sender_class
+        self.receiver_class = receiver_class
+        self.make_sender = make_sender or _make_default_app
+        self.make_receiver = make_receiver or _make_default_app
+
+    def make_sender_app(self, save_dir, log_config, **kwargs):
+        return self.make_sender(import_class(self.sender_class), save_dir,
+                                log_config, **kwargs)
+
+    def make_receiver_app(self, save_dir, log_config, **kwargs):
+        return self.make_receiver(import_class(self.receiver_class), save_dir,
+                                  log_config, **kwargs)
+
+
+CC_SPECS = {}
+APP_SPECS = {}
+
+
+def register_cc(name, cc_class, host_class, rtx_mngr_class=None,
+                receiver_cc_class=None, make_cc=None):
+    """Register a congestion control under name, see CCSpec. An existing
+    registration of name is replaced."""
+    CC_SPECS[name] = CCSpec(cc_class, host_class, rtx_mngr_class,
+                            receiver_cc_class, make_cc)
+
+
+def register_app(name, sender_class, receiver_class, make_sender=None,
+                 make_receiver=None):
+    """Register an application under name, see AppSpec. An existing
+    registration of name is replaced."""
+    APP_SPECS[name] = AppSpec(sender_class, receiver_class, make_sender,
+                              make_receiver)
+
+
+def get_cc_spec(cc: str) -> CCSpec:
+    if cc not in CC_SPECS:
+        raise NotImplementedError("Unknown congestion control {}, registered: "
+                                  "{}.".format(cc, ', '.join(CC_SPECS)))
+    return CC_SPECS[cc]
+
+
+def get_app_spec(app: str) -> AppSpec:
+    if app not in APP_SPECS:
+        raise NotImplementedError("Unknown application {}, registered: "
+                                  "{}.".format(app, ', '.join(APP_SPECS)))
+    return APP_SPECS[app]
+
+
+def get_cc_class(cc: str):
+    return import_class(get_cc_spec(cc).cc_class)
+
+
+def get_app_classes(app: str):
+    """Return the sender and receiver classes of an application."""
+    spec = get_app_spec(app)
+    return import_class(spec.sender_class), import_class(spec.receiver_class)
+
+
+register_cc('aurora', 'simulator_new.cc.pcc.aurora.aurora.Aurora',
+            'simulator_new.aurora_host.AuroraHost',
+            'simulator_new.rtx_manager.AuroraRtxManager', make_cc=make_aurora)
+register_cc('bbr', 'simulator_new.cc.bbr.bbr_v1.BBRv1',
+            'simulator_new.tcp_host.TCPHost',
+            'simulator_new.rtx_manager.TCPRtxManager', make_cc=make_bbr)
+register_cc('gcc', 'simulator_new.cc.gcc.gcc.GCC',
+            'simulator_new.rtp_host.RTPHost',
+            'simulator_new.rtx_manager.WebRtcRtxManager',
+            receiver_cc_class='simulator_new.cc.gcc.gcc.GCC', make_cc=make_gcc)
+register_cc('oracle', 'simulator_new.cc.cc.OracleCC',
+            'simulator_new.aurora_host.AuroraHost',
+            'simulator_new.rtx_manager.AuroraRtxManager', make_cc=make_oracle)
+register_cc('oracle_no_predict', 'simulator_new.cc.cc.OracleNoPredictCC',
+            'simulator_new.aurora_host.AuroraHost',
+            'simulator_new.rtx_manager.AuroraRtxManager', make_cc=make_oracle)
+register_cc('nocc', 'simulator_new.cc.cc.NoCC', 'simulator_new.host.Host')
+
+register_app('file_transfer', 'simulator_new.app.file_transfer.FileSender',
+             'simulator_new.app.file_transfer.FileReceiver')
+register_app(
+    'video_streaming',
+    'simulator_new.app.video_conferencing.video_conferencing.VideoSender',
+    'simulator_new.app.video_conferencing.video_conferencing.VideoReceiver',
+    make_sender=make_video_sender, make_receiver=make_video_receiver)
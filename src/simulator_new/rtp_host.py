@@ -49,8 +49,10 @@ class NackModule:
 
 
 class RTPHost(Host):
-    def __init__(self, id, tx_link, rx_link, cc, rtx_mngr, app, save_dir=None) -> None:
-        super().__init__(id, tx_link, rx_link, cc, rtx_mngr, app, save_dir)
+    def __init__(self, id, tx_link, rx_link, cc, rtx_mngr, app, save_dir=None,
+                 log_config=None) -> None:
+        super().__init__(id, tx_link, rx_link, cc, rtx_mngr, app, save_dir,
+                         log_config)
         self.rtcp_pkt_cnt = 0
         self.pkt_cls = RTPPacket
         self.ts_last_rtcp_report_ms = 0
@@ -70,7 +72,6 @@ class RTPHost(Host):
         self.nack_module.cleanup_to(max_pkt_id)
 
     def _on_pkt_rcvd(self, pkt):
-        # print(f'rtp_host {self.id} rcvd', self.ts_ms, pkt.pkt_id, pkt.app_data)
         self.cc.on_pkt_rcvd(self.ts_ms, pkt)
         if self.rtx_mngr:
             self.rtx_mngr.on_pkt_rcvd(self.ts_ms, pkt)
@@ -86,8 +87,8 @@ class RTPHost(Host):
             self.send_nack(pkt_ids)
             if self.recorder:
                 self.recorder.on_pkt_rcvd(self.ts_ms, pkt)
-            if pkt.app_data.get('probe', 0):
-                probe_cluster_id = pkt.app_data.get('probe_cluster_id', -1)
+            if pkt.probe_cluster_id != -1:
+                probe_cluster_id = pkt.probe_cluster_id
                 # if self.probe_info['probe_cluster_id'] != probe_cluster_id:
                 if probe_cluster_id not in self.probe_info:
                     self.probe_info[probe_cluster_id] = {"num_probe_pkts": 0,
@@ -123,7 +124,7 @@ class RTPHost(Host):
         #     filtered_pkt_ids = [pkt_id for pkt_id in pkt_ids if pkt_id > self.pkt_id_last_nack_sent]
 
         for pkt_id in filtered_pkt_ids:
-            nack = RTPPacket(pkt_id, RTPPacket.NACK_PKT, 1, app_data={})
+            nack = self._new_ctrl_pkt(pkt_id, RTPPacket.NACK_PKT, 1)
             nack.ts_sent_ms = self.ts_ms
             if nack.ts_first_sent_ms == 0:
                 nack.ts_first_sent_ms = self.ts_ms
@@ -152,7 +153,7 @@ class RTPHost(Host):
         else:
             loss_fraction = lost_pkt_cnt_interval / expected_pkt_cnt_interval
 
-        rtcp_report_pkt = RTPPacket(self.rtcp_pkt_cnt, RTPPacket.ACK_PKT, 1, app_data={})
+        rtcp_report_pkt = self._new_ctrl_pkt(self.rtcp_pkt_cnt, RTPPacket.ACK_PKT, 1)
         rtcp_report_pkt.estimated_rate_Bps = estimated_rate_Bps
         rtcp_report_pkt.loss_fraction = loss_fraction
         self.rtcp_pkt_cnt += 1
@@ -190,6 +191,13 @@ class RTPHost(Host):
         self.pkt_id_last_nack_sent = -1
         super().reset()
 
+    def next_event_ts_ms(self, ts_ms):
+        next_ts_ms = super().next_event_ts_ms(ts_ms)
+        if self.id == 1:
+            next_ts_ms = min(next_ts_ms, max(
+                ts_ms + 1, self.ts_last_rtcp_report_ms + RTCP_INTERVAL_MS))
+        return next_ts_ms
+
     def tick(self, ts_ms) -> None:
         super().tick(ts_ms)
         if self.id == 1 and ts_ms - self.ts_last_rtcp_report_ms >= RTCP_INTERVAL_MS:
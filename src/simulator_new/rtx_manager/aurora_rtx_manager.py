@@ -1,6 +1,9 @@
-import copy
+import heapq
+from collections import deque
 
-from simulator_new.rtx_manager import RtxManager
+from simulator_new.packet import PacketRecord
+from simulator_new.rtx_manager.rtx_manager import RtxManager
+from simulator_new.rtx_manager.rtx_queue import RtxQueue
 
 class AuroraRtxManager(RtxManager):
 
@@ -11,8 +14,14 @@ class AuroraRtxManager(RtxManager):
     def __init__(self) -> None:
         super().__init__()
 
+        # pkt ids are inserted in increasing order, so the dict is sorted
         self.unacked_buf = {}
-        self.rtx_queue = set()
+        self.rtx_queue = RtxQueue()
+        # ids of packets sent once and not declared lost yet, in increasing
+        # order, and heap of (rto deadline, pkt id) of retransmitted packets.
+        # Entries of acked packets are skipped lazily.
+        self.first_sent_pkt_ids = deque()
+        self.rto_heap = []
 
         self.srtt_ms = 0
         self.rttvar_ms = 0
@@ -21,15 +30,20 @@ class AuroraRtxManager(RtxManager):
         self.num_pkt_lost = 0
 
     def on_pkt_sent(self, pkt):
-        if pkt.app_data.get('padding', 0):
+        if pkt.is_padding():
             return
-        if pkt.pkt_id not in self.unacked_buf:
-            self.unacked_buf[pkt.pkt_id] = {
+        pkt_info = self.unacked_buf.get(pkt.pkt_id)
+        if pkt_info is None:
+            pkt_info = self.unacked_buf[pkt.pkt_id] = {
                 "pkt": None,
                 "num_rtx": 0,
                 "rto_ms": self.rto_ms,
             }
-        self.unacked_buf[pkt.pkt_id]['pkt'] = copy.deepcopy(pkt)
+            self.first_sent_pkt_ids.append(pkt.pkt_id)
+        else:
+            heapq.heappush(self.rto_heap,
+                           (pkt.ts_sent_ms + pkt_info['rto_ms'], pkt.pkt_id))
+        pkt_info['pkt'] = PacketRecord(pkt)
 
     def on_pkt_rcvd(self, ts_ms, pkt):
         if not pkt.is_ack_pkt():
@@ -44,36 +58,28 @@ class AuroraRtxManager(RtxManager):
         if pkt.pkt_id in self.rtx_queue:
             self.rtx_queue.remove(pkt.pkt_id)
 
-        for pkt_id in sorted(self.rtx_queue.copy()):
+        while self.rtx_queue:
+            pkt_id = self.rtx_queue.peek()
             data_pkt = self.get_buffered_pkt(pkt_id)
             if data_pkt is None:
                 self.rtx_queue.remove(pkt_id)
                 continue
             # remove pkt whose frame is already decoded
-            if 'frame_id' in pkt.app_data:
-                if data_pkt.app_data['frame_id'] < pkt.app_data['frame_id']:
-                    self.rtx_queue.remove(pkt_id)
-                    self.unacked_buf.pop(pkt_id, None)
-                else:
-                    break
-
-        if self.unacked_buf:
-            for pkt_id in range(min(self.unacked_buf), pkt.pkt_id):
-                if pkt_id not in self.unacked_buf:
-                    continue
-                pkt_info = self.unacked_buf[pkt_id]
-                unacked_pkt = pkt_info['pkt']
-
-                if (pkt_info['num_rtx'] == 0 or
-                    ts_ms - unacked_pkt.ts_sent_ms > pkt_info["rto_ms"]) and \
-                    pkt_id not in self.rtx_queue:
-                    self.num_pkt_lost += 1
-                    pkt_info['num_rtx'] += 1
-                    # print(ts_ms, "rtx_manager lost:", pkt_id, ", num lost:",
-                    #       self.num_pkt_lost, pkt_info['pkt'].ts_first_sent_ms,
-                    #       pkt_info['pkt'].ts_sent_ms, self.rto_ms, self.rtx_queue)
-                    self.on_pkt_lost(ts_ms, unacked_pkt)
-                    self.rtx_queue.add(pkt_id)
+            if pkt.frame_id is not None and data_pkt.frame_id < pkt.frame_id:
+                self.rtx_queue.remove(pkt_id)
+                self.unacked_buf.pop(pkt_id, None)
+            else:
+                break
+
+        for pkt_id in self._detect_lost_pkt_ids(ts_ms, pkt.pkt_id):
+            pkt_info = self.unacked_buf[pkt_id]
+            self.num_pkt_lost += 1
+            pkt_info['num_rtx'] += 1
+            # print(ts_ms, "rtx_manager lost:", pkt_id, ", num lost:",
+            #       self.num_pkt_lost, pkt_info['pkt'].ts_first_sent_ms,
+            #       pkt_info['pkt'].ts_sent_ms, self.rto_ms, self.rtx_queue)
+            self.on_pkt_lost(ts_ms, pkt_info['pkt'])
+            self.rtx_queue.add(pkt_id)
 
         if self.srtt_ms == 0 and self.rttvar_ms == 0:
             self.srtt_ms = pkt.rtt_ms()
@@ -87,6 +93,40 @@ class AuroraRtxManager(RtxManager):
             raise ValueError("srtt and rttvar should be both 0 or both non-zeros.")
         self.rto_ms = max(1000, min(self.srtt_ms + self.RTO_K * self.rttvar_ms, 60000))
 
+    def _detect_lost_pkt_ids(self, ts_ms, acked_pkt_id):
+        """Return the ids, in increasing order, of the unacked packets
+        before acked_pkt_id which are lost: packets sent once, and
+        retransmitted packets past their rto which are not queued for
+        retransmission.
+
+        Only packets before acked_pkt_id and rto entries past their deadline
+        are visited, instead of all unacked packets on every ack.
+        """
+        lost_pkt_ids = []
+        first_sent_pkt_ids = self.first_sent_pkt_ids
+        while first_sent_pkt_ids and first_sent_pkt_ids[0] < acked_pkt_id:
+            pkt_id = first_sent_pkt_ids.popleft()
+            if pkt_id in self.unacked_buf:
+                lost_pkt_ids.append(pkt_id)
+
+        rto_heap = self.rto_heap
+        not_lost = []
+        while rto_heap and rto_heap[0][0] <= ts_ms:
+            deadline_ms, pkt_id = heapq.heappop(rto_heap)
+            pkt_info = self.unacked_buf.get(pkt_id)
+            if pkt_info is None or pkt_id in self.rtx_queue or \
+                pkt_info['pkt'].ts_sent_ms + pkt_info['rto_ms'] != deadline_ms:
+                continue  # acked, already lost or sent again since
+            if pkt_id < acked_pkt_id and \
+                ts_ms - pkt_info['pkt'].ts_sent_ms > pkt_info['rto_ms']:
+                lost_pkt_ids.append(pkt_id)
+            else:
+                not_lost.append((deadline_ms, pkt_id))
+        for entry in not_lost:
+            heapq.heappush(rto_heap, entry)
+        lost_pkt_ids.sort()
+        return lost_pkt_ids
+
     def on_pkt_lost(self, ts_ms, pkt):
         if self.host:
             self.host.cc.on_pkt_lost(ts_ms, pkt)
@@ -94,28 +134,22 @@ class AuroraRtxManager(RtxManager):
                 self.host.recorder.on_pkt_lost(ts_ms, pkt)
 
     def peek_pkt(self):
-        ret_size = 0
-        if not self.rtx_queue:
-            return ret_size
-        pkts_to_rm = []
-        for pkt_id in sorted(self.rtx_queue):
-            if pkt_id not in self.unacked_buf:
-                pkts_to_rm.append(pkt_id)
-            else:
-                ret_size = self.unacked_buf[pkt_id]['pkt'].size_bytes
-                break
-        for pkt_id in pkts_to_rm:
+        while self.rtx_queue:
+            pkt_id = self.rtx_queue.peek()
+            if pkt_id in self.unacked_buf:
+                return self.unacked_buf[pkt_id]['pkt'].size_bytes
             self.rtx_queue.remove(pkt_id)
-        return ret_size
+        return 0
 
     def get_pkt(self):
         if self.rtx_queue:
-            pkt_id = min(self.rtx_queue)
-            self.rtx_queue.remove(pkt_id)
-            return self.get_buffered_pkt(pkt_id)
+            pkt_id = self.rtx_queue.pop()
+            pkt = self.get_buffered_pkt(pkt_id)
+            return pkt.to_pkt() if pkt else None
         return None
 
     def get_buffered_pkt(self, pkt_id):
+        """Return the PacketRecord of an unacked packet."""
         pkt_info = self.unacked_buf.get(pkt_id, None)
         return pkt_info['pkt'] if pkt_info else None
 
@@ -125,7 +159,9 @@ class AuroraRtxManager(RtxManager):
     def reset(self):
         self.num_pkt_lost = 0
         self.unacked_buf = {}
-        self.rtx_queue = set()
+        self.rtx_queue.clear()
+        self.first_sent_pkt_ids.clear()
+        self.rto_heap = []
         self.srtt_ms = 0
         self.rttvar_ms = 0
         self.rto_ms = 3000
@@ -146,7 +182,7 @@ class AuroraLossDetectOnlyRtxManager(RtxManager):
             return
 
         for i in range(self.max_acked_id + 1, pkt.pkt_id):
-            lost_pkt = copy.deepcopy(pkt)
+            lost_pkt = PacketRecord(pkt)
             lost_pkt.pkt_id = i
             lost_pkt.size_bytes = 1500
             # self.num_pkt_lost += 1
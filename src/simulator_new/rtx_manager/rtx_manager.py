@@ -1,3 +1,5 @@
+import math
+
 from simulator_new.clock import ClockObserver
 
 class RtxManager(ClockObserver):
@@ -27,6 +29,9 @@ class RtxManager(ClockObserver):
     def tick(self, ts_ms):
         pass
 
+    def next_event_ts_ms(self, ts_ms):
+        return math.inf
+
     def reset(self):
         pass
 
@@ -0,0 +1,51 @@
+import heapq
+
+
+class RtxQueue:
+    """Set of packet ids waiting for retransmission, ordered by id.
+
+    Removed ids stay in the heap and are skipped lazily, so add, remove and
+    the lookup of the smallest id are all O(log n) amortized.
+    """
+
+    def __init__(self) -> None:
+        self.pkt_ids = set()
+        self.heap = []
+
+    def add(self, pkt_id) -> None:
+        if pkt_id not in self.pkt_ids:
+            self.pkt_ids.add(pkt_id)
+            heapq.heappush(self.heap, pkt_id)
+
+    def remove(self, pkt_id) -> None:
+        self.pkt_ids.remove(pkt_id)
+
+    def discard(self, pkt_id) -> None:
+        self.pkt_ids.discard(pkt_id)
+
+    def peek(self):
+        """Return the smallest packet id without removing it."""
+        heap = self.heap
+        while heap[0] not in self.pkt_ids:
+            heapq.heappop(heap)
+        return heap[0]
+
+    def pop(self):
+        """Remove and return the smallest packet id."""
+        pkt_id = self.peek()
+        heapq.heappop(self.heap)
+        self.pkt_ids.remove(pkt_id)
+        return pkt_id
+
+    def __contains__(self, pkt_id):
+        return pkt_id in self.pkt_ids
+
+    def __iter__(self):
+        return iter(self.pkt_ids)
+
+    def __len__(self):
+        return len(self.pkt_ids)
+
+    def clear(self) -> None:
+        self.pkt_ids.clear()
+        self.heap.clear()
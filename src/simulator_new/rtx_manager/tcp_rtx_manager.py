@@ -1,5 +1,4 @@
-import copy
-
+from simulator_new.packet import PacketRecord
 from simulator_new.rtx_manager import RtxManager
 
 class TCPRtxManager(RtxManager):
@@ -14,7 +13,7 @@ class TCPRtxManager(RtxManager):
 
     def on_pkt_sent(self, pkt):
         if pkt.pkt_id not in self.unacked_buf:
-            self.unacked_buf[pkt.pkt_id] = copy.deepcopy(pkt)
+            self.unacked_buf[pkt.pkt_id] = PacketRecord(pkt)
 
     def on_pkt_acked(self, ts_ms, pkt):
         if pkt.pkt_id in self.unacked_buf:
@@ -43,7 +42,7 @@ class TCPRtxManager(RtxManager):
     def get_pkt(self):
         if self.rtx_buf:
             pkt_id = min(self.rtx_buf)
-            pkt = self.unacked_buf[pkt_id]
+            pkt = self.unacked_buf[pkt_id].to_pkt()
             self.rtx_buf.remove(pkt_id)
             return pkt
         return None
@@ -1,26 +1,29 @@
-import copy
+import math
 
-from simulator_new.rtx_manager import RtxManager
+from simulator_new.packet import PacketRecord
+from simulator_new.rtx_manager.rtx_manager import RtxManager
+from simulator_new.rtx_manager.rtx_queue import RtxQueue
 
 class WebRtcRtxManager(RtxManager):
 
     def __init__(self) -> None:
         super().__init__()
+        # pkt ids are inserted in increasing order, so the dict is sorted
         self.pkt_buf = dict()
-        self.rtx_queue = set()
+        self.rtx_queue = RtxQueue()
 
     def register_host(self, host):
         self.host = host
 
     def on_pkt_sent(self, pkt):
-        if pkt.app_data.get('padding', 0):
+        if pkt.is_padding():
             return
         if pkt.pkt_id not in self.pkt_buf:
             self.pkt_buf[pkt.pkt_id] = {
                 "pkt": None,
                 "num_rtx": 0
             }
-        self.pkt_buf[pkt.pkt_id]['pkt'] = copy.deepcopy(pkt)
+        self.pkt_buf[pkt.pkt_id]['pkt'] = PacketRecord(pkt)
 
     def on_pkt_rcvd(self, ts_ms, pkt):
         if not pkt.is_nack_pkt():
@@ -31,40 +34,41 @@ class WebRtcRtxManager(RtxManager):
             self.rtx_queue.add(pkt.pkt_id)
 
     def peek_pkt(self):
-        ret_size = 0
-        if not self.rtx_queue:
-            return ret_size
-        pkts_to_rm = []
-        for pkt_id in sorted(self.rtx_queue):
-            if pkt_id not in self.pkt_buf:
-                pkts_to_rm.append(pkt_id)
-            else:
-                ret_size = self.pkt_buf[pkt_id]['pkt'].size_bytes
-                break
-        for pkt_id in pkts_to_rm:
+        while self.rtx_queue:
+            pkt_id = self.rtx_queue.peek()
+            if pkt_id in self.pkt_buf:
+                return self.pkt_buf[pkt_id]['pkt'].size_bytes
             self.rtx_queue.remove(pkt_id)
-        return ret_size
+        return 0
 
     def get_pkt(self):
         if self.rtx_queue:
-            pkt_id = min(self.rtx_queue)
-            self.rtx_queue.remove(pkt_id)
-            return self.get_buffered_pkt(pkt_id)
+            pkt_id = self.rtx_queue.pop()
+            pkt = self.get_buffered_pkt(pkt_id)
+            return pkt.to_pkt() if pkt else None
         return None
 
     def get_buffered_pkt(self, pkt_id):
+        """Return the PacketRecord of a sent packet."""
         pkt_info = self.pkt_buf.get(pkt_id, None)
         return pkt_info['pkt'] if pkt_info else None
 
     def tick(self, ts_ms):
         # clean the pkt buffer
-        for pkt_id in sorted(self.pkt_buf.copy()):
-        #     # TODO: 20000 or 1000
+        while self.pkt_buf:
+            pkt_id = next(iter(self.pkt_buf))
+            # TODO: 20000 or 1000
             if ts_ms - self.pkt_buf[pkt_id]['pkt'].ts_first_sent_ms > 20000:
                 del self.pkt_buf[pkt_id]
             else:
                 break
 
+    def next_event_ts_ms(self, ts_ms):
+        if not self.pkt_buf:
+            return math.inf
+        oldest_pkt = self.pkt_buf[next(iter(self.pkt_buf))]['pkt']
+        return max(ts_ms + 1, oldest_pkt.ts_first_sent_ms + 20001)
+
     def reset(self):
         self.pkt_buf = dict()
-        self.rtx_queue = set()
+        self.rtx_queue.clear()
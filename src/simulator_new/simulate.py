@@ -2,6 +2,8 @@ import argparse
 import time
 
 from simulator_new.net_simulator import Simulator
+from simulator_new.registry import APP_SPECS, CC_SPECS
+from simulator_new.streaming_trace import StreamingTrace
 from simulator_new.trace import Trace, generate_trace
 
 
@@ -12,7 +14,7 @@ def parse_args():
         '--trace',
         type=str,
         default="",
-        help="A network trace file.",
+        help="A network trace file, json or a streaming trace (.bin).",
     )
     parser.add_argument(
         "--lookup-table",
@@ -30,14 +32,14 @@ def parse_args():
         "--cc",
         type=str,
         default="gcc",
-        choices=("aurora", "bbr", "gcc", 'oracle', 'oracle_no_predict'),
+        choices=tuple(CC_SPECS),
         help="Congestion control.",
     )
     parser.add_argument(
         '--app',
         type=str,
         default="video_streaming",
-        choices=("file_transfer", "video_streaming"),
+        choices=tuple(APP_SPECS),
         help="Appliaction",
     )
     parser.add_argument(
@@ -57,7 +59,9 @@ def parse_args():
 def main():
     args = parse_args()
 
-    if args.trace:
+    if args.trace.endswith('.bin'):
+        trace = StreamingTrace(args.trace)
+    elif args.trace:
         trace = Trace.load_from_file(args.trace)
     else:
         trace = generate_trace(duration_range=(30, 30),
@@ -1,27 +1,37 @@
-import csv
 import os
 from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 
+from simulator_new.log_config import LogConfig
 from simulator_new.packet import Packet, RTPPacket
+from simulator_new.pkt_log import PKT_LOG_HEADER, PacketLogWriter, read_pkt_log_rows
 
 class StatsRecorder:
-    def __init__(self, log_dir, data_link, ack_link) -> None:
+    """Packet statistics and packet log.
+
+    log_format is 'csv' for pkt_log.csv, or 'bin' for a binary pkt_log.bin
+    (see simulator_new.pkt_log). Rows are written through log_config, the
+    'pkt' stream of the simulation.
+    """
+    def __init__(self, log_dir, data_link, ack_link, log_format='csv',
+                 log_config: Optional[LogConfig] = None) -> None:
+        if log_format not in ('csv', 'bin'):
+            raise ValueError("Unsupported log format {}.".format(log_format))
         self.log_dir = log_dir
-        if self.log_dir:
+        self.log_config = log_config or LogConfig()
+        if log_format == 'csv':
+            self.log_fname, self.log_writer = self.log_config.open_csv(
+                log_dir, 'pkt', "pkt_log.csv", PKT_LOG_HEADER)
+        elif self.log_dir and self.log_config.is_enabled('pkt'):
             os.makedirs(self.log_dir, exist_ok=True)
-            self.log_fname = os.path.join(log_dir, "pkt_log.csv")
-            self.log_fh = open(self.log_fname, 'w', 1)
-            self.csv_writer = csv.writer(self.log_fh, lineterminator="\n")
-            self.csv_writer.writerow(
-                ["timestamp_ms", "pkt_id", "pkt_type", "size_bytes",
-                 "one_way_delay_ms", "rtt_ms", 'queue_size_bytes',
-                 'budget_bytes', 'frame_id', 'is_rtx', 'padding'])
+            self.log_fname = os.path.join(log_dir, "pkt_log.bin")
+            pkt_log_writer = PacketLogWriter(self.log_fname)
+            self.log_config.writer.add_stream(pkt_log_writer)
+            self.log_writer = self.log_config.sampled('pkt', pkt_log_writer)
         else:
             self.log_fname = None
-            self.log_fh = None
-            self.csv_writer = None
+            self.log_writer = None
 
         self.data_link = data_link
         self.ack_link = ack_link
@@ -46,9 +56,14 @@ class StatsRecorder:
         self.first_pkt_rcvd_ts_ms = -1
         self.pkt_rcvd_ts_ms = -1
 
-    def __del__(self):
-        if self.log_fh:
-            self.log_fh.close()
+    def flush(self):
+        """Write buffered log rows to disk."""
+        if self.log_writer:
+            self.log_writer.flush()
+
+    def close(self):
+        if self.log_writer:
+            self.log_writer.close()
 
     def on_pkt_sent(self, ts_ms, pkt):
         """called by tx host"""
@@ -57,11 +72,11 @@ class StatsRecorder:
         if self.first_pkt_sent_ts_ms == -1:
             self.first_pkt_sent_ts_ms = ts_ms
         self.pkt_sent_ts_ms = ts_ms
-        frame_id = pkt.app_data.get('frame_id', None) if pkt.app_data else None
+        frame_id = pkt.frame_id
         is_rtx = int(pkt.ts_sent_ms != pkt.ts_first_sent_ms)
-        padding = pkt.app_data.get('padding', None) if pkt.app_data else None
-        if self.csv_writer:
-            self.csv_writer.writerow(
+        padding = pkt.frame.padding if pkt.frame else None
+        if self.log_writer:
+            self.log_writer.writerow(
                 [ts_ms, pkt.pkt_id, pkt.pkt_type, pkt.size_bytes, 0, 0,
                  self.data_link.queue_size_bytes, self.data_link.budget_bytes,
                  frame_id, is_rtx, padding])
@@ -73,8 +88,8 @@ class StatsRecorder:
         if self.first_pkt_acked_ts_ms == -1:
             self.first_pkt_acked_ts_ms = ts_ms
         self.pkt_acked_ts_ms = ts_ms
-        if self.csv_writer:
-            self.csv_writer.writerow(
+        if self.log_writer:
+            self.log_writer.writerow(
                 [ts_ms, pkt.pkt_id, pkt.pkt_type, pkt.acked_size_bytes,
                  pkt.delay_ms(), pkt.rtt_ms(), self.data_link.queue_size_bytes, self.data_link.budget_bytes])
 
@@ -82,8 +97,8 @@ class StatsRecorder:
         """called by tx host"""
         self.pkts_lost += 1
         self.bytes_lost += pkt.size_bytes
-        if self.csv_writer:
-            self.csv_writer.writerow(
+        if self.log_writer:
+            self.log_writer.writerow(
                 [ts_ms, pkt.pkt_id, 'lost', pkt.size_bytes])
 
     def on_pkt_rcvd(self, ts_ms, pkt):
@@ -93,17 +108,17 @@ class StatsRecorder:
         if self.first_pkt_rcvd_ts_ms == -1:
             self.first_pkt_rcvd_ts_ms = ts_ms
         self.pkt_rcvd_ts_ms = ts_ms
-        frame_id = pkt.app_data.get('frame_id', None) if pkt.app_data else None
+        frame_id = pkt.frame_id
         is_rtx = int(pkt.ts_sent_ms != pkt.ts_first_sent_ms)
-        padding = pkt.app_data.get('padding', None) if pkt.app_data else None
-        if self.csv_writer:
-            self.csv_writer.writerow(
+        padding = pkt.frame.padding if pkt.frame else None
+        if self.log_writer:
+            self.log_writer.writerow(
                 [ts_ms, pkt.pkt_id, 'arrived', pkt.size_bytes,
                  pkt.delay_ms(), pkt.delay_ms(), self.data_link.queue_size_bytes, self.data_link.budget_bytes, frame_id, is_rtx, padding])
 
     def on_pkt_nack(self, ts_ms, pkt):
-        if self.csv_writer:
-            self.csv_writer.writerow(
+        if self.log_writer:
+            self.log_writer.writerow(
                 [ts_ms, pkt.pkt_id, pkt.pkt_type, pkt.size_bytes,
                  pkt.delay_ms(), pkt.delay_ms(), self.data_link.queue_size_bytes, self.data_link.budget_bytes])
 
@@ -128,11 +143,22 @@ class StatsRecorder:
         self.first_pkt_rcvd_ts_ms = -1
         self.pkt_rcvd_ts_ms = -1
 
+    def summary_stats(self):
+        """Return the summary stats, which are kept at every log level."""
+        tx_dur_ms = self.pkt_sent_ts_ms - self.first_pkt_sent_ts_ms
+        rx_dur_ms = self.pkt_rcvd_ts_ms - self.first_pkt_rcvd_ts_ms
+        return {
+            'pkts_sent': self.pkts_sent, 'bytes_sent': self.bytes_sent,
+            'pkts_acked': self.pkts_acked, 'bytes_acked': self.bytes_acked,
+            'pkts_lost': self.pkts_lost, 'bytes_lost': self.bytes_lost,
+            'pkts_rcvd': self.pkts_rcvd, 'bytes_rcvd': self.bytes_rcvd,
+            'tx_rate_Bps': self.bytes_sent * 1000 / tx_dur_ms if tx_dur_ms > 0 else 0,
+            'rx_rate_Bps': self.bytes_rcvd * 1000 / rx_dur_ms if rx_dur_ms > 0 else 0}
+
     def summary(self):
-        tx_rate_Bps = self.bytes_sent * 1000 / \
-                (self.pkt_sent_ts_ms - self.first_pkt_sent_ts_ms)
-        rx_rate_Bps = self.bytes_rcvd * 1000 / \
-                (self.pkt_rcvd_ts_ms - self.first_pkt_rcvd_ts_ms)
+        stats = self.summary_stats()
+        tx_rate_Bps = stats['tx_rate_Bps']
+        rx_rate_Bps = stats['rx_rate_Bps']
         print(f"sending rate: {tx_rate_Bps:.2f}Bps, {tx_rate_Bps * 8 / 1e6:.2f}Mbps")
         print(f"recving rate: {rx_rate_Bps:.2f}Bps, {rx_rate_Bps * 8 / 1e6:.2f}Mbps")
 
@@ -180,48 +206,46 @@ class PacketLog():
         binwise_bytes_arrived = {}
         binwise_bytes_acked = {}
         binwise_bytes_lost = {}
-        with open(packet_log_file, 'r') as f:
-            reader = csv.reader(f)
-            for line in reader:
-                if line[0] == 'timestamp_ms':
-                    continue
-                ts_ms = int(line[0])
-                pkt_id = int(line[1])
-                pkt_type = line[2]
-                pkt_byte = int(line[3])
-                if first_ts_ms is None:
-                    first_ts_ms = ts_ms
-                # if ts - first_ts < 2:
-                #     continue
-                if pkt_type == Packet.ACK_PKT:
-                    rtt_ms = int(line[5])
-                    pkt_acked_ts_ms.append(ts_ms)
-                    pkt_rtt_ms.append(rtt_ms)
-
-                    bin_id = cls.ts_to_bin_id(ts_ms, first_ts_ms, bin_size_ms)
-                    binwise_bytes_acked[bin_id] = binwise_bytes_acked.get(
-                        bin_id, 0) + pkt_byte
-                elif pkt_type == Packet.DATA_PKT or pkt_type == RTPPacket.DATA_PKT:
-                    pkt_sent_ts_ms.append(ts_ms)
-                    bin_id = cls.ts_to_bin_id(ts_ms, first_ts_ms, bin_size_ms)
-                    binwise_bytes_sent[bin_id] = binwise_bytes_sent.get(
-                        bin_id, 0) + pkt_byte
-                elif pkt_type == 'lost':
-                    bin_id = cls.ts_to_bin_id(ts_ms, first_ts_ms, bin_size_ms)
-                    binwise_bytes_lost[bin_id] = binwise_bytes_lost.get(
-                        bin_id, 0) + pkt_byte
-                elif pkt_type == 'arrived':
-                    owd = float(line[4])
-                    pkt_arrived_ts_ms.append(ts_ms)
-                    one_way_delays_ms.append(owd)
-                    bin_id = cls.ts_to_bin_id(ts_ms, first_ts_ms, bin_size_ms)
-                    binwise_bytes_arrived[bin_id] = binwise_bytes_arrived.get(
-                        bin_id, 0) + pkt_byte
-                elif pkt_type == RTPPacket.NACK_PKT:
-                    pass
-                else:
-                    raise RuntimeError(
-                        "Unrecognized pkt_type {}!".format(pkt_type))
+        for line in read_pkt_log_rows(packet_log_file):
+            if line[0] == 'timestamp_ms':
+                continue
+            ts_ms = int(line[0])
+            pkt_id = int(line[1])
+            pkt_type = line[2]
+            pkt_byte = int(line[3])
+            if first_ts_ms is None:
+                first_ts_ms = ts_ms
+            # if ts - first_ts < 2:
+            #     continue
+            if pkt_type == Packet.ACK_PKT:
+                rtt_ms = int(line[5])
+                pkt_acked_ts_ms.append(ts_ms)
+                pkt_rtt_ms.append(rtt_ms)
+
+                bin_id = cls.ts_to_bin_id(ts_ms, first_ts_ms, bin_size_ms)
+                binwise_bytes_acked[bin_id] = binwise_bytes_acked.get(
+                    bin_id, 0) + pkt_byte
+            elif pkt_type == Packet.DATA_PKT or pkt_type == RTPPacket.DATA_PKT:
+                pkt_sent_ts_ms.append(ts_ms)
+                bin_id = cls.ts_to_bin_id(ts_ms, first_ts_ms, bin_size_ms)
+                binwise_bytes_sent[bin_id] = binwise_bytes_sent.get(
+                    bin_id, 0) + pkt_byte
+            elif pkt_type == 'lost':
+                bin_id = cls.ts_to_bin_id(ts_ms, first_ts_ms, bin_size_ms)
+                binwise_bytes_lost[bin_id] = binwise_bytes_lost.get(
+                    bin_id, 0) + pkt_byte
+            elif pkt_type == 'arrived':
+                owd = float(line[4])
+                pkt_arrived_ts_ms.append(ts_ms)
+                one_way_delays_ms.append(owd)
+                bin_id = cls.ts_to_bin_id(ts_ms, first_ts_ms, bin_size_ms)
+                binwise_bytes_arrived[bin_id] = binwise_bytes_arrived.get(
+                    bin_id, 0) + pkt_byte
+            elif pkt_type == RTPPacket.NACK_PKT:
+                pass
+            else:
+                raise RuntimeError(
+                    "Unrecognized pkt_type {}!".format(pkt_type))
         return cls(pkt_sent_ts_ms, pkt_arrived_ts_ms, pkt_acked_ts_ms, pkt_rtt_ms,
                    one_way_delays_ms, first_ts_ms, binwise_bytes_sent,
                    binwise_bytes_arrived, binwise_bytes_acked,
@@ -0,0 +1,307 @@
+"""Traces read from a binary file in bounded windows.
+
+A streaming trace file holds float64 rows of (timestamp in second,
+bandwidth in Mbps, one-way delay in ms, bits sendable from the trace start
+to the timestamp), with the loss rate, queue size and summary stats of the
+trace in json in filename + '.meta'. StreamingTrace memory maps the file and only
+keeps a window of rows around the current time in memory, so a trace of
+any length can be simulated.
+
+    python -m simulator_new.streaming_trace --trace trace.json \
+        --save-path trace.bin
+"""
+import argparse
+import math
+from bisect import bisect_right
+from typing import List, Union
+
+import numpy as np
+
+from simulator_new.trace import Trace
+from simulator_new.utils import read_json_file, write_json_file
+
+NUM_COLUMNS = 4  # timestamp, bandwidth, delay, cumulative bits
+
+
+class StreamingTraceWriter:
+    """Write a streaming trace file chunk by chunk.
+
+    The chunks passed to write() are concatenated, so a long capture can be
+    converted without holding it in memory. Bandwidths are clamped to
+    0.1Mbps like in Trace.
+
+    Args
+        filename: path of the trace file.
+        loss_rate: uplink random packet loss rate.
+        queue_size: queue in packets.
+        delay_noise: maximum noise added to a packet in ms.
+        bw_change_interval: bandwidth change interval in second.
+    """
+
+    def __init__(self, filename: str, loss_rate: float, queue_size: int,
+                 delay_noise: float = 0, bw_change_interval: float = 0) -> None:
+        self.filename = filename
+        self.meta = {'loss': loss_rate, 'queue': queue_size,
+                     'delay_noise': delay_noise, 'T_s': bw_change_interval}
+        self.f = open(filename, 'wb')
+        self.num_rows = 0
+        self.dt = None
+        # last row written, needed for the cumulative bits of the next one
+        self.last_ts = None
+        self.last_bw = None
+        self.cum_bits = 0.0
+        self.min_bw = math.inf
+        self.max_bw = -math.inf
+        self.sum_bw = 0.0
+        self.min_delay = math.inf
+        self.sum_delay = 0.0
+        self.num_delays = 0
+        self.first_ts = None
+
+    def write(self, timestamps: Union[List[float], np.ndarray],
+              bandwidths: Union[List[float], np.ndarray],
+              delays: Union[List[float], np.ndarray]) -> None:
+        """Append rows. delays may hold a single value for all rows, as in
+        a Trace with a constant delay."""
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        bandwidths = np.maximum(np.asarray(bandwidths, dtype=np.float64), 0.1)
+        assert len(timestamps) == len(bandwidths)
+        if len(timestamps) == 0:
+            return
+        delays = np.asarray(delays, dtype=np.float64)
+        self.min_delay = min(self.min_delay, float(np.min(delays)))
+        self.sum_delay += float(np.sum(delays))
+        self.num_delays += len(delays)
+        if len(delays) != len(timestamps):
+            delays = np.full(len(timestamps), delays[-1])
+
+        if self.first_ts is None:
+            self.first_ts = float(timestamps[0])
+            self.dt = float(timestamps[1] - timestamps[0]) \
+                if len(timestamps) >= 2 else 0.1
+            prev_ts = timestamps[:0]
+            prev_bw = bandwidths[:0]
+        else:
+            prev_ts = np.array([self.last_ts])
+            prev_bw = np.array([self.last_bw])
+        # bits sent during each interval ending at a row of this chunk
+        all_ts = np.concatenate([prev_ts, timestamps])
+        all_bw = np.concatenate([prev_bw, bandwidths])
+        durations = np.diff(all_ts)
+        # keep the arithmetic of a uniform-dt trace exact, as in Trace
+        uniform = np.isclose(durations, self.dt)
+        durations[uniform] = self.dt
+        interval_bits = all_bw[:-1] * 1e6 * durations
+        cum_bits = np.empty(len(timestamps))
+        if self.num_rows == 0:
+            cum_bits[0] = 0.0
+            cum_bits[1:] = np.cumsum(interval_bits)
+        else:
+            interval_bits[0] += self.cum_bits
+            cum_bits[:] = np.cumsum(interval_bits)
+
+        rows = np.stack([timestamps, bandwidths, delays, cum_bits], axis=1)
+        self.f.write(rows.tobytes())
+        self.num_rows += len(timestamps)
+        self.last_ts = float(timestamps[-1])
+        self.last_bw = float(bandwidths[-1])
+        self.cum_bits = float(cum_bits[-1])
+        self.min_bw = min(self.min_bw, float(np.min(bandwidths)))
+        self.max_bw = max(self.max_bw, float(np.max(bandwidths)))
+        self.sum_bw += float(np.sum(bandwidths))
+
+    def close(self) -> None:
+        self.f.close()
+        meta = dict(self.meta)
+        meta.update({
+            'num_rows': self.num_rows, 'dt': self.dt,
+            'duration': self.last_ts - self.first_ts if self.num_rows else 0,
+            'min_bw': self.min_bw, 'max_bw': self.max_bw,
+            'avg_bw': self.sum_bw / max(self.num_rows, 1),
+            'min_delay': self.min_delay,
+            'avg_delay': self.sum_delay / max(self.num_delays, 1)})
+        write_json_file(self.filename + '.meta', meta)
+
+
+def save_streaming_trace(trace: Trace, filename: str,
+                         chunk_len: int = 65536) -> None:
+    """Save a Trace to a streaming trace file."""
+    writer = StreamingTraceWriter(filename, trace.loss_rate, trace.queue_size,
+                                  trace.delay_noise, trace.bw_change_interval)
+    delays = trace.delays
+    for start in range(0, len(trace.timestamps), chunk_len):
+        end = start + chunk_len
+        # a constant delay is given once for the whole trace
+        chunk_delays = delays[start:end] if len(delays) > 1 else delays
+        writer.write(trace.timestamps[start:end], trace.bandwidths[start:end],
+                     chunk_delays)
+    writer.close()
+
+
+class StreamingTrace(Trace):
+    """Trace backed by a streaming trace file.
+
+    Lookups only touch a window of window_len rows around the queried
+    timestamp, which moves along with the simulation. timestamps,
+    bandwidths and delays are read-only memory mapped columns, and the
+    summary stats (avg_bw, min_delay, ...) come from the metadata.
+    """
+
+    SHARED_SERIES = Trace.SHARED_SERIES + (
+        'data', 'meta', 'win_ts', 'win_bw', 'win_delay', 'win_cum_bits')
+
+    def __init__(self, filename: str, window_len: int = 8192) -> None:
+        meta = read_json_file(filename + '.meta')
+        self.filename = filename
+        self.window_len = window_len
+        self.meta = meta
+        self._open()
+        self.dt = meta['dt']
+        self.loss_rate = meta['loss']
+        self.queue_size = meta['queue']
+        self.delay_noise = meta['delay_noise']
+        self.bw_change_interval = meta['T_s']
+        self.noise = 0
+        self.noise_change_ts = 0
+        self.idx = 0
+
+        self.noise_timestamps = []
+        self.noises = []
+        self.noise_idx = 0
+        self.return_noise = False
+
+        self.win_start = 0
+        self.win_ts = []
+        self.win_bw = []
+        self.win_delay = []
+        self.win_cum_bits = []
+        self.win_end_ts = -math.inf
+        self._load_window(0)
+
+    def _open(self) -> None:
+        self.data = np.memmap(self.filename, dtype=np.float64, mode='r',
+                              shape=(self.meta['num_rows'], NUM_COLUMNS))
+        self.timestamps = self.data[:, 0]
+        self.bandwidths = self.data[:, 1]
+        self.delays = self.data[:, 2]
+        self.cum_bits = self.data[:, 3]
+
+    def __getstate__(self):
+        # a pickled trace maps the file again instead of holding its rows
+        state = self.__dict__.copy()
+        for name in ('data', 'timestamps', 'bandwidths', 'delays', 'cum_bits'):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open()
+
+    @property
+    def min_bw(self) -> float:
+        return self.meta['min_bw']
+
+    @property
+    def max_bw(self) -> float:
+        return self.meta['max_bw']
+
+    @property
+    def avg_bw(self) -> float:
+        return self.meta['avg_bw']
+
+    @property
+    def duration(self) -> float:
+        return self.meta['duration']
+
+    @property
+    def min_delay(self) -> float:
+        return self.meta['min_delay']
+
+    @property
+    def avg_delay(self) -> float:
+        return self.meta['avg_delay']
+
+    def _load_window(self, idx: int) -> None:
+        start = min(max(idx, 0), max(len(self.data) - 1, 0))
+        rows = np.array(self.data[start:start + self.window_len])
+        self.win_start = start
+        self.win_ts = rows[:, 0].tolist()
+        self.win_bw = rows[:, 1].tolist()
+        self.win_delay = rows[:, 2].tolist()
+        self.win_cum_bits = rows[:, 3]
+        end = start + len(rows)
+        self.win_end_ts = float(self.data[end, 0]) if end < len(self.data) \
+            else math.inf
+
+    def _find_row(self, ts: float) -> int:
+        """Return the window index of the last row at or before ts, moving
+        the window if ts is out of it."""
+        if not self.win_ts[0] <= ts < self.win_end_ts:
+            # binary search on the memory map, which only reads log(n) rows
+            self._load_window(bisect_right(self.timestamps, ts) - 1)
+        return max(bisect_right(self.win_ts, ts) - 1, 0)
+
+    def get_avail_bits2send(self, lo_ts: float, up_ts: float) -> float:
+        assert lo_ts <= up_ts
+        lo_idx = self._find_row(lo_ts)
+        lo_cum_bits = self.win_cum_bits[lo_idx]
+        lo_bits = self.win_bw[lo_idx] * 1e6 * (lo_ts - self.win_ts[lo_idx])
+        up_idx = self._find_row(up_ts)
+        avail_bits = float(self.win_cum_bits[up_idx] - lo_cum_bits)
+        avail_bits -= lo_bits
+        avail_bits += self.win_bw[up_idx] * 1e6 * (up_ts - self.win_ts[up_idx])
+        assert avail_bits >= 0
+        return avail_bits
+
+    def get_bandwidth(self, ts: float):
+        """Return bandwidth(Mbps) at ts(second)."""
+        idx = self._find_row(ts)
+        self.idx = self.win_start + idx
+        return self.win_bw[idx]
+
+    def get_delay(self, ts: float):
+        """Return link one-way delay(millisecond) at ts(second)."""
+        idx = self._find_row(ts)
+        self.idx = self.win_start + idx
+        return self.win_delay[idx]
+
+    def __str__(self):
+        return ("Streaming trace {}: {} rows, {:.1f}s,\nLink loss: {:.3f}, "
+                "Queue: {}packets".format(
+                    self.filename, len(self.data), self.duration,
+                    self.loss_rate, self.queue_size))
+
+    def dump(self, filename: str):
+        """Save the whole trace into a json file."""
+        data = {'timestamps': np.asarray(self.timestamps).tolist(),
+                'bandwidths': np.asarray(self.bandwidths).tolist(),
+                'delays': np.asarray(self.delays).tolist(),
+                'loss': self.loss_rate,
+                'queue': self.queue_size,
+                'delay_noise': self.delay_noise,
+                'T_s': self.bw_change_interval}
+        write_json_file(filename, data)
+
+    @staticmethod
+    def load_from_file(filename: str, window_len: int = 8192):
+        return StreamingTrace(filename, window_len)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("Convert a trace to a streaming trace.")
+    parser.add_argument('--trace', type=str, required=True,
+                        help="A json trace file.")
+    parser.add_argument('--save-path', type=str, required=True,
+                        help="Output streaming trace file, e.g. trace.bin.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    trace = Trace.load_from_file(args.trace)
+    save_streaming_trace(trace, args.save_path)
+    print("saved {} rows to {}".format(len(trace.timestamps), args.save_path))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,5 @@
+import math
+
 from simulator_new.cc import BBRv1
 from simulator_new.constant import TCP_INIT_CWND_BYTE
 from simulator_new.host import Host
@@ -87,7 +89,8 @@ class TCPHost(Host):
     SRTT_BETA = 1 / 4
     RTO_K = 4
 
-    def __init__(self, id, tx_link, rx_link, cc, rtx_mngr, app) -> None:
+    def __init__(self, id, tx_link, rx_link, cc, rtx_mngr, app, save_dir=None,
+                 log_config=None) -> None:
         self.bytes_in_flight = 0
         self.rtt_min_ms = None
         self.srtt_ms = 0
@@ -96,12 +99,18 @@ class TCPHost(Host):
         self.cwnd_byte = TCP_INIT_CWND_BYTE
         self.conn_state = ConnectionState()
         self.rs = RateSample()
-        super().__init__(id, tx_link, rx_link, cc, rtx_mngr, app)
+        super().__init__(id, tx_link, rx_link, cc, rtx_mngr, app, save_dir,
+                         log_config)
         self.pkt_cls = TCPPacket
 
     def can_send(self, pkt_size_byte):
         return self.bytes_in_flight < self.cwnd_byte and self.pacer.can_send(pkt_size_byte)
 
+    def next_send_ts_ms(self, pkt_size_byte):
+        if self.bytes_in_flight >= self.cwnd_byte:
+            return math.inf
+        return self.pacer.next_send_ts_ms(pkt_size_byte)
+
     def _on_pkt_sent(self, ts_ms, pkt):
         if self.bytes_in_flight == 0:
             self.conn_state.first_sent_time_ms = ts_ms
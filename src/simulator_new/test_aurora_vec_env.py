@@ -0,0 +1,25 @@
+import os
+
+import numpy as np
+
+from simulator_new.cc.pcc.aurora.aurora_vec_env import AuroraVecEnv
+from simulator_new.cc.pcc.aurora.trace_scheduler import UDRTrainScheduler
+from simulator_new.test_net_simulator import LOOKUP_TABLE_PATH
+
+CONFIG_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '..', 'config',
+    'config.json')
+
+
+def test_forked_workers_draw_their_own_traces():
+    trace_scheduler = UDRTrainScheduler(CONFIG_PATH, [], batch_size=4)
+    env = AuroraVecEnv({'trace_scheduler': trace_scheduler,
+                        'lookup_table_path': LOOKUP_TABLE_PATH,
+                        'ae_guided': False},
+                       num_workers=2, start_method='fork')
+    try:
+        traces = env.get_attr('trace')
+    finally:
+        env.close()
+    assert not trace_scheduler.generated_traces
+    assert not np.array_equal(traces[0].bandwidths, traces[1].bandwidths)
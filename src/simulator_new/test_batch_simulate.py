@@ -0,0 +1,55 @@
+from itertools import product
+
+import pytest
+
+from simulator_new.batch_simulate import SUMMARY_FIELDS, run_batch
+from simulator_new.trace import generate_trace
+
+STATS_FIELDS = SUMMARY_FIELDS[SUMMARY_FIELDS.index('trace_avg_bw_mbps'):
+                              SUMMARY_FIELDS.index('time_used_sec')]
+
+
+@pytest.fixture
+def trace_files(tmp_path):
+    trace_files = []
+    for seed in range(1, 3):
+        trace = generate_trace(duration_range=(5, 5),
+                               bandwidth_lower_bound_range=(0.3, 1),
+                               bandwidth_upper_bound_range=(2, 6),
+                               delay_range=(10, 60), loss_rate_range=(0, 0),
+                               queue_size_range=(5, 40), T_s_range=(1, 5),
+                               delay_noise_range=(0, 0), seed=seed)
+        trace_files.append(str(tmp_path / 'trace_{}.json'.format(seed)))
+        trace.dump(trace_files[-1])
+    # a trace that fails to load between two that load
+    trace_files.insert(1, str(tmp_path / 'missing.json'))
+    return trace_files
+
+
+def test_rows_follow_runs(tmp_path, trace_files):
+    ccs, apps = ['oracle', 'gcc'], ['file_transfer']
+    rows = run_batch(trace_files, ccs, apps, str(tmp_path / 'vectorized'),
+                     nproc=1, log_level='off', vectorized=True)
+    assert [(row['trace'], row['cc'], row['app']) for row in rows] == \
+        list(product(trace_files, ccs, apps))
+    for row in rows:
+        if row['trace'] == trace_files[1]:
+            assert 'No such file' in row['error']
+            assert 'pkts_sent' not in row
+        else:
+            assert row['error'] == ''
+            assert row['pkts_rcvd'] > 0
+
+
+def test_vectorized_rows_match_single_runs(tmp_path, trace_files):
+    rows = [run_batch(trace_files, ['oracle'], ['file_transfer'],
+                      str(tmp_path / str(vectorized)), nproc=1,
+                      log_level='off', vectorized=vectorized)
+            for vectorized in [False, True]]
+    for row, vectorized_row in zip(*rows):
+        assert vectorized_row['error'] == row['error']
+        if row['error']:
+            continue
+        assert vectorized_row['save_dir'] == ''
+        for key in STATS_FIELDS:
+            assert vectorized_row[key] == pytest.approx(row[key], rel=1e-12), key
@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+import pytest
+
+from simulator_new.cc.pcc.aurora.lockstep_simulator import LockstepSimulator
+from simulator_new.cc.pcc.aurora.numpy_policy import (NumpyMlpPolicy,
+                                                      policy_weights,
+                                                      read_checkpoint)
+from simulator_new.net_simulator import Simulator
+from simulator_new.test_net_simulator import (LOOKUP_TABLE_PATH, MODEL_PATH,
+                                              assert_same_logs)
+from simulator_new.trace import generate_trace
+
+
+def test_numpy_policy_rows_are_independent():
+    policy = NumpyMlpPolicy.load(MODEL_PATH)
+    obs = np.random.RandomState(0).randn(40, 30).astype(np.float32) * 3
+    actions, values, _, _ = policy.step(obs, deterministic=True)
+    for i in range(len(obs)):
+        action, value, _, _ = policy.step(obs[i:i + 1], deterministic=True)
+        assert action[0, 0] == actions[i, 0]
+        assert value[0] == values[i]
+    # the same as a matmul up to rounding
+    latent = obs
+    for w, b in policy.pi_layers:
+        latent = np.tanh(latent @ w + b)
+    np.testing.assert_allclose(actions, latent @ policy.pi[0] + policy.pi[1],
+                               rtol=1e-5, atol=1e-6)
+
+
+@pytest.mark.parametrize('algo', ['ppo1', 'ppo2'])
+def test_policy_weights_of_model_parameters(algo):
+    tensors = read_checkpoint(os.path.splitext(MODEL_PATH)[0] + '.ckpt')
+    # get_parameters() of the model, named as the tf variables
+    params = {key + ':0': val for key, val in tensors.items()
+              if key.startswith('model/')}
+    if algo == 'ppo1':
+        params.update({'oldpi/' + key: 2 * val for key, val in params.items()})
+    else:
+        params.update({key.replace(':0', '/Adam:0'): 2 * val
+                       for key, val in params.items()})
+    weights = policy_weights(params)
+    with np.load(MODEL_PATH) as expected:
+        assert sorted(weights) == sorted(expected)
+        for key in expected:
+            np.testing.assert_array_equal(weights[key], expected[key])
+    NumpyMlpPolicy(weights)
+
+
+@pytest.mark.parametrize('app', ['file_transfer', 'video_streaming'])
+def test_lockstep_matches_single_runs(tmp_path, app):
+    # without losses, runs do not depend on the global random generators
+    traces = [generate_trace(duration_range=(5, 10),
+                             bandwidth_lower_bound_range=(0.3, 1),
+                             bandwidth_upper_bound_range=(2, 6),
+                             delay_range=(10, 60), loss_rate_range=(0, 0),
+                             queue_size_range=(5, 40), T_s_range=(1, 5),
+                             delay_noise_range=(0, 0), seed=seed)
+              for seed in range(1, 4)]
+
+    def make_simulator(trace, save_dir):
+        return Simulator(trace, save_dir, 'aurora', app, model_path=MODEL_PATH,
+                         lookup_table_path=LOOKUP_TABLE_PATH)
+
+    for i, trace in enumerate(traces):
+        make_simulator(trace, str(tmp_path / 'single_{}'.format(i))).simulate(
+            int(trace.duration), False, event_driven=True)
+    LockstepSimulator([make_simulator(trace, str(tmp_path / 'lockstep_{}'.format(i)))
+                       for i, trace in enumerate(traces)]).simulate()
+    for i in range(len(traces)):
+        assert_same_logs(str(tmp_path / 'single_{}'.format(i)),
+                         str(tmp_path / 'lockstep_{}'.format(i)))
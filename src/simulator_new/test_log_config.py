@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+from simulator_new.log_config import LogConfig
+from simulator_new.net_simulator import Simulator
+from simulator_new.test_net_simulator import make_trace
+
+
+def read_lines(path):
+    with open(path) as f:
+        return f.read().splitlines()
+
+
+def test_header_is_written_at_open(tmp_path):
+    log_config = LogConfig(block_rows=100)
+    path, writer = log_config.open_csv(str(tmp_path), 'pacer', 'log.csv', ['a', 'b'])
+    assert read_lines(path) == ['a,b']
+    writer.writerow([1, 2])
+    assert read_lines(path) == ['a,b']  # pending until a block is full
+    log_config.flush()
+    assert read_lines(path) == ['a,b', '1,2']
+
+
+def test_sampled_stream_keeps_header(tmp_path):
+    log_config = LogConfig('sampled', {'pacer': 0.5})
+    path, writer = log_config.open_csv(str(tmp_path), 'pacer', 'log.csv', ['a'])
+    for i in range(4):
+        writer.writerow([i])
+    log_config.close()
+    assert read_lines(path) == ['a', '0', '2']
+
+
+class FailingTickSimulator(Simulator):
+    def tick(self, ts_ms):
+        if ts_ms == 5000:
+            raise RuntimeError('failure')
+        super().tick(ts_ms)
+
+
+def test_logs_are_flushed_on_failure(tmp_path):
+    trace = make_trace()
+    sim = FailingTickSimulator(trace, str(tmp_path), 'gcc', 'file_transfer')
+    with pytest.raises(RuntimeError):
+        sim.simulate(int(trace.duration), False)
+    pkt_log = read_lines(os.path.join(str(tmp_path), 'pkt_log.csv'))
+    assert pkt_log[0].startswith('timestamp_ms,')
+    assert 4900 < int(pkt_log[-1].split(',')[0]) < 5000
+    pacer_log = read_lines(sim.sender.pacer.log_path)
+    assert len(pacer_log) > 1
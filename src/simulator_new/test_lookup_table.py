@@ -0,0 +1,93 @@
+import os
+import pickle
+import shutil
+
+import numpy as np
+import pytest
+
+from simulator_new.app.video_conferencing.lookup_table import (
+    AELookupTable, _LOOKUP_TABLES, load_lookup_table)
+
+LOOKUP_TABLE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data',
+    'AE_lookup_table', 'segment_3IY83M-m6is_480x360.mp4.csv')
+
+
+@pytest.fixture
+def table_path(tmp_path):
+    # a private copy so that the cache sidecar is written next to it
+    path = str(tmp_path / os.path.basename(LOOKUP_TABLE_PATH))
+    shutil.copy(LOOKUP_TABLE_PATH, path)
+    yield path
+    for key in [key for key in _LOOKUP_TABLES if key[0].startswith(str(tmp_path))]:
+        del _LOOKUP_TABLES[key]
+
+
+def encode_dense(table, frame_id, target_fsize_bytes):
+    frame = table[table['frame_id'] == frame_id]
+    fits = frame[frame['size'] <= target_fsize_bytes]
+    row = frame.iloc[0] if len(fits) == 0 else fits.iloc[-1]
+    return row['model_id'], int(row['size'])
+
+
+def get_ssim_dense(table, frame_id, model_id, rounded_loss_rate):
+    mask = (table['frame_id'] == frame_id) & (table['model_id'] == model_id) & \
+           (table['loss'] == rounded_loss_rate)
+    return table[mask]['ssim'].iloc[0] if mask.any() else -1
+
+
+def test_lookups_match_table(table_path):
+    table = load_lookup_table(table_path)
+    lookup_table = AELookupTable(AELookupTable.to_records(table))
+    assert lookup_table.nframes == table['frame_id'].nunique()
+
+    rng = np.random.RandomState(42)
+    model_ids = table['model_id'].unique()
+    for frame_id in rng.choice(lookup_table.nframes, 20, replace=False):
+        frame = table[table['frame_id'] == frame_id]
+        targets = list(frame['size']) + [0, frame['size'].max() + 1] + \
+            list(rng.uniform(0, frame['size'].max(), 10))
+        for target in targets:
+            assert lookup_table.encode(frame_id, target) == \
+                encode_dense(table, frame_id, target)
+        for model_id in list(model_ids[:5]) + [-1]:
+            for loss in [0, 0.1, 0.5, 1, 0.05, 1.2]:
+                assert lookup_table.get_ssim(frame_id, model_id, loss) == \
+                    get_ssim_dense(table, frame_id, model_id, loss)
+        assert lookup_table.get_ssim_range(frame_id) == \
+            (frame['ssim'].min(), frame['ssim'].max())
+
+
+def test_load_writes_and_maps_cache(table_path):
+    cache_path = table_path + '.npy'
+    expected = AELookupTable.to_records(load_lookup_table(table_path))
+
+    lookup_table = AELookupTable.load(table_path)
+    assert os.path.exists(cache_path)
+    np.testing.assert_array_equal(np.load(cache_path), expected)
+    # later loads in the process share the registered table
+    assert AELookupTable.load(table_path) is lookup_table
+    assert pickle.loads(pickle.dumps(lookup_table)) is lookup_table
+
+    # a fresh process maps the sidecar instead of parsing the csv
+    _LOOKUP_TABLES.clear()
+
+    def fail(path):
+        raise AssertionError('csv parsed despite a valid cache')
+    mapped = AELookupTable.load(table_path, loader=fail)
+    assert mapped is not lookup_table
+    assert isinstance(mapped.sizes, np.memmap)
+    for name in ['sorted_sizes', 'last_rows', 'first_rows', 'ssims']:
+        np.testing.assert_array_equal(getattr(mapped, name),
+                                      getattr(lookup_table, name))
+
+
+def test_load_rebuilds_stale_cache(table_path):
+    cache_path = table_path + '.npy'
+    with open(cache_path, 'wb') as f:
+        f.write(b'not a cache')
+    os.utime(table_path, (0, 0))  # the cache is newer but unreadable
+    lookup_table = AELookupTable.load(table_path)
+    np.testing.assert_array_equal(
+        np.load(cache_path), AELookupTable.to_records(load_lookup_table(table_path)))
+    assert lookup_table.nframes > 0
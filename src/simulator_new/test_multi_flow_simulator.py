@@ -0,0 +1,86 @@
+import json
+import os
+import random
+
+import numpy as np
+import pytest
+
+from simulator_new.link import LinkPort
+from simulator_new.multi_flow_simulator import (MultiFlowSimulator,
+                                                jain_fairness_index)
+from simulator_new.test_net_simulator import (LOOKUP_TABLE_PATH,
+                                              assert_same_logs, make_trace,
+                                              run_simulator)
+
+
+def run_multi_flow_simulator(save_dir, flows, trace, **kwargs):
+    random.seed(7)
+    np.random.seed(7)
+    sim = MultiFlowSimulator(trace, save_dir, flows,
+                             lookup_table_path=LOOKUP_TABLE_PATH)
+    sim.simulate(int(trace.duration), False, **kwargs)
+    return sim
+
+
+def read_summary(save_dir):
+    with open(os.path.join(save_dir, 'summary.json')) as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize('cc, app', [
+    ('gcc', 'file_transfer'), ('oracle', 'video_streaming'),
+    ('nocc', 'file_transfer')])
+@pytest.mark.parametrize('event_driven', [False, True])
+def test_single_flow_matches_simulator(tmp_path, cc, app, event_driven):
+    trace = make_trace()
+    sim = run_simulator(str(tmp_path / 'single'), cc, app, trace,
+                        event_driven=event_driven)
+    multi_sim = run_multi_flow_simulator(
+        str(tmp_path / 'multi'), [{'cc': cc, 'app': app}], trace,
+        event_driven=event_driven)
+    stats = multi_sim.summary_stats()['flows'][0]
+    assert (stats.pop('cc'), stats.pop('app')) == (cc, app)
+    assert stats == sim.recorder.summary_stats()
+    assert_same_logs(str(tmp_path / 'single'), str(tmp_path / 'multi' / 'flow_0'))
+
+
+def test_flows_share_the_link(tmp_path, monkeypatch):
+    pulled_flow_ids = {}
+    pull = LinkPort.pull
+
+    def checked_pull(port):
+        pkt = pull(port)
+        if pkt is not None:
+            assert pkt.flow_id == port.flow_id
+            pulled_flow_ids.setdefault(port.link.id, set()).add(pkt.flow_id)
+        return pkt
+    monkeypatch.setattr(LinkPort, 'pull', checked_pull)
+
+    flows = [{'cc': 'gcc', 'app': 'file_transfer'},
+             {'cc': 'gcc', 'app': 'file_transfer'},
+             {'cc': 'oracle', 'app': 'video_streaming'}]
+    sim = run_multi_flow_simulator(str(tmp_path), flows, make_trace(1, 3))
+    assert pulled_flow_ids == {'datalink': {0, 1, 2}, 'acklink': {0, 1, 2}}
+
+    stats = read_summary(str(tmp_path))
+    assert stats == json.loads(json.dumps(sim.summary_stats()))
+    assert stats['num_flows'] == len(flows)
+    flow_stats = stats['flows']
+    for flow_id, flow in enumerate(flows):
+        assert (flow_stats[flow_id]['cc'], flow_stats[flow_id]['app']) == \
+            (flow['cc'], flow['app'])
+        assert flow_stats[flow_id]['pkts_rcvd'] > 0
+        assert read_summary(str(tmp_path / 'flow_{}'.format(flow_id))) == \
+            {key: val for key, val in flow_stats[flow_id].items()
+             if key not in ('cc', 'app')}
+    assert stats['bytes_rcvd'] == sum(s['bytes_rcvd'] for s in flow_stats)
+    rates = [s['rx_rate_Bps'] for s in flow_stats]
+    assert stats['jain_fairness_index'] == pytest.approx(
+        sum(rates) ** 2 / (len(rates) * sum(r * r for r in rates)))
+    assert 0 < stats['jain_fairness_index'] <= 1
+
+
+def test_jain_fairness_index():
+    assert jain_fairness_index([2, 2, 2]) == 1
+    assert jain_fairness_index([1, 0, 0, 0]) == 0.25
+    assert jain_fairness_index([0, 0]) == 0
@@ -0,0 +1,96 @@
+import filecmp
+import os
+import random
+
+import numpy as np
+import pytest
+
+from simulator_new.net_simulator import Simulator
+from simulator_new.trace import generate_trace
+
+LOOKUP_TABLE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data',
+    'AE_lookup_table', 'segment_3IY83M-m6is_480x360.mp4.csv')
+MODEL_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '..', 'models', 'cc',
+    'pretrained', 'pretrained.npz')
+
+
+def make_trace(bw_lower=0.3, bw_upper=2, duration=10):
+    return generate_trace(duration_range=(duration, duration),
+                          bandwidth_lower_bound_range=(bw_lower, bw_lower),
+                          bandwidth_upper_bound_range=(bw_upper, bw_upper),
+                          delay_range=(25, 25), loss_rate_range=(0.01, 0.01),
+                          queue_size_range=(20, 20), T_s_range=(3, 3),
+                          delay_noise_range=(0, 0), seed=42)
+
+
+def run_simulator(save_dir, cc, app, trace, **kwargs):
+    random.seed(7)
+    np.random.seed(7)
+    sim = Simulator(trace, save_dir, cc, app,
+                    lookup_table_path=LOOKUP_TABLE_PATH)
+    sim.simulate(int(trace.duration), False, **kwargs)
+    return sim
+
+
+def assert_same_logs(dir_a, dir_b):
+    fnames = sorted(f for f in os.listdir(dir_a) if f.endswith('.csv'))
+    assert fnames
+    assert fnames == sorted(f for f in os.listdir(dir_b) if f.endswith('.csv'))
+    for fname in fnames:
+        assert filecmp.cmp(os.path.join(dir_a, fname),
+                           os.path.join(dir_b, fname), shallow=False), fname
+
+
+@pytest.mark.parametrize('cc, app', [
+    ('gcc', 'file_transfer'), ('oracle', 'file_transfer'),
+    ('oracle', 'video_streaming'), ('oracle_no_predict', 'video_streaming')])
+@pytest.mark.parametrize('bw', [0.05, 1])
+def test_event_driven_matches_ticks(tmp_path, cc, app, bw):
+    trace = make_trace(bw, 2 * bw)
+    tick_sim = run_simulator(str(tmp_path / 'tick'), cc, app, trace)
+    event_sim = run_simulator(str(tmp_path / 'event'), cc, app, trace,
+                              event_driven=True)
+    assert tick_sim.recorder.summary_stats() == event_sim.recorder.summary_stats()
+    assert_same_logs(str(tmp_path / 'tick'), str(tmp_path / 'event'))
+
+
+@pytest.mark.parametrize('cc, app', [
+    ('gcc', 'file_transfer'), ('oracle', 'video_streaming'),
+    ('aurora', 'file_transfer')])
+@pytest.mark.parametrize('event_driven', [False, True])
+def test_checkpoint_restore_and_fork_match_straight_run(tmp_path, cc, app,
+                                                        event_driven):
+    trace = make_trace()
+    dur_sec = int(trace.duration)
+
+    def make_simulator(save_dir):
+        random.seed(7)
+        np.random.seed(7)
+        return Simulator(trace, str(tmp_path / save_dir), cc, app,
+                         model_path=MODEL_PATH,
+                         lookup_table_path=LOOKUP_TABLE_PATH)
+
+    expected = make_simulator('straight')
+    expected.simulate(dur_sec, False, event_driven)
+
+    sim = make_simulator('paused')
+    sim.run(4321, dur_sec * 1000, event_driven)
+    random_state, np_random_state = random.getstate(), np.random.get_state()
+    data = sim.checkpoint()
+    fork = sim.fork()
+
+    restored = Simulator.restore(data)
+    restored.simulate(dur_sec, False, event_driven)
+    random.setstate(random_state)
+    np.random.set_state(np_random_state)
+    fork.simulate(dur_sec, False, event_driven)
+    random.setstate(random_state)
+    np.random.set_state(np_random_state)
+    sim.simulate(dur_sec, False, event_driven)
+
+    for copy in [restored, fork, sim]:
+        assert copy.recorder.summary_stats() == expected.recorder.summary_stats()
+    # copies do not log, the checkpointed simulator logs as a straight run
+    assert_same_logs(str(tmp_path / 'straight'), str(tmp_path / 'paused'))
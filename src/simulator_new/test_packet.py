@@ -0,0 +1,46 @@
+import copy
+
+import pytest
+
+from simulator_new.packet import (FrameInfo, Packet, PacketRecord, RTPPacket,
+                                  TCPPacket)
+
+RECORDED_FIELDS = ('pkt_id', 'pkt_type', 'size_bytes', 'frame', 'frame_id',
+                   'prop_delay_ms', 'queue_delay_ms', 'ts_sent_ms',
+                   'ts_first_sent_ms', 'probe_cluster_id')
+
+
+@pytest.mark.parametrize('pkt_cls', [Packet, TCPPacket, RTPPacket])
+def test_packet_record_round_trip(pkt_cls):
+    frame = FrameInfo(3, 2, 2400, 0, None, 100, 30000.0, 0)
+    pkt = pkt_cls(7, pkt_cls.DATA_PKT, 1200, frame)
+    pkt.add_prop_delay_ms(25)
+    pkt.add_queue_delay_ms(4)
+    pkt.ts_sent_ms = 120
+    pkt.ts_first_sent_ms = 100
+    pkt.probe_cluster_id = 2
+    expected = copy.deepcopy(pkt)
+
+    record = PacketRecord(pkt)
+    # later changes to the sent packet do not leak into the record
+    pkt.add_queue_delay_ms(10)
+    pkt.ts_sent_ms = 200
+    rtx_pkt = record.to_pkt()
+
+    assert type(rtx_pkt) is pkt_cls
+    assert rtx_pkt is not pkt
+    assert rtx_pkt.frame is frame
+    for field in RECORDED_FIELDS:
+        if field != 'frame':
+            assert getattr(rtx_pkt, field) == getattr(expected, field), field
+    assert rtx_pkt.delay_ms() == expected.delay_ms()
+    # every rebuild is a new packet
+    assert record.to_pkt() is not rtx_pkt
+
+
+def test_packet_record_without_frame():
+    pkt = Packet(1, Packet.DATA_PKT, 1500)
+    rtx_pkt = PacketRecord(pkt).to_pkt()
+    assert rtx_pkt.frame is None
+    assert rtx_pkt.frame_id is None
+    assert not rtx_pkt.is_padding()
@@ -0,0 +1,69 @@
+import csv
+import os
+import random
+
+import numpy as np
+import pytest
+
+from simulator_new.net_simulator import Simulator
+from simulator_new.pkt_log import (PKT_LOG_HEADER, PacketLogWriter,
+                                   load_pkt_log, pkt_log_to_csv,
+                                   read_pkt_log_rows)
+from simulator_new.test_net_simulator import LOOKUP_TABLE_PATH, make_trace
+
+
+def test_writer_round_trip(tmp_path):
+    rows = [
+        [10, 0, 'data', 1500, 0, 0, 3000, 1200.5, 2, 0, 0],
+        [10, 1, 'RTP', 1200, 0, 0, 0, 0.0, None, 1, None],
+        [40, 0, 'arrived', 1500, 30.25, 30.25, 1500, 0.0, 2, 0, 1],
+        [45, 0, 'ack', 80, 5.0, 35, 0, 0.0],
+        [50, 3, 'lost', 1500],
+    ]
+    fname = str(tmp_path / 'pkt_log.bin')
+    writer = PacketLogWriter(fname, block_size=2)
+    for row in rows:
+        writer.writerow(row)
+    assert len(writer.rows) == 1  # two blocks are on disk
+    writer.close()
+
+    assert len(load_pkt_log(fname)) == len(rows)
+    csv_fname = str(tmp_path / 'pkt_log.csv')
+    pkt_log_to_csv(fname, csv_fname)
+    with open(csv_fname) as f:
+        assert list(csv.reader(f)) == [PKT_LOG_HEADER] + [
+            ['10', '0', 'data', '1500', '0', '0', '3000', '1200.5', '2', '0', '0'],
+            ['10', '1', 'RTP', '1200', '0', '0', '0', '0.0', '', '1', ''],
+            ['40', '0', 'arrived', '1500', '30.25', '30.25', '1500', '0.0', '2', '0', '1'],
+            ['45', '0', 'ack', '80', '5.0', '35', '0', '0.0'],
+            ['50', '3', 'lost', '1500']]
+
+
+def test_empty_log(tmp_path):
+    fname = str(tmp_path / 'pkt_log.bin')
+    PacketLogWriter(fname).close()
+    assert list(read_pkt_log_rows(fname)) == [PKT_LOG_HEADER]
+
+
+@pytest.mark.parametrize('cc, app', [
+    ('gcc', 'file_transfer'), ('oracle', 'video_streaming')])
+def test_binary_log_converts_to_csv_log(tmp_path, cc, app):
+    trace = make_trace(0.3, 1)
+    sims = {}
+    for log_format in ['csv', 'bin']:
+        random.seed(7)
+        np.random.seed(7)
+        save_dir = str(tmp_path / log_format)
+        sims[log_format] = Simulator(trace, save_dir, cc, app,
+                                     lookup_table_path=LOOKUP_TABLE_PATH,
+                                     pkt_log_format=log_format)
+        sims[log_format].simulate(int(trace.duration), False)
+    csv_fname = str(tmp_path / 'converted.csv')
+    pkt_log_to_csv(sims['bin'].recorder.log_fname, csv_fname)
+    with open(os.path.join(str(tmp_path / 'csv'), 'pkt_log.csv')) as f:
+        expected = f.read()
+    with open(csv_fname) as f:
+        assert f.read() == expected
+    assert len(expected.splitlines()) > 300
+    assert sims['csv'].recorder.summary_stats() == \
+        sims['bin'].recorder.summary_stats()
@@ -0,0 +1,55 @@
+from simulator_new.link import Link
+from simulator_new.packet import Packet
+from simulator_new.queue_discipline import DropTailQueue
+from simulator_new.trace import Trace
+
+
+def make_pkt(pkt_id, size_bytes=1500, ts_sent_ms=0):
+    pkt = Packet(pkt_id, Packet.DATA_PKT, size_bytes)
+    pkt.ts_sent_ms = ts_sent_ms
+    return pkt
+
+
+def test_drop_tail_drops_at_capacity():
+    queue = DropTailQueue(3000)
+    assert queue.enqueue(make_pkt(0))
+    assert queue.enqueue(make_pkt(1))
+    assert not queue.enqueue(make_pkt(2))
+    assert not queue.enqueue(make_pkt(3, 1))
+    assert len(queue) == 2
+    assert queue.size_bytes == 3000
+
+    assert queue.dequeue().pkt_id == 0
+    assert queue.size_bytes == 1500
+    assert queue.enqueue(make_pkt(4, 1000))
+    assert [pkt.pkt_id for pkt in queue] == [1, 4]
+    assert queue.peek().pkt_id == 1
+
+    queue.reset()
+    assert not queue
+    assert queue.size_bytes == 0
+
+
+def test_drop_tail_unbounded():
+    queue = DropTailQueue()
+    for pkt_id in range(1000):
+        assert queue.enqueue(make_pkt(pkt_id))
+    assert queue.size_bytes == 1000 * 1500
+
+
+def test_link_queue_drains_at_trace_bandwidth():
+    # 1.2Mbps is one 1500-byte packet every 10ms
+    trace = Trace([0, 30], [1.2, 1.2], [25, 25], 0, 2)
+    link = Link('datalink', trace, prop_delay_ms=25, queue_cap_bytes=3000)
+    for pkt_id in range(3):
+        link.push(make_pkt(pkt_id))
+    assert len(link.queue) == 2  # the third packet is dropped
+
+    rcvd = []
+    for ts_ms in range(1, 100):
+        link.tick(ts_ms)
+        pkt = link.pull()
+        while pkt is not None:
+            rcvd.append((ts_ms, pkt.pkt_id, pkt.queue_delay_ms))
+            pkt = link.pull()
+    assert rcvd == [(35, 0, 10), (45, 1, 20)]
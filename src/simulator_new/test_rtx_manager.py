@@ -0,0 +1,106 @@
+import random
+
+import pytest
+
+from simulator_new.packet import Packet
+from simulator_new.rtx_manager import AuroraRtxManager
+from simulator_new.rtx_manager.rtx_queue import RtxQueue
+
+
+def test_rtx_queue_lazy_deletion():
+    queue = RtxQueue()
+    for pkt_id in [5, 3, 9, 1, 7]:
+        queue.add(pkt_id)
+    queue.add(3)  # already queued
+    assert len(queue) == 5
+
+    queue.remove(1)
+    queue.discard(7)
+    queue.discard(42)  # not queued
+    assert 1 not in queue and 7 not in queue
+    assert len(queue) == 3
+    # removed ids are still in the heap until they reach its top
+    assert queue.peek() == 3
+    assert queue.pop() == 3
+    assert queue.pop() == 5
+
+    # an id removed and added again is only returned once
+    queue.remove(9)
+    queue.add(9)
+    queue.add(2)
+    assert [queue.pop() for _ in range(len(queue))] == [2, 9]
+    assert not queue
+    with pytest.raises(KeyError):
+        queue.remove(9)
+
+    queue.add(4)
+    queue.clear()
+    assert not queue and not queue.heap
+
+
+class ScanRtxManager(AuroraRtxManager):
+    """Loss detection by a scan of all unacked packets before the acked one."""
+
+    def _detect_lost_pkt_ids(self, ts_ms, acked_pkt_id):
+        lost_pkt_ids = []
+        for pkt_id, pkt_info in self.unacked_buf.items():
+            if pkt_id >= acked_pkt_id:
+                break
+            if (pkt_info['num_rtx'] == 0 or
+                ts_ms - pkt_info['pkt'].ts_sent_ms > pkt_info['rto_ms']) and \
+                pkt_id not in self.rtx_queue:
+                lost_pkt_ids.append(pkt_id)
+        return lost_pkt_ids
+
+
+class LossLog:
+    def __init__(self, rtx_mngr) -> None:
+        self.lost = []
+        rtx_mngr.on_pkt_lost = lambda ts_ms, pkt: self.lost.append((ts_ms, pkt.pkt_id))
+
+
+def send(rtx_mngr, pkt, ts_ms):
+    pkt.ts_sent_ms = ts_ms
+    if pkt.ts_first_sent_ms == 0:
+        pkt.ts_first_sent_ms = ts_ms
+    rtx_mngr.on_pkt_sent(pkt)
+
+
+def ack(rtx_mngr, pkt_id, ts_ms, rtt_ms):
+    ack_pkt = Packet(pkt_id, Packet.ACK_PKT, 80)
+    ack_pkt.data_pkt_ts_sent_ms = ts_ms - rtt_ms
+    ack_pkt.ts_rcvd_ms = ts_ms
+    rtx_mngr.on_pkt_rcvd(ts_ms, ack_pkt)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_aurora_loss_detection_matches_scan(seed):
+    rng = random.Random(seed)
+    rtx_mngrs = [AuroraRtxManager(), ScanRtxManager()]
+    loss_logs = [LossLog(rtx_mngr) for rtx_mngr in rtx_mngrs]
+    next_pkt_id = 0
+    for ts_ms in range(1, 20000, 10):
+        event = rng.random()
+        if event < 0.4:
+            for rtx_mngr in rtx_mngrs:
+                send(rtx_mngr, Packet(next_pkt_id, Packet.DATA_PKT, 1500), ts_ms)
+            next_pkt_id += 1
+        elif event < 0.6:
+            rtx_pkts = [rtx_mngr.get_pkt() for rtx_mngr in rtx_mngrs]
+            assert len({None if pkt is None else pkt.pkt_id for pkt in rtx_pkts}) == 1
+            if rtx_pkts[0] is not None:
+                for rtx_mngr, pkt in zip(rtx_mngrs, rtx_pkts):
+                    send(rtx_mngr, pkt, ts_ms)
+        elif next_pkt_id:
+            # acks are lost and reordered
+            pkt_id = rng.randrange(max(0, next_pkt_id - 30), next_pkt_id)
+            rtt_ms = rng.randint(20, 400)
+            for rtx_mngr in rtx_mngrs:
+                ack(rtx_mngr, pkt_id, ts_ms, rtt_ms)
+        heap_mngr, scan_mngr = rtx_mngrs
+        assert loss_logs[0].lost == loss_logs[1].lost
+        assert set(heap_mngr.rtx_queue) == set(scan_mngr.rtx_queue)
+        assert heap_mngr.num_pkt_lost == scan_mngr.num_pkt_lost
+        assert heap_mngr.rto_ms == scan_mngr.rto_ms
+    # retransmitted packets were lost again after their rto
+    assert len(loss_logs[0].lost) > len({pkt_id for _, pkt_id in loss_logs[0].lost})
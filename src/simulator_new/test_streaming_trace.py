@@ -0,0 +1,60 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from simulator_new.streaming_trace import StreamingTrace, save_streaming_trace
+from simulator_new.test_net_simulator import (assert_same_logs, make_trace,
+                                              run_simulator)
+
+
+@pytest.fixture
+def traces(tmp_path):
+    trace = make_trace(0.3, 2, duration=30)
+    filename = str(tmp_path / 'trace.bin')
+    # small chunks and windows, so that rows cross both
+    save_streaming_trace(trace, filename, chunk_len=7)
+    return trace, StreamingTrace(filename, window_len=16)
+
+
+def test_series_and_stats_match(traces):
+    trace, streaming_trace = traces
+    np.testing.assert_array_equal(streaming_trace.timestamps, trace.timestamps)
+    np.testing.assert_array_equal(streaming_trace.bandwidths, trace.bandwidths)
+    np.testing.assert_array_equal(streaming_trace.cum_bits, trace.cum_bits)
+    for stat in ['duration', 'min_bw', 'max_bw', 'avg_bw', 'min_delay',
+                 'avg_delay', 'loss_rate', 'queue_size']:
+        assert getattr(streaming_trace, stat) == pytest.approx(
+            getattr(trace, stat), rel=1e-12), stat
+
+
+def test_lookups_match(traces):
+    trace, streaming_trace = traces
+    rng = np.random.RandomState(0)
+    # forward scans with jumps back, as predicted rates do
+    ts_list = np.concatenate([np.arange(0, 30, 0.037), rng.uniform(0, 31, 500)])
+    for lo_ts, up_ts in zip(ts_list, ts_list[1:]):
+        assert streaming_trace.get_bandwidth(lo_ts) == trace.get_bandwidth(lo_ts)
+        assert streaming_trace.get_delay(lo_ts) == trace.get_delay(lo_ts)
+        lo_ts, up_ts = min(lo_ts, up_ts), max(lo_ts, up_ts)
+        assert streaming_trace.get_avail_bits2send(lo_ts, up_ts) == \
+            trace.get_avail_bits2send(lo_ts, up_ts)
+        assert streaming_trace.get_sending_end_ts(lo_ts, 12000) == \
+            trace.get_sending_end_ts(lo_ts, 12000)
+
+
+def test_pickled_trace_maps_the_file(traces):
+    _, streaming_trace = traces
+    copy = pickle.loads(pickle.dumps(streaming_trace))
+    assert isinstance(copy.data, np.memmap)
+    assert copy.get_avail_bits2send(1, 20) == streaming_trace.get_avail_bits2send(1, 20)
+
+
+@pytest.mark.parametrize('cc, app', [
+    ('gcc', 'file_transfer'), ('oracle', 'video_streaming')])
+def test_simulation_logs_match(tmp_path, traces, cc, app):
+    trace, streaming_trace = traces
+    sims = [run_simulator(str(tmp_path / name), cc, app, trace)
+            for name, trace in [('trace', trace), ('streaming', streaming_trace)]]
+    assert sims[0].recorder.summary_stats() == sims[1].recorder.summary_stats()
+    assert_same_logs(str(tmp_path / 'trace'), str(tmp_path / 'streaming'))
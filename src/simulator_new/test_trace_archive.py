@@ -0,0 +1,66 @@
+import numpy as np
+
+from simulator_new.trace import Trace, generate_trace
+from simulator_new.trace_archive import (SCALARS, SERIES, TraceArchive,
+                                         convert_json_traces, dump_traces,
+                                         iter_traces, load_trace_list,
+                                         load_traces)
+
+
+def make_traces():
+    traces = [generate_trace(duration_range=(5, 20),
+                             bandwidth_lower_bound_range=(0.3, 1),
+                             bandwidth_upper_bound_range=(2, 6),
+                             delay_range=(10, 60), loss_rate_range=(0, 0.05),
+                             queue_size_range=(5, 40), T_s_range=(1, 5),
+                             delay_noise_range=(0, 5), seed=seed)
+              for seed in range(1, 4)]
+    # ints and floats are kept apart, as in json traces
+    traces.append(Trace([0, 0.5, 1, 2], [1, 2.5, 3, 3], [20, 25.5, 30, 30],
+                        0, 10, delay_noise=2, bw_change_interval=0.5))
+    return traces
+
+
+def assert_same_trace(trace, expected):
+    for series in SERIES:
+        assert repr(getattr(trace, series)) == repr(getattr(expected, series)), series
+    for attr in SCALARS.values():
+        assert repr(getattr(trace, attr)) == repr(getattr(expected, attr)), attr
+    np.testing.assert_array_equal(trace.cum_bits, expected.cum_bits)
+    assert trace.duration == expected.duration
+    assert trace.min_delay == expected.min_delay
+
+
+def test_archive_round_trip(tmp_path):
+    traces = make_traces()
+    filename = str(tmp_path / 'traces.npz')
+    dump_traces(traces, filename)
+    archive = TraceArchive(filename)
+    assert len(archive) == len(traces)
+    assert archive.names == [''] * len(traces)
+    for trace, expected in zip(archive, traces):
+        assert_same_trace(trace, expected)
+    assert_same_trace(archive[2], traces[2])
+    assert len(load_traces(filename)) == len(traces)
+
+
+def test_json_traces_round_trip(tmp_path):
+    trace_files = []
+    for i, trace in enumerate(make_traces()):
+        trace_files.append(str(tmp_path / 'trace_{}.json'.format(i)))
+        trace.dump(trace_files[-1])
+    filename = str(tmp_path / 'traces.npz')
+    convert_json_traces(trace_files, filename)
+    assert TraceArchive(filename).names == trace_files
+    json_traces = [Trace.load_from_file(trace_file) for trace_file in trace_files]
+    for trace, expected in zip(iter_traces(filename), json_traces):
+        assert_same_trace(trace, expected)
+
+    # lists may mix json traces and archives
+    list_file = str(tmp_path / 'traces.txt')
+    with open(list_file, 'w') as f:
+        f.write('\n'.join([trace_files[0], filename, '', trace_files[1]]) + '\n')
+    listed = load_trace_list(list_file)
+    assert len(listed) == 2 + len(trace_files)
+    for trace, expected in zip(listed, [json_traces[0]] + json_traces + [json_traces[1]]):
+        assert_same_trace(trace, expected)
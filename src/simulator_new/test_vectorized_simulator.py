@@ -0,0 +1,52 @@
+import random
+
+import numpy as np
+import pytest
+
+from simulator_new.net_simulator import Simulator
+from simulator_new.trace import generate_trace
+from simulator_new.vectorized_simulator import simulate_traces
+
+
+def make_traces(loss_rate, n=4):
+    return [generate_trace(duration_range=(10, 10),
+                           bandwidth_lower_bound_range=(0.3, 1),
+                           bandwidth_upper_bound_range=(2, 6),
+                           delay_range=(10, 60),
+                           loss_rate_range=(loss_rate, loss_rate),
+                           queue_size_range=(5, 40), T_s_range=(1, 5),
+                           delay_noise_range=(0, 0), seed=seed)
+            for seed in range(1, n + 1)]
+
+
+def simulate(trace, cc):
+    random.seed(0)
+    np.random.seed(0)
+    sim = Simulator(trace, '', cc, 'file_transfer', log_level='off')
+    sim.simulate(int(trace.duration), False)
+    return sim.recorder.summary_stats()
+
+
+@pytest.mark.parametrize('cc', ['nocc', 'oracle', 'oracle_no_predict'])
+def test_matches_simulator_without_losses(cc):
+    traces = make_traces(0)
+    res = simulate_traces(traces, cc, chunk_size=3)
+    assert len(res) == len(traces)
+    for i, trace in enumerate(traces):
+        expected = simulate(trace, cc)
+        stats = res.summary_stats(i)
+        for key, val in expected.items():
+            assert stats[key] == pytest.approx(val, rel=1e-12), (i, key)
+        if cc != 'nocc':
+            assert stats['pkts_rcvd'] > 0
+
+
+def test_sends_like_simulator_with_losses():
+    traces = make_traces(0.05)
+    res = simulate_traces(traces, 'oracle', seed=0)
+    for i, trace in enumerate(traces):
+        expected = simulate(trace, 'oracle')
+        stats = res.summary_stats(i)
+        # sending does not depend on the losses
+        assert stats['pkts_sent'] == expected['pkts_sent']
+        assert stats['pkts_rcvd'] == pytest.approx(expected['pkts_rcvd'], rel=0.05)
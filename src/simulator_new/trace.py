@@ -2,6 +2,7 @@ import argparse
 from bisect import bisect_right
 import copy
 import csv
+import math
 import random
 import os
 from typing import List, Tuple, Union, Optional
@@ -9,7 +10,6 @@ from typing import List, Tuple, Union, Optional
 import numpy as np
 from simulator_new.utils import read_json_file, set_seed, write_json_file
 from simulator_new.constant import MSS
-from simulator_new.pantheon_trace_parser.flow import Flow
 
 
 
@@ -59,6 +59,21 @@ class Trace():
         self.noise_idx = 0
         self.return_noise = False
         self.bw_change_interval = bw_change_interval
+        self._build_bits_index()
+
+    # series only read by simulations, shared by a trace and its deep copies
+    SHARED_SERIES = ('timestamps', 'bandwidths', 'delays', 'cum_bits')
+
+    def __deepcopy__(self, memo):
+        """Copy the position in the trace and share the series, e.g. between
+        forks of a Simulator. Assign new series to a copy, and call
+        _build_bits_index(), instead of editing them in place."""
+        trace = copy.copy(self)
+        memo[id(self)] = trace
+        for name, val in self.__dict__.items():
+            if name not in self.SHARED_SERIES:
+                setattr(trace, name, copy.deepcopy(val, memo))
+        return trace
 
     def real_trace_configs(self, normalized=False) -> List[float]:
         if normalized:
@@ -141,16 +156,41 @@ class Trace():
             return self.timestamps[self.idx+1]
         return 1e6
 
+    def _build_bits_index(self):
+        """Precompute the cumulative bits sent from the trace start to each
+        timestamp. Call it again whenever timestamps or bandwidths change."""
+        bandwidths = np.asarray(self.bandwidths, dtype=np.float64)
+        durations = np.diff(np.asarray(self.timestamps, dtype=np.float64))
+        # same test as np.allclose(durations, self.dt), which is slow on
+        # short traces
+        if np.all(np.abs(durations - self.dt) <= 1e-8 + 1e-5 * abs(self.dt)):
+            # keep the arithmetic of a uniform-dt trace exact
+            durations = np.full(len(durations), self.dt)
+        self.cum_bits = np.zeros(len(bandwidths))
+        np.cumsum(bandwidths[:-1] * 1e6 * durations, out=self.cum_bits[1:])
+
     def get_avail_bits2send(self, lo_ts: float, up_ts: float) -> float:
         assert lo_ts <= up_ts
         lo_idx = bisect_right(self.timestamps, lo_ts) - 1
         up_idx = bisect_right(self.timestamps, up_ts) - 1
-        avail_bits = sum(self.bandwidths[lo_idx: up_idx]) * 1e6 * self.dt
+        avail_bits = float(self.cum_bits[up_idx] - self.cum_bits[lo_idx])
         avail_bits -= self.bandwidths[lo_idx] * 1e6 * (lo_ts - self.timestamps[lo_idx])
         avail_bits += self.bandwidths[up_idx] * 1e6 * (up_ts - self.timestamps[up_idx])
         assert avail_bits >= 0
         return avail_bits
 
+    def get_sending_end_ts(self, lo_ts: float, bits: float) -> float:
+        """Return the up_ts at which get_avail_bits2send(lo_ts, up_ts) reaches
+        bits, up to rounding, or math.inf if it never does."""
+        lo_idx = bisect_right(self.timestamps, lo_ts) - 1
+        target_bits = float(self.cum_bits[lo_idx]) + self.bandwidths[lo_idx] * \
+            1e6 * (lo_ts - self.timestamps[lo_idx]) + bits
+        idx = max(bisect_right(self.cum_bits, target_bits) - 1, lo_idx)
+        if self.bandwidths[idx] <= 0:
+            return math.inf
+        return float(self.timestamps[idx] + (target_bits - self.cum_bits[idx]) /
+                     (self.bandwidths[idx] * 1e6))
+
     def get_sending_t_usage(self, bits_2_send: float, ts: float) -> float:
         cur_idx = copy.copy(self.idx)
         t_used = 0
@@ -170,9 +210,16 @@ class Trace():
         self.idx = cur_idx # recover index
         return t_used
 
+    def _seek(self, ts: float):
+        """Move the position back to ts, e.g. for a rate predicted ahead of
+        time, as lookups only scan forward."""
+        if self.idx < len(self.timestamps) and ts < self.timestamps[self.idx]:
+            self.idx = max(bisect_right(self.timestamps, ts) - 1, 0)
+
     def get_bandwidth(self, ts: float):
         """Return bandwidth(Mbps) at ts(second)."""
         # support time-variant bandwidth and constant bandwidth
+        self._seek(ts)
         while self.idx + 1 < len(self.timestamps) and self.timestamps[self.idx + 1] <= ts:
             self.idx += 1
         if self.idx >= len(self.bandwidths):
@@ -181,6 +228,7 @@ class Trace():
 
     def get_delay(self, ts: float):
         """Return link one-way delay(millisecond) at ts(second)."""
+        self._seek(ts)
         while self.idx + 1 < len(self.timestamps) and self.timestamps[self.idx + 1] <= ts:
             self.idx += 1
         if self.idx >= len(self.delays):
@@ -251,6 +299,8 @@ class Trace():
     def load_from_pantheon_file(uplink_filename: str, loss: float, queue: int,
                                 ms_per_bin: int = 500, front_offset: float = 0,
                                 wrap: bool = False):
+        # the pantheon parser imports matplotlib
+        from simulator_new.pantheon_trace_parser.flow import Flow
         flow = Flow(uplink_filename, ms_per_bin)
         downlink_filename = uplink_filename.replace('datalink', 'acklink')
         if downlink_filename and os.path.exists(downlink_filename):
@@ -319,6 +369,7 @@ class Trace():
         bandwidths += wrapped_bw
         self.timestamps = timestamps
         self.bandwidths = bandwidths
+        self._build_bits_index()
 
 
 def generate_trace(duration_range: Tuple[float, float],
@@ -454,6 +505,102 @@ def generate_bw_delay_series(T_s: float, duration: float,
     return timestamps, bandwidths, delays
 
 
+def generate_bw_delay_series_vec(rng: np.random.Generator, T_s: float, duration: float,
+                                 min_bw_lower_bnd: float, min_bw_upper_bnd: float,
+                                 max_bw_lower_bnd: float, max_bw_upper_bnd: float,
+                                 min_delay: float, max_delay: float,
+                                 dt: float = 0.1) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Vectorized generate_bw_delay_series() drawing from rng.
+
+    The bandwidth changes every ceil(T_s / dt) steps. The series follow the
+    same distributions as generate_bw_delay_series() but not the same
+    random stream.
+    """
+    round_digit = 5
+    min_bw_lower_bnd = round(min_bw_lower_bnd, round_digit)
+    # all scalars at once: bw upper bound, bw lower bound, first bw, delay
+    u = rng.random(4)
+    bw_upper_bnd = round(float(np.exp(np.log(max_bw_lower_bnd) + u[0] * (
+        np.log(max_bw_upper_bnd) - np.log(max_bw_lower_bnd)))), round_digit)
+    assert min_bw_lower_bnd <= bw_upper_bnd, "{}, {}".format(
+            min_bw_lower_bnd, bw_upper_bnd)
+    bw_lower_log = np.log(min_bw_lower_bnd)
+    bw_lower_bnd = round(float(np.exp(bw_lower_log + u[1] * (
+        np.log(min(min_bw_upper_bnd, bw_upper_bnd)) - bw_lower_log))), round_digit)
+    bw_val = round(bw_lower_bnd + u[2] * (bw_upper_bnd - bw_lower_bnd), round_digit)
+    delay_val = round(min_delay + u[3] * (max_delay - min_delay), round_digit)
+
+    steps = np.arange(int(np.ceil(duration / dt)) + 1)
+    steps = steps[steps * dt < duration]
+    timestamps = np.append(np.round(steps * dt, round_digit),
+                           round(duration, round_digit))
+    period = max(1, int(np.ceil(T_s / dt - 1e-9))) if T_s != 0 else len(timestamps)
+    num_segments = -(-len(timestamps) // period)
+    segment_bws = np.empty(num_segments)
+    segment_bws[0] = bw_val
+    segment_bws[1:] = rng.uniform(bw_lower_bnd, bw_upper_bnd, num_segments - 1)
+    bandwidths = np.repeat(segment_bws, period)[:len(timestamps)]
+    # the last timestamp only marks the end of the trace
+    if len(bandwidths) >= 2:
+        bandwidths[-1] = bandwidths[-2]
+    delays = np.full(len(timestamps), delay_val)
+    return timestamps, bandwidths, delays
+
+
+def _pick_env_config(config, rand_num: float):
+    """Return the env config of config picked by rand_num in [0, 1), as in
+    generate_trace_from_config()."""
+    weights = [env_config['weight'] for env_config in config]
+    assert round(sum(weights), 1) == 1.0
+    indices_sorted = sorted(range(len(weights)), key=weights.__getitem__)
+    weight_cumsums = np.cumsum(np.array(sorted(weights)))
+    for i, weight_cumsum in zip(indices_sorted, weight_cumsums):
+        if rand_num <= float(weight_cumsum):
+            return config[i]
+    raise ValueError("This line should never be reached.")
+
+
+def generate_traces_batch(config, count: int, duration: int = 30,
+                          seed: Optional[int] = None, dt: float = 0.1) -> List[Trace]:
+    """Generate count traces from a trace config with NumPy.
+
+    Trace i is drawn from its own generator seeded by the i-th child of
+    np.random.SeedSequence(seed), so it does not depend on count. With seed
+    None, the seed is drawn from np.random. The traces follow the same
+    distributions as generate_trace_from_config() but not the same random
+    stream.
+    """
+    if seed is None:
+        seed = int(np.random.randint(0, 2**31 - 1))
+    traces = []
+    for seed_seq in np.random.SeedSequence(seed).spawn(count):
+        rng = np.random.default_rng(seed_seq)
+        # env pick, loss, duration, T_s, delay noise, queue
+        u = rng.random(6)
+        env_config = _pick_env_config(config, u[0])
+        duration_min, duration_max = env_config.get('duration', (duration, duration))
+        delay_noise_min, delay_noise_max = env_config.get('delay_noise', (0, 0))
+        T_s_min, T_s_max = env_config.get('T_s', (1, 1))
+        loss_min, loss_max = env_config['loss']
+        queue_min, queue_max = env_config['queue']
+
+        loss_lo, loss_hi = np.log10(loss_min + 1e-5), np.log10(loss_max + 1e-5)
+        loss_rate_exponent = float(loss_lo + u[1] * (loss_hi - loss_lo))
+        loss_rate = 0 if loss_rate_exponent < -4 else 10**loss_rate_exponent
+        trace_duration = float(duration_min + u[2] * (duration_max - duration_min))
+        T_s = float(T_s_min + u[3] * (T_s_max - T_s_min))
+        delay_noise = float(delay_noise_min + u[4] * (delay_noise_max - delay_noise_min))
+        queue_size = max(1, int(queue_min + u[5] * (queue_max - queue_min)))
+
+        timestamps, bandwidths, delays = generate_bw_delay_series_vec(
+            rng, T_s, trace_duration, *env_config['bandwidth_lower_bound'],
+            *env_config['bandwidth_upper_bound'], *env_config['delay'], dt=dt)
+        traces.append(Trace(timestamps.tolist(), bandwidths.tolist(),
+                            delays.tolist(), loss_rate, queue_size,
+                            delay_noise, T_s))
+    return traces
+
+
 def generate_trace_from_config_file(config_file: str, duration: int = 30) -> Trace:
     config = read_json_file(config_file)
     return generate_trace_from_config(config, duration)
@@ -535,6 +682,14 @@ def parse_args():
                         "randomization ranges with their probabilites.")
     parser.add_argument("--count", type=int, required=True)
     parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--archive", action="store_true",
+                        help="Save all traces to traces.npz, see "
+                        "simulator_new.trace_archive, instead of one json "
+                        "file per trace.")
+    parser.add_argument("--batch", action="store_true",
+                        help="Generate all traces at once with "
+                        "generate_traces_batch, trace i seeded by --seed and "
+                        "i. Faster, but not the same traces as without it.")
 
     return parser.parse_args()
 
@@ -543,10 +698,20 @@ def main():
     args = parse_args()
     set_seed(args.seed)
     assert args.count < 100000
-    for i in range(args.count):
-        trace = generate_trace_from_config_file(args.config_file)
+    os.makedirs(args.save_dir, exist_ok=True)
+    if args.batch:
+        traces = generate_traces_batch(read_json_file(args.config_file),
+                                       args.count, seed=args.seed)
+    else:
+        traces = (generate_trace_from_config_file(args.config_file)
+                  for _ in range(args.count))
+    if args.archive:
+        from simulator_new.trace_archive import dump_traces
+        dump_traces(list(traces), os.path.join(args.save_dir, 'traces.npz'),
+                    names=['trace_{:05d}'.format(i) for i in range(args.count)])
+        return
+    for i, trace in enumerate(traces):
         trace_file = os.path.join(args.save_dir, 'trace_{:05d}.json'.format(i))
-        os.makedirs(args.save_dir, exist_ok=True)
         trace.dump(trace_file)
 
 
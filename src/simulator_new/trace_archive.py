@@ -0,0 +1,158 @@
+"""Many traces in one binary .npz archive.
+
+The series of all traces are concatenated into a few flat arrays with an
+index of offsets, so loading a corpus is a handful of reads instead of
+parsing one json file per trace. Traces loaded from an archive are equal to
+the ones loaded from their json files, down to int or float values.
+
+    python -m simulator_new.trace_archive \
+        --traces data/cellular_train_traces.txt --save-path train.npz
+"""
+import argparse
+import glob
+import os
+from typing import Iterator, List, Optional
+
+import numpy as np
+
+from simulator_new.trace import Trace
+
+SERIES = ('timestamps', 'bandwidths', 'delays')
+# trace attribute of each scalar field
+SCALARS = {'loss': 'loss_rate', 'queue': 'queue_size',
+           'delay_noise': 'delay_noise', 'T_s': 'bw_change_interval'}
+
+
+def _int_mask(values) -> np.ndarray:
+    return np.array([isinstance(val, (int, np.integer)) for val in values],
+                    dtype=bool)
+
+
+def _restore_ints(values: np.ndarray, int_mask: np.ndarray) -> list:
+    """Return values as a list of floats and of ints where int_mask is set."""
+    values_list = values.tolist()
+    for i in np.flatnonzero(int_mask).tolist():
+        values_list[i] = int(values_list[i])
+    return values_list
+
+
+def dump_traces(traces: List[Trace], filename: str,
+                names: Optional[List[str]] = None) -> None:
+    """Save traces to an .npz archive. names, e.g. the json files the traces
+    come from, are saved along."""
+    arrays = {}
+    for series in SERIES:
+        values = [getattr(trace, series) for trace in traces]
+        lens = [len(vals) for vals in values]
+        arrays[series + '_offsets'] = np.concatenate(
+            [[0], np.cumsum(lens)]).astype(np.int64)
+        # values are floats or ints, as loaded from json
+        arrays[series] = np.array(
+            [val for vals in values for val in vals], dtype=np.float64)
+        arrays[series + '_is_int'] = _int_mask(
+            [val for vals in values for val in vals])
+    for key, attr in SCALARS.items():
+        values = [getattr(trace, attr) for trace in traces]
+        arrays[key] = np.array(values, dtype=np.float64)
+        arrays[key + '_is_int'] = _int_mask(values)
+    arrays['names'] = np.array(names if names is not None else
+                               [''] * len(traces), dtype=np.str_)
+    np.savez(filename, **arrays)
+
+
+class TraceArchive:
+    """Read-only view of an .npz trace archive.
+
+    archive[i] builds the i-th Trace, iterating builds one Trace at a time.
+    """
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        with np.load(filename) as data:
+            self.arrays = {key: data[key] for key in data.files}
+        self.names = self.arrays['names'].tolist()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _series(self, series: str, i: int) -> list:
+        offsets = self.arrays[series + '_offsets']
+        start, end = offsets[i], offsets[i + 1]
+        return _restore_ints(self.arrays[series][start:end],
+                             self.arrays[series + '_is_int'][start:end])
+
+    def _scalar(self, key: str, i: int):
+        val = self.arrays[key][i].item()
+        return int(val) if self.arrays[key + '_is_int'][i] else val
+
+    def __getitem__(self, i: int) -> Trace:
+        return Trace(self._series('timestamps', i),
+                     self._series('bandwidths', i),
+                     self._series('delays', i),
+                     self._scalar('loss', i), self._scalar('queue', i),
+                     delay_noise=self._scalar('delay_noise', i),
+                     bw_change_interval=self._scalar('T_s', i))
+
+    def __iter__(self) -> Iterator[Trace]:
+        for i in range(len(self)):
+            yield self[i]
+
+
+def load_traces(filename: str) -> List[Trace]:
+    return list(TraceArchive(filename))
+
+
+def iter_traces(filename: str) -> Iterator[Trace]:
+    return iter(TraceArchive(filename))
+
+
+def load_trace_list(filename: str) -> List[Trace]:
+    """Load the traces listed one per line in a txt file, e.g.
+    data/cellular_train_traces.txt. A line may also be an .npz archive,
+    whose traces are all loaded."""
+    traces = []
+    with open(filename, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.endswith('.npz'):
+                traces += load_traces(line)
+            else:
+                traces.append(Trace.load_from_file(line))
+    return traces
+
+
+def convert_json_traces(trace_files: List[str], filename: str) -> None:
+    """Pack json trace files into an .npz archive."""
+    traces = [Trace.load_from_file(trace_file) for trace_file in trace_files]
+    dump_traces(traces, filename, names=trace_files)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("Pack json traces into an npz archive.")
+    parser.add_argument('--traces', type=str, nargs="+", required=True,
+                        help="Json trace files, directories of json traces or "
+                        "txt files listing one trace per line.")
+    parser.add_argument('--save-path', type=str, required=True,
+                        help="Output .npz archive.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    trace_files = []
+    for spec in args.traces:
+        if spec.endswith('.txt'):
+            with open(spec, 'r') as f:
+                trace_files += [line.strip() for line in f if line.strip()]
+        elif os.path.isdir(spec):
+            trace_files += sorted(glob.glob(os.path.join(spec, '*.json')))
+        else:
+            trace_files.append(spec)
+    convert_json_traces(trace_files, args.save_path)
+    print("saved {} traces to {}".format(len(trace_files), args.save_path))
+
+
+if __name__ == '__main__':
+    main()